@@ -0,0 +1,166 @@
+import json
+import os
+import re
+import statistics
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11
+    import tomli as tomllib  # type: ignore[no-redef]
+
+CONFIG_FILE = "rstracer.toml"
+ADVISOR_DIRECTORY = ".output/advisor"
+CPU_BUDGET = 20  # Percent of a core the tracer may use
+LAG_FACTOR = 2  # Ingestion is lagging when it takes more than `LAG_FACTOR` times its expected delay
+ROW_LIMITS = {"bronze": 500_000, "silver": 500_000, "gold": 5_000_000}  # Highest row count of a table per layer
+MIN_VACUUM = 5  # Seconds
+MIN_PRODUCER_FREQUENCY = 1000  # Milliseconds, the sampling period is never lowered below
+MAX_CHANNEL_SIZE = 100  # Recommended maximum of `request.channel_size`
+
+# Producer sections of the objects timed in `gold_tech_chrono`.
+PRODUCERS = {
+    "process_list": ["ps"],
+    "open_files": ["lsof.network", "lsof.regular"],
+    "network_packet": ["network"],
+}
+# Paths relative to the workspace of rstracer, made absolute in the candidate launched from another directory.
+PATHS = ["export.directory", "logger.directory"]
+
+
+def read_config(path=CONFIG_FILE):
+    with open(path, "rb") as file:
+        return tomllib.load(file)
+
+
+def setting(config, name):
+    value = config
+    for key in name.split("."):
+        value = value[key]
+    return value
+
+
+def recommend(con, config, overhead, cpu_budget=CPU_BUDGET):
+    """Return the configuration changes advised by the ingestion timings, the table sizes and the tracer overhead.
+
+    Each recommendation is a dict with the `setting`, its `current` and `proposed` values and the `reason`. Only the
+    first recommendation of a setting is kept, ingestion lag is checked first as it means captured rows are lost.
+    """
+    recommendations = {}
+
+    def propose(name, value, reason):
+        if name not in recommendations and value != setting(config, name):
+            recommendations[name] = {
+                "setting": name,
+                "current": setting(config, name),
+                "proposed": value,
+                "reason": reason,
+            }
+
+    chrono = con.execute(
+        "SELECT name, brz_max_ingest, svr_max_ingest, max_ingest FROM gold_tech_chrono ORDER BY name"
+    ).fetchall()
+    for name, bronze_lag, silver_lag, lag in chrono:
+        for section in PRODUCERS.get(name, []):
+            period = setting(config, f"{section}.producer_frequency") / 1000
+            if bronze_lag is not None and bronze_lag > LAG_FACTOR * period:
+                # Requests wait in the channel, the writer must consume larger batches.
+                batch_size = setting(config, "request.consumer_batch_size")
+                channel_size = setting(config, "request.channel_size")
+                propose(
+                    "request.consumer_batch_size",
+                    min(batch_size * 2, channel_size),
+                    f"{name} waits {bronze_lag:.1f} s before its bronze insertion.",
+                )
+                if batch_size * 2 > channel_size:
+                    propose(
+                        "request.channel_size",
+                        min(channel_size * 2, MAX_CHANNEL_SIZE),
+                        f"{name} waits {bronze_lag:.1f} s before its bronze insertion.",
+                    )
+            if lag is not None and lag > LAG_FACTOR * (period + setting(config, "schedule.silver")):
+                propose(
+                    f"{section}.producer_frequency",
+                    int(period * 2000),
+                    f"{name} takes {lag:.1f} s to reach silver, capture it less often.",
+                )
+            if silver_lag is not None and silver_lag > LAG_FACTOR * setting(config, "schedule.silver"):
+                propose(
+                    f"{section}.consumer_batch_size",
+                    setting(config, f"{section}.consumer_batch_size") * 2,
+                    f"{name} takes {silver_lag:.1f} s from bronze to silver, insert larger batches.",
+                )
+
+    table_count = con.execute("SELECT name, max_count FROM gold_tech_table_count ORDER BY max_count DESC").fetchall()
+    for name, count in table_count:
+        layer = name.split("_")[0]
+        if layer not in ROW_LIMITS or count <= ROW_LIMITS[layer]:
+            continue
+        vacuum = setting(config, f"vacuum.{layer}")
+        # 0 disables the vacuum of the layer, a choice of the user the advisor keeps.
+        if max(vacuum // 2, MIN_VACUUM) < vacuum:
+            propose(
+                f"vacuum.{layer}",
+                max(vacuum // 2, MIN_VACUUM),
+                f"{name} reached {count} rows, keep them for a shorter time.",
+            )
+
+    if overhead:
+        cpu = statistics.mean(sample["cpu"] for sample in overhead)
+        if cpu > cpu_budget:
+            # `lsof /` is the most expensive capture, then the ones running every second.
+            sections = ["lsof.regular"] if cpu < 2 * cpu_budget else ["lsof.regular", "lsof.network", "ps"]
+            for section in sections:
+                propose(
+                    f"{section}.producer_frequency",
+                    setting(config, f"{section}.producer_frequency") * 2,
+                    f"rstracer uses {cpu:.0f} % CPU, over the {cpu_budget} % budget.",
+                )
+        elif cpu < cpu_budget / 4 and not recommendations:
+            # Well under budget, the regular files can be captured more often.
+            propose(
+                "lsof.regular.producer_frequency",
+                max(setting(config, "lsof.regular.producer_frequency") // 2, MIN_PRODUCER_FREQUENCY),
+                f"rstracer only uses {cpu:.0f} % CPU, regular files can be captured more often.",
+            )
+
+    return list(recommendations.values())
+
+
+def write_candidate(recommendations, source=CONFIG_FILE, directory=ADVISOR_DIRECTORY):
+    """Write a copy of `source` with the recommended values in `directory`, keeping its comments.
+
+    rstracer reads the `rstracer.toml` of its working directory, Live Mode launches it from `directory` to use it.
+    """
+    with open(source) as file:
+        text = file.read()
+    config = tomllib.loads(text)
+    workspace = os.path.dirname(os.path.abspath(source))
+    values = {name: os.path.normpath(os.path.join(workspace, setting(config, name))) for name in PATHS}
+    values.update({recommendation["setting"]: recommendation["proposed"] for recommendation in recommendations})
+    for name, value in values.items():
+        text = _substitute(text, name, value)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, CONFIG_FILE)
+    with open(path, "w") as file:
+        file.write(text)
+    return path
+
+
+def _substitute(text, name, value):
+    section, key = name.rsplit(".", 1)
+    # TOML basic strings share the escaping of JSON strings.
+    value = json.dumps(value)
+    header = re.search(rf"^\[{re.escape(section)}\][^\n]*\n", text, re.MULTILINE)
+    if header is None:
+        return f"{text.rstrip()}\n\n[{section}]\n{key} = {value}\n"
+    # The section ends at the next table header.
+    start = header.end()
+    end = re.compile(r"^\[", re.MULTILINE).search(text, start)
+    stop = end.start() if end else len(text)
+    body = text[start:stop]
+    line = re.compile(rf"^({re.escape(key)}\s*=\s*)(\"[^\"]*\"|[^\s#]+)", re.MULTILINE)
+    if line.search(body):
+        body = line.sub(lambda match: match.group(1) + value, body, count=1)
+    else:
+        body = f"{key} = {value}\n{body}"
+    return text[:start] + body + text[stop:]
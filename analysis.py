@@ -0,0 +1,1211 @@
+# Analyses of the dashboard pages, each returning a DuckDB relation on the gold tables of a connection.
+# Process and files analyses filter out the hidden pids, users and commands, network analyses only the time window.
+# Network rows rolled up by the history store stand for their `packets`, so packets are counted with `SUM(packets)`.
+
+
+def _hidden(start, end, hide_pid, hide_user, hide_command):
+    return [start, end, list(hide_pid), list(hide_user), list(hide_command)]
+
+
+def _distinct(expression, approximate):
+    # HyperLogLog estimate in approximate mode, its memory does not grow with the number of distinct values.
+    return f"APPROX_COUNT_DISTINCT({expression})" if approximate else f"COUNT(DISTINCT {expression})"
+
+
+def _sketched(con, table):
+    # Sketches are only merged when they are stored, the views of a read-only database would compute every minute.
+    return con.execute("SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = ?", [table]).fetchone()[0] > 0
+
+
+# Minutes of a window merged from the sketches, from the first one starting at or after `$start` to the last one ending
+# at or before `$end`. The rows of the partial minutes at the edges of the window are read from the tables.
+SKETCH_MINUTES = """
+minutes AS
+(
+    SELECT
+        DATE_TRUNC('minute', $start::TIMESTAMP - INTERVAL 1 MICROSECOND) + INTERVAL 1 MINUTE AS first_minute,
+        DATE_TRUNC('minute', $end::TIMESTAMP + INTERVAL 1 MICROSECOND) AS end_minute
+)"""
+
+
+def _merged_processes(con, start, end, user_filter, hide_command, params):
+    # HyperLogLog states of the minutes of the window, combined with the state of the rows of its partial minutes.
+    return con.sql(
+        f"""
+WITH {SKETCH_MINUTES},
+state AS
+(
+    SELECT processes
+    FROM process_sketch, minutes
+    WHERE created_at >= first_minute AND created_at < end_minute
+    AND {user_filter.format(user="user_name")}
+    AND command NOT IN $hide_command
+    UNION ALL
+    SELECT APPROX_COUNT_DISTINCT(ROW(fact.machine, fact.pid, dim.started_at)) EXPORT_STATE
+    FROM gold_fact_process fact
+    CROSS JOIN minutes
+    LEFT JOIN gold_dim_process dim ON fact.machine = dim.machine AND fact.pid = dim.pid
+    LEFT JOIN gold_file_user usr ON dim.machine = usr.machine AND dim.uid = usr.uid
+    WHERE fact.created_at >= $start AND fact.created_at <= $end
+    AND (fact.created_at < first_minute OR fact.created_at >= end_minute)
+    AND {user_filter.format(user="usr.name")}
+    AND dim.command NOT IN $hide_command
+)
+SELECT COALESCE(FINALIZE(LIST_REDUCE(LIST(processes), (a, b) -> COMBINE(a, b))), 0) AS count,
+FROM state
+""",
+        params={"start": start, "end": end, "hide_command": list(hide_command), **params},
+    )
+
+
+# Process
+
+
+def resource_per_command(con, start, end, hide_pid=(), hide_user=(), hide_command=()):
+    return con.sql(
+        """
+SELECT
+    MAX(fact.pcpu) AS pcpu,
+    MAX(fact.pmem) AS pmem,
+    COALESCE(pro.command, pro.full_command) AS command,
+    TO_TIMESTAMP(FLOOR(EXTRACT('epoch' FROM fact.created_at))) AT TIME ZONE 'UTC' AS time,
+FROM
+    gold_fact_process fact
+LEFT JOIN
+    gold_dim_process pro ON fact.machine = pro.machine AND fact.pid = pro.pid
+LEFT JOIN
+    gold_file_user usr ON pro.machine = usr.machine AND pro.uid = usr.uid
+WHERE
+    fact.created_at >= ? AND fact.created_at <= ?
+AND pro.pid NOT IN ?
+AND  usr.name NOT IN ?
+AND pro.command NOT IN ?
+GROUP BY time, COALESCE(pro.command, pro.full_command)
+ORDER BY time
+""",
+        params=_hidden(start, end, hide_pid, hide_user, hide_command),
+    )
+
+
+def process_by_command_count(con, start, end, hide_pid=(), hide_user=(), hide_command=()):
+    return con.sql(
+        """
+WITH process AS
+(
+    SELECT DISTINCT
+        fact.machine,
+        fact.pid,
+        COALESCE(command, full_command) AS command
+    FROM
+        gold_fact_process fact
+    LEFT JOIN
+        gold_dim_process pro ON fact.machine = pro.machine AND fact.pid = pro.pid
+    LEFT JOIN
+        gold_file_user usr ON pro.machine = usr.machine AND pro.uid = usr.uid
+    WHERE
+        fact.created_at >= ? AND fact.created_at <= ?
+    AND pro.pid NOT IN ?
+    AND usr.name NOT IN ?
+    AND pro.command NOT IN ?
+)
+SELECT
+    command,
+    COUNT(*) AS count
+FROM process
+GROUP BY command
+ORDER BY count DESC
+""",
+        params=_hidden(start, end, hide_pid, hide_user, hide_command),
+    )
+
+
+def process_by_user_count(con, start, end, hide_pid=(), hide_user=(), hide_command=()):
+    return con.sql(
+        """
+WITH process AS
+(
+    SELECT DISTINCT
+        fact.machine,
+        fact.pid,
+        usr.name AS user
+    FROM
+        gold_fact_process fact
+    LEFT JOIN
+        gold_dim_process pro ON fact.machine = pro.machine AND fact.pid = pro.pid
+    LEFT JOIN
+        gold_file_user usr ON pro.machine = usr.machine AND pro.uid = usr.uid
+    WHERE
+        fact.created_at >= ? AND fact.created_at <= ?
+    AND pro.pid NOT IN ?
+    AND usr.name NOT IN ?
+    AND pro.command NOT IN ?
+)
+SELECT
+    COALESCE(user, 'Unknwon') AS user,
+    COUNT(*) AS count
+FROM process
+GROUP BY user
+ORDER BY count DESC
+""",
+        params=_hidden(start, end, hide_pid, hide_user, hide_command),
+    )
+
+
+def pids_per_process(con, start, end, hide_pid=(), hide_user=(), hide_command=(), approximate=False):
+    return con.sql(
+        f"""
+WITH ppid_count AS
+(
+    SELECT
+        {_distinct("fact.pid", approximate)} AS count,
+        dim.machine,
+        dim.ppid AS pid,
+    FROM
+        gold_fact_process fact
+    LEFT JOIN
+        gold_dim_process dim ON fact.machine = dim.machine AND fact.pid = dim.pid
+    LEFT JOIN
+        gold_file_user usr ON dim.machine = usr.machine AND dim.uid = usr.uid
+    WHERE
+        fact.created_at >= ? AND fact.created_at <= ?
+    AND fact.pid NOT IN ?
+    AND usr.name NOT IN ?
+    AND dim.command NOT IN ?
+    GROUP BY dim.machine, dim.ppid
+)
+SELECT
+    ppid_count.pid,
+    ppid_count.count AS children,
+    pro.command,
+FROM ppid_count LEFT JOIN gold_dim_process pro ON ppid_count.machine = pro.machine AND ppid_count.pid = pro.pid
+ORDER BY ppid_count.count DESC, ppid_count.pid
+LIMIT 20
+""",
+        params=_hidden(start, end, hide_pid, hide_user, hide_command),
+    )
+
+
+def pids_per_age(con, start, end, hide_pid=(), hide_user=(), hide_command=()):
+    return con.sql(
+        """
+SELECT DISTINCT
+    fact.pid,
+    dim.command,
+    AGE(dim.inserted_at, dim.started_at) AS age,
+FROM
+    gold_fact_process fact
+LEFT JOIN
+    gold_dim_process dim ON fact.machine = dim.machine AND fact.pid = dim.pid
+LEFT JOIN
+    gold_file_user usr ON dim.machine = usr.machine AND dim.uid = usr.uid
+WHERE
+    fact.created_at >= ? AND fact.created_at <= ?
+AND fact.pid NOT IN ?
+AND usr.name NOT IN ?
+AND dim.command NOT IN ?
+ORDER BY age DESC, fact.pid
+LIMIT 20
+""",
+        params=_hidden(start, end, hide_pid, hide_user, hide_command),
+    )
+
+
+def full_commands_count(con, start, end, hide_pid=(), hide_user=(), hide_command=(), approximate=False):
+    return con.sql(
+        f"""
+SELECT DISTINCT
+    {_distinct("ROW(fact.machine, fact.pid)", approximate)} AS count,
+    dim.full_command
+FROM
+    gold_fact_process fact
+LEFT JOIN
+    gold_dim_process dim ON fact.machine = dim.machine AND fact.pid = dim.pid
+LEFT JOIN
+    gold_file_user usr ON dim.machine = usr.machine AND dim.uid = usr.uid
+WHERE
+    fact.created_at >= ? AND fact.created_at <= ?
+AND fact.pid NOT IN ?
+AND usr.name NOT IN ?
+AND dim.command NOT IN ?
+GROUP BY dim.full_command
+ORDER BY count DESC, dim.full_command
+LIMIT 20
+""",
+        params=_hidden(start, end, hide_pid, hide_user, hide_command),
+    )
+
+
+def process_total(con, start, end, hide_pid=(), hide_user=(), hide_command=(), approximate=False):
+    if approximate and not hide_pid and _sketched(con, "process_sketch"):
+        return _merged_processes(
+            con, start, end, "{user} NOT IN $hide_user", hide_command, {"hide_user": list(hide_user)}
+        )
+    return con.sql(
+        f"""
+SELECT
+    {_distinct("ROW(fact.machine, fact.pid, dim.started_at)", approximate)} AS count,
+FROM
+    gold_fact_process fact
+LEFT JOIN
+    gold_dim_process dim ON fact.machine = dim.machine AND fact.pid = dim.pid
+LEFT JOIN
+    gold_file_user usr ON dim.machine = usr.machine AND dim.uid = usr.uid
+WHERE
+    fact.created_at >= ? AND fact.created_at <= ?
+AND fact.pid NOT IN ?
+AND usr.name NOT IN ?
+AND dim.command NOT IN ?
+""",
+        params=_hidden(start, end, hide_pid, hide_user, hide_command),
+    )
+
+
+def process_root(con, start, end, hide_pid=(), hide_user=(), hide_command=(), approximate=False):
+    if approximate and not hide_pid and _sketched(con, "process_sketch"):
+        return _merged_processes(con, start, end, "{user} = 'root'", hide_command, {})
+    return con.sql(
+        f"""
+SELECT
+    {_distinct("ROW(fact.machine, fact.pid, dim.started_at)", approximate)} AS count,
+FROM
+    gold_fact_process fact
+LEFT JOIN
+    gold_dim_process dim ON fact.machine = dim.machine AND fact.pid = dim.pid
+LEFT JOIN
+    gold_file_user usr ON dim.machine = usr.machine AND dim.uid = usr.uid
+WHERE
+    fact.created_at >= ? AND fact.created_at <= ?
+AND fact.pid NOT IN ?
+AND usr.name = 'root'
+AND dim.command NOT IN ?
+""",
+        params=[start, end, list(hide_pid), list(hide_command)],
+    )
+
+
+PROCESS = [
+    resource_per_command,
+    process_by_command_count,
+    process_by_user_count,
+    pids_per_process,
+    pids_per_age,
+    full_commands_count,
+    process_total,
+    process_root,
+]
+
+
+# Network
+
+
+def packet_process(con, start, end):
+    return con.sql(
+        """
+SELECT
+    TO_TIMESTAMP(FLOOR(EXTRACT('epoch' FROM packet.created_at))) AT TIME ZONE 'UTC' AS time,
+    COALESCE(pro.command, pro.full_command, 'Unknown') AS command,
+    ROUND(SUM(length) / (1024 * 1024), 3) AS size
+FROM gold_fact_network_packet packet
+LEFT JOIN gold_fact_process_network net_pro ON net_pro.machine = packet.machine AND net_pro.packet_id = packet._id
+LEFT JOIN gold_dim_process pro ON packet.machine = pro.machine AND COALESCE(net_pro.pid, packet.pid) = pro.pid
+WHERE packet.created_at >= ? AND packet.created_at <= ?
+GROUP BY time, COALESCE(pro.command, pro.full_command, 'Unknown')
+ORDER BY time
+""",
+        params=[start, end],
+    )
+
+
+def interface_by_size(con, start, end):
+    return con.sql(
+        """
+SELECT
+    interface,
+    ROUND(SUM(length) / (1024 * 1024), 3) AS size
+FROM gold_fact_network_packet
+WHERE created_at >= ? AND created_at <= ?
+GROUP BY interface
+""",
+        params=[start, end],
+    )
+
+
+def network_by_size(con, start, end):
+    return con.sql(
+        """
+SELECT
+    COALESCE (network, 'unknown') AS network,
+    ROUND(SUM(length) / (1024 * 1024), 3) AS size
+FROM gold_fact_network_packet
+WHERE created_at >= ? AND created_at <= ?
+GROUP BY network
+    """,
+        params=[start, end],
+    )
+
+
+def transport_by_size(con, start, end):
+    return con.sql(
+        """
+SELECT
+    COALESCE (transport, 'unknown') AS transport,
+    ROUND(SUM(length) / (1024 * 1024), 3) AS size
+FROM gold_fact_network_packet
+WHERE created_at >= ? AND created_at <= ?
+AND network IS NOT NULL
+GROUP BY transport
+    """,
+        params=[start, end],
+    )
+
+
+def application_by_size(con, start, end):
+    return con.sql(
+        """
+SELECT
+    COALESCE (application, 'unknown') AS application,
+    ROUND(SUM(length) / (1024 * 1024), 3) AS size
+FROM gold_fact_network_packet
+WHERE created_at >= ? AND created_at <= ?
+AND transport IS NOT NULL
+GROUP BY application
+""",
+        params=[start, end],
+    )
+
+
+def foreign_ip_traffic(con, start, end, approximate=False):
+    if approximate and _sketched(con, "foreign_ip_sketch"):
+        # Heavy hitters of the minutes of the window, with the exact traffic of its partial minutes. A host may miss the
+        # bytes of the minutes it was left out of, at most the largest host left out of each of them, summed in `error`.
+        return con.sql(
+            f"""
+WITH {SKETCH_MINUTES},
+traffic AS
+(
+    SELECT foreign_ip_sketch.*
+    FROM foreign_ip_sketch, minutes
+    WHERE created_at >= first_minute AND created_at < end_minute
+    UNION ALL BY NAME
+    SELECT
+        CASE WHEN source_foreign THEN source_host ELSE destination_host END AS address,
+        SUM(packets) AS packets,
+        SUM(length) AS length,
+        SUM(destination_foreign::INTEGER * packets) AS sent_packets,
+        SUM(EPOCH(created_at) * packets) AS epoch
+    FROM network_traffic, minutes
+    WHERE source_foreign <> destination_foreign
+    AND created_at >= $start AND created_at <= $end
+    AND (created_at < first_minute OR created_at >= end_minute)
+    GROUP BY address
+),
+left_out AS (SELECT created_at, length FROM traffic WHERE address IS NULL)
+SELECT
+    traffic.address,
+    SUM(traffic.packets)::BIGINT AS count,
+    ROUND(SUM(traffic.length) / (1024 * 1024), 3) AS size,
+    SUM(traffic.sent_packets) / SUM(traffic.packets) AS send,
+    TO_TIMESTAMP(SUM(traffic.epoch) / SUM(traffic.packets)) AS avg_date,
+    ROUND(((SELECT COALESCE(SUM(length), 0) FROM left_out) - COALESCE(SUM(left_out.length), 0)) / (1024 * 1024), 3)
+    AS error
+FROM traffic
+LEFT JOIN left_out ON traffic.created_at = left_out.created_at
+WHERE traffic.address IS NOT NULL
+GROUP BY traffic.address
+ORDER BY size DESC, traffic.address
+""",
+            params={"start": start, "end": end},
+        )
+    return con.sql(
+        """
+SELECT
+    CASE WHEN source_foreign THEN source_host ELSE destination_host END AS address,
+    SUM(packets)::BIGINT AS count,
+    ROUND(SUM(length) / (1024 * 1024), 3) AS size,
+    SUM(destination_foreign::INTEGER * packets) / SUM(packets) AS send,
+    TO_TIMESTAMP(SUM(EPOCH(created_at) * packets) / SUM(packets)) AS avg_date
+FROM network_traffic
+WHERE source_foreign <> destination_foreign
+AND created_at >= ? AND created_at <= ?
+GROUP BY address
+ORDER BY size DESC, address
+""",
+        params=[start, end],
+    )
+
+
+def local_ip_traffic(con, start, end):
+    return con.sql(
+        """
+SELECT
+    CASE WHEN source_local THEN source_host ELSE destination_host END AS address,
+    SUM(packets)::BIGINT AS count,
+    ROUND(SUM(length) / (1024 * 1024), 3) AS size,
+    SUM((direction = 'outgoing')::INTEGER * packets) / SUM(packets) AS send,
+    TO_TIMESTAMP(SUM(EPOCH(created_at) * packets) / SUM(packets)) AS avg_date
+FROM network_traffic
+WHERE direction IS NOT NULL
+AND created_at >= ? AND created_at <= ?
+GROUP BY address
+ORDER BY size DESC, address
+""",
+        params=[start, end],
+    )
+
+
+def local_port_traffic(con, start, end):
+    return con.sql(
+        """
+SELECT local_port AS port
+    ,COALESCE(command, 'Unknown') AS command
+    ,SUM(packets)::BIGINT AS count
+    ,ROUND(SUM(length) / (1024 * 1024), 3) AS size
+    ,SUM((direction = 'outgoing')::INTEGER * packets) / SUM(packets) AS send
+    ,TO_TIMESTAMP(SUM(EPOCH(created_at) * packets) / SUM(packets)) AS avg_date
+FROM network_traffic
+WHERE direction IS NOT NULL
+    AND created_at >= ? AND created_at <= ?
+GROUP BY local_port, COALESCE(command, 'Unknown')
+ORDER BY size DESC, port, command
+""",
+        params=[start, end],
+    )
+
+
+def network_flows(con, start, end):
+    # Flows are stored by second, or by bucket once rolled up, the conversations sum the ones overlapping the window.
+    return con.sql(
+        """
+WITH flow AS
+(
+    SELECT
+        machine,
+        local_address,
+        local_port,
+        remote_address,
+        remote_port,
+        transport,
+        MIN(first_seen) AS first_seen,
+        MAX(last_seen) AS last_seen,
+        SUM(sent_packets)::BIGINT AS sent_packets,
+        SUM(sent_bytes)::BIGINT AS sent_bytes,
+        SUM(received_packets)::BIGINT AS received_packets,
+        SUM(received_bytes)::BIGINT AS received_bytes,
+        ANY_VALUE(pid) AS pid,
+    FROM network_flow
+    WHERE last_seen >= ? AND created_at <= ?
+    GROUP BY machine, local_address, local_port, remote_address, remote_port, transport
+)
+SELECT
+    flow.local_address,
+    flow.local_port,
+    flow.remote_address,
+    flow.remote_port,
+    flow.transport,
+    flow.pid,
+    pro.command,
+    flow.first_seen,
+    flow.last_seen,
+    flow.sent_packets,
+    ROUND(flow.sent_bytes / (1024 * 1024), 3) AS sent_size,
+    flow.received_packets,
+    ROUND(flow.received_bytes / (1024 * 1024), 3) AS received_size,
+FROM flow
+LEFT JOIN gold_dim_process pro ON flow.machine = pro.machine AND flow.pid = pro.pid
+ORDER BY
+    flow.sent_bytes + flow.received_bytes DESC,
+    flow.machine,
+    flow.local_address,
+    flow.local_port,
+    flow.remote_address,
+    flow.remote_port,
+    flow.transport
+""",
+        params=[start, end],
+    )
+
+
+def packet_count(con, start, end):
+    return con.sql(
+        """
+SELECT
+    SUM(packets)::BIGINT AS count
+FROM gold_fact_network_packet
+WHERE created_at >= ? AND created_at <= ?
+""",
+        params=[start, end],
+    )
+
+
+def packet_size(con, start, end):
+    return con.sql(
+        """
+SELECT
+    ROUND(SUM(length) / (1024 * 1024), 3) AS size
+FROM gold_fact_network_packet
+WHERE created_at >= ? AND created_at <= ?
+""",
+        params=[start, end],
+    )
+
+
+def listening_port(con, start, end):
+    return con.sql(
+        """
+SELECT
+    COUNT(DISTINCT source_port) AS count
+FROM gold_dim_network_socket
+WHERE inserted_at >= ? AND inserted_at <= ?
+AND source_port IS NOT NULL
+""",
+        params=[start, end],
+    )
+
+
+NETWORK = [
+    packet_process,
+    interface_by_size,
+    network_by_size,
+    transport_by_size,
+    application_by_size,
+    foreign_ip_traffic,
+    local_ip_traffic,
+    local_port_traffic,
+    network_flows,
+    packet_count,
+    packet_size,
+    listening_port,
+]
+
+
+# Files
+
+
+def files_count(con, start, end, hide_pid=(), hide_user=(), hide_command=(), approximate=False):
+    return con.sql(
+        f"""
+SELECT
+  {_distinct("dim.name", approximate)} AS count,
+  TO_TIMESTAMP(FLOOR(EXTRACT('epoch' FROM created_at))) AT TIME ZONE 'UTC' AS time,
+FROM
+  gold_fact_file_reg fact
+  LEFT JOIN gold_dim_process pro ON fact.machine = pro.machine AND fact.pid = pro.pid
+  LEFT JOIN gold_file_user usr ON pro.machine = usr.machine AND pro.uid = usr.uid
+  LEFT JOIN gold_dim_file_reg dim ON fact.machine = dim.machine AND fact.pid = dim.pid
+  AND fact.fd = dim.fd
+  AND fact.node = dim.node
+WHERE
+  fact.created_at >= ?
+  AND fact.created_at <= ?
+  AND pro.pid NOT IN ?
+  AND usr.name NOT IN ?
+  AND pro.command NOT IN ?
+GROUP BY
+  time
+ORDER BY
+  time
+""",
+        params=_hidden(start, end, hide_pid, hide_user, hide_command),
+    )
+
+
+def file_by_command_count(con, start, end, hide_pid=(), hide_user=(), hide_command=(), approximate=False):
+    return con.sql(
+        f"""
+SELECT
+  command,
+  {_distinct("file_name", approximate)} AS count
+FROM
+(
+    SELECT
+      fact.machine,
+      fact.pid,
+      fact.fd,
+      fact.node,
+      pro.command,
+      usr.name AS user_name,
+      dim.name AS file_name,
+      MIN(size) AS min_size,
+      MAX(size) AS max_size
+   FROM
+      gold_fact_file_reg fact
+      LEFT JOIN gold_dim_process pro ON fact.machine = pro.machine AND fact.pid = pro.pid
+      LEFT JOIN gold_file_user usr ON pro.machine = usr.machine AND pro.uid = usr.uid
+      LEFT JOIN gold_dim_file_reg dim ON fact.machine = dim.machine AND fact.pid = dim.pid
+  AND fact.fd = dim.fd
+  AND fact.node = dim.node
+   WHERE
+      fact.created_at >= ?
+      AND fact.created_at <= ?
+      AND pro.pid NOT IN ?
+      AND usr.name NOT IN ?
+      AND pro.command NOT IN ?
+   GROUP BY
+      fact.machine,
+      fact.pid,
+      fact.fd,
+      fact.node,
+      pro.command,
+      user_name,
+      file_name
+  )
+GROUP BY
+ command
+ORDER BY
+ count DESC
+""",
+        params=_hidden(start, end, hide_pid, hide_user, hide_command),
+    )
+
+
+def modification_by_commands(con, start, end, hide_pid=(), hide_user=(), hide_command=()):
+    return con.sql(
+        """
+SELECT
+  TO_TIMESTAMP(FLOOR(EXTRACT('epoch' FROM created_at))) AT TIME ZONE 'UTC' AS time,
+  command,
+  SUM(
+    (size::BIGINT - previous_size::BIGINT)
+  ) / (1024 * 1024) AS write_mo,
+FROM
+(
+    SELECT
+      pro.command,
+      fact.created_at,
+      size,
+      LAG(size, 1, 0) OVER (
+        PARTITION BY fact.machine,
+            fact.pid,
+            fact.fd,
+            fact.node
+        ORDER BY
+            fact.created_at
+       ) AS previous_size,
+    ROW_NUMBER() OVER (
+        PARTITION BY fact.machine,
+           fact.pid,
+           fact.fd,
+           fact.node
+       ORDER BY
+            fact.created_at
+      ) AS row_num
+   FROM
+      gold_fact_file_reg fact
+      LEFT JOIN gold_dim_process pro ON fact.machine = pro.machine AND fact.pid = pro.pid
+      LEFT JOIN gold_file_user usr ON pro.machine = usr.machine AND pro.uid = usr.uid
+   WHERE
+      fact.created_at >= ?
+      AND fact.created_at <= ?
+      AND pro.pid NOT IN ?
+      AND usr.name NOT IN ?
+      AND pro.command NOT IN ?
+  )
+WHERE
+  SIZE <> previous_size
+  AND row_num > 1
+GROUP BY
+ time,
+ command
+ORDER BY
+ time
+  """,
+        params=_hidden(start, end, hide_pid, hide_user, hide_command),
+    )
+
+
+def file_by_user_count(con, start, end, hide_pid=(), hide_user=(), hide_command=(), approximate=False):
+    return con.sql(
+        f"""
+SELECT
+  user_name,
+  {_distinct("file_name", approximate)} AS count
+FROM
+(
+    SELECT
+      fact.machine,
+      fact.pid,
+      fact.fd,
+      fact.node,
+      pro.command,
+      dim.name AS file_name,
+      usr.name AS user_name,
+      MIN(size) AS min_size,
+      MAX(size) AS max_size
+   FROM
+      gold_fact_file_reg fact
+      LEFT JOIN gold_dim_process pro ON fact.machine = pro.machine AND fact.pid = pro.pid
+      LEFT JOIN gold_file_user usr ON pro.machine = usr.machine AND pro.uid = usr.uid
+      LEFT JOIN gold_dim_file_reg dim ON fact.machine = dim.machine AND fact.pid = dim.pid
+      AND fact.fd = dim.fd
+      AND fact.node = dim.node
+   WHERE
+      fact.created_at >= ?
+      AND fact.created_at <= ?
+      AND pro.pid NOT IN ?
+      AND usr.name NOT IN ?
+      AND pro.command NOT IN ?
+   GROUP BY
+      fact.machine,
+      fact.pid,
+      fact.fd,
+      fact.node,
+      pro.command,
+      user_name,
+      file_name
+  )
+GROUP BY
+ user_name
+ORDER BY
+ count DESC
+""",
+        params=_hidden(start, end, hide_pid, hide_user, hide_command),
+    )
+
+
+def modification_by_users(con, start, end, hide_pid=(), hide_user=(), hide_command=()):
+    return con.sql(
+        """
+SELECT
+  TO_TIMESTAMP(FLOOR(EXTRACT('epoch' FROM created_at))) AT TIME ZONE 'UTC' AS time,
+  user,
+  SUM(
+    SIZE::BIGINT - previous_size::BIGINT
+  ) / (1024 * 1024) AS write_mo,
+FROM
+(
+    SELECT
+        usr.name AS user,
+        fact.created_at,
+        size,
+        LAG(size, 1, 0) OVER (
+        PARTITION BY fact.machine,
+            fact.pid,
+            fact.fd,
+            fact.node
+            ORDER BY
+             fact.created_at
+        ) AS previous_size,
+        ROW_NUMBER() OVER (
+        PARTITION BY fact.machine,
+            fact.pid,
+            fact.fd,
+            fact.node
+            ORDER BY
+             fact.created_at
+        ) AS row_num
+   FROM
+        gold_fact_file_reg fact
+        LEFT JOIN gold_dim_process pro ON fact.machine = pro.machine AND fact.pid = pro.pid
+        LEFT JOIN gold_file_user usr ON pro.machine = usr.machine AND pro.uid = usr.uid
+   WHERE
+      fact.created_at >= ?
+      AND fact.created_at <= ?
+      AND pro.pid NOT IN ?
+      AND usr.name NOT IN ?
+      AND pro.command NOT IN ?
+  )
+WHERE
+  SIZE <> previous_size
+  AND row_num > 1
+GROUP BY
+ time,
+ user
+ORDER BY
+ time
+  """,
+        params=_hidden(start, end, hide_pid, hide_user, hide_command),
+    )
+
+
+def most_open_files(con, start, end, hide_pid=(), hide_user=(), hide_command=()):
+    return con.sql(
+        """
+WITH open_file AS
+(
+    SELECT
+      file.name
+   FROM
+      gold_dim_file_reg file
+      LEFT JOIN gold_dim_process pro ON file.machine = pro.machine AND file.pid = pro.pid
+      LEFT JOIN gold_file_user usr ON pro.machine = usr.machine AND pro.uid = usr.uid
+   WHERE
+      file.started_at >= ?
+      AND file.inserted_at <= ?
+      AND pro.pid NOT IN ?
+      AND usr.name NOT IN ?
+      AND pro.command NOT IN ?
+)
+SELECT
+  name,
+  COUNT(*) AS count
+FROM
+  open_file
+GROUP BY
+ name
+ORDER BY
+ count DESC,
+ name
+    """,
+        params=_hidden(start, end, hide_pid, hide_user, hide_command),
+    )
+
+
+def most_open_files_by_cmd(con, start, end, hide_pid=(), hide_user=(), hide_command=(), approximate=False):
+    return con.sql(
+        f"""
+SELECT
+  name,
+  {_distinct("command", approximate)} AS count
+FROM
+(
+   SELECT
+      *
+   FROM
+      gold_dim_file_reg file
+      LEFT JOIN gold_dim_process pro ON file.machine = pro.machine AND file.pid = pro.pid
+      LEFT JOIN gold_file_user usr ON pro.machine = usr.machine AND pro.uid = usr.uid
+   WHERE
+      file.started_at >= ?
+      AND file.inserted_at <= ?
+      AND pro.pid NOT IN ?
+      AND usr.name NOT IN ?
+      AND pro.command NOT IN ?
+  )
+GROUP BY
+ name
+ORDER BY
+ count DESC,
+ name
+    """,
+        params=_hidden(start, end, hide_pid, hide_user, hide_command),
+    )
+
+
+def most_modified_files(con, start, end, hide_pid=(), hide_user=(), hide_command=()):
+    return con.sql(
+        """
+SELECT
+  name,
+  ROUND(
+    SUM(max_size - min_size) / (1024 * 1024),
+    2
+  ) AS write_mo
+FROM
+(
+    SELECT
+      fact.machine,
+      fact.pid,
+     fact.fd,
+     fact.node,
+     file.name,
+     MIN(size) AS min_size,
+     MAX(size) AS max_size
+   FROM
+      gold_fact_file_reg fact
+     LEFT JOIN gold_dim_process pro ON fact.machine = pro.machine AND fact.pid = pro.pid
+     LEFT JOIN gold_file_user usr ON pro.machine = usr.machine AND pro.uid = usr.uid
+     LEFT JOIN gold_dim_file_reg file ON fact.machine = file.machine AND fact.pid = file.pid
+     AND fact.fd = file.fd
+     AND fact.node = file.node
+   WHERE
+      fact.created_at >= ?
+     AND fact.created_at <= ?
+     AND pro.pid NOT IN ?
+     AND usr.name NOT IN ?
+     AND pro.command NOT IN ?
+   GROUP BY
+      fact.machine,
+      fact.pid,
+     fact.fd,
+     fact.node,
+     file.name,
+     )
+WHERE
+  max_size <> min_size
+GROUP BY
+ name
+ORDER BY
+ write_mo DESC,
+ name
+    """,
+        params=_hidden(start, end, hide_pid, hide_user, hide_command),
+    )
+
+
+def open_nodes(con, start, end, hide_pid=(), hide_user=(), hide_command=()):
+    return con.sql(
+        """
+SELECT
+  COUNT(*) AS count
+FROM
+ gold_dim_file_reg file
+ LEFT JOIN gold_dim_process pro ON file.machine = pro.machine AND file.pid = pro.pid
+ LEFT JOIN gold_file_user usr ON pro.machine = usr.machine AND pro.uid = usr.uid
+WHERE
+  file.started_at >= ?
+ AND file.inserted_at <= ?
+ AND pro.pid NOT IN ?
+ AND usr.name NOT IN ?
+ AND pro.command NOT IN ?
+""",
+        params=_hidden(start, end, hide_pid, hide_user, hide_command),
+    )
+
+
+def open_files(con, start, end, hide_pid=(), hide_user=(), hide_command=(), approximate=False):
+    return con.sql(
+        f"""
+SELECT
+  {_distinct("file.name", approximate)} AS count
+FROM
+ gold_dim_file_reg file
+ LEFT JOIN gold_dim_process pro ON file.machine = pro.machine AND file.pid = pro.pid
+ LEFT JOIN gold_file_user usr ON pro.machine = usr.machine AND pro.uid = usr.uid
+WHERE
+  file.started_at >= ?
+ AND file.inserted_at <= ?
+ AND pro.pid NOT IN ?
+ AND usr.name NOT IN ?
+ AND pro.command NOT IN ?
+""",
+        params=_hidden(start, end, hide_pid, hide_user, hide_command),
+    )
+
+
+def modified_files(con, start, end, hide_pid=(), hide_user=(), hide_command=()):
+    return con.sql(
+        """
+SELECT
+  COUNT(*) AS count
+FROM
+(
+    SELECT
+      MIN(size) AS min_size,
+     MAX(size) AS max_size
+   FROM
+      gold_fact_file_reg fact
+     LEFT JOIN gold_dim_process pro ON fact.machine = pro.machine AND fact.pid = pro.pid
+     LEFT JOIN gold_file_user usr ON pro.machine = usr.machine AND pro.uid = usr.uid
+     LEFT JOIN gold_dim_file_reg file ON fact.machine = file.machine AND fact.pid = file.pid
+     AND fact.fd = file.fd
+     AND fact.node = file.node
+   WHERE
+      fact.created_at >= ?
+     AND fact.created_at <= ?
+     AND pro.pid NOT IN ?
+     AND usr.name NOT IN ?
+     AND pro.command NOT IN ?
+   GROUP BY file.name
+     )
+WHERE
+  max_size <> min_size
+""",
+        params=_hidden(start, end, hide_pid, hide_user, hide_command),
+    )
+
+
+def modification_size(con, start, end, hide_pid=(), hide_user=(), hide_command=()):
+    return con.sql(
+        """
+SELECT
+  ROUND(SUM(max_size - min_size) / (1024 * 1024), 3) AS write_mo
+FROM
+(
+   SELECT
+      MIN(size) AS min_size,
+      MAX(size) AS max_size
+   FROM
+      gold_fact_file_reg fact
+     LEFT JOIN gold_dim_process pro ON fact.machine = pro.machine AND fact.pid = pro.pid
+     LEFT JOIN gold_file_user usr ON pro.machine = usr.machine AND pro.uid = usr.uid
+     LEFT JOIN gold_dim_file_reg file ON fact.machine = file.machine AND fact.pid = file.pid
+     AND fact.fd = file.fd
+     AND fact.node = file.node
+   WHERE
+      fact.created_at >= ?
+     AND fact.created_at <= ?
+     AND pro.pid NOT IN ?
+     AND usr.name NOT IN ?
+     AND pro.command NOT IN ?
+   GROUP BY
+      fact.machine,
+      fact.pid,
+     fact.fd,
+     fact.node,
+     file.name,
+     )
+WHERE
+  max_size <> min_size
+""",
+        params=_hidden(start, end, hide_pid, hide_user, hide_command),
+    )
+
+
+FILES = [
+    files_count,
+    file_by_command_count,
+    modification_by_commands,
+    file_by_user_count,
+    modification_by_users,
+    most_open_files,
+    most_open_files_by_cmd,
+    most_modified_files,
+    open_nodes,
+    open_files,
+    modified_files,
+    modification_size,
+]
+
+
+# Debug
+
+
+def table_max_count(con):
+    return con.sql(
+        """
+SELECT
+  name,
+  max_count,
+  SPLIT(name, '_')[1] AS color,
+FROM
+  gold_tech_table_count
+ORDER BY
+  _id
+"""
+    )
+
+
+def bronze_ingest_chrono(con):
+    return con.sql(
+        """
+SELECT
+    CASE
+        WHEN name = 'process_list' THEN 'process'
+        WHEN name = 'open_files' THEN 'files'
+        WHEN name = 'network_packet' THEN 'network'
+    END AS object,
+    brz_min_ingest,
+    brz_max_ingest,
+    svr_min_ingest,
+    svr_max_ingest,
+    min_ingest,
+    max_ingest,
+FROM
+  gold_tech_chrono
+"""
+    )
+
+
+def process_without_open_file(con):
+    return con.sql(
+        """
+SELECT
+    COUNT(*) AS count,
+    full_command,
+FROM gold_dim_process
+WHERE command IS NULL
+GROUP BY full_command
+ORDER BY count DESC, full_command
+"""
+    )
+
+
+def foreign_ip_packet_without_process(con):
+    # Rolled up rows of the history store have no `_id` linking them to a process, only raw rows are checked.
+    return con.sql(
+        """
+SELECT
+    traffic.source_host AS address,
+    traffic.destination_port AS port,
+    COUNT(*) AS count,
+    ROUND(SUM(traffic.length) / (1024 * 1024), 3) AS size,
+FROM network_traffic traffic
+LEFT JOIN gold_fact_process_network pro_net ON traffic.machine = pro_net.machine AND traffic._id = pro_net.packet_id
+WHERE pro_net.send IS NULL
+AND traffic._id IS NOT NULL
+AND traffic.direction = 'incoming'
+AND traffic.source_host IS NOT NULL
+GROUP BY
+    address,
+    port
+ORDER BY
+    address,
+    port
+"""
+    )
+
+
+def gold_fact_network_ip_count(con):
+    return con.sql(
+        """
+SELECT
+    COUNT(DISTINCT ROW(machine, _id)) AS count
+FROM gold_fact_network_ip
+"""
+    )
+
+
+def gold_fact_process_network_count(con):
+    return con.sql(
+        """
+SELECT
+    COUNT(DISTINCT ROW(machine, packet_id)) AS count
+FROM gold_fact_process_network
+"""
+    )
+
+
+def table_memory(con):
+    # In-memory size estimated from the column types. Strings count their 16 bytes header only, the longer than 12
+    # characters also use the heap, so the estimate is a lower bound for text tables. ENUM codes take 1 to 4 bytes
+    # depending on their number of values.
+    return con.sql(
+        """
+SELECT
+    tables.table_name AS name,
+    ANY_VALUE(tables.estimated_size) AS rows,
+    ROUND(
+        ANY_VALUE(tables.estimated_size) * SUM(
+            CASE
+                WHEN columns.data_type IN ('BOOLEAN', 'TINYINT', 'UTINYINT') THEN 1
+                WHEN columns.data_type IN ('SMALLINT', 'USMALLINT') OR columns.data_type LIKE 'ENUM(%' THEN 2
+                WHEN columns.data_type IN ('INTEGER', 'UINTEGER', 'FLOAT', 'DATE') THEN 4
+                WHEN columns.data_type IN ('BIGINT', 'UBIGINT', 'DOUBLE', 'TIME', 'TIMESTAMP') THEN 8
+                ELSE 16
+            END
+        ) / (1024 * 1024),
+        3
+    ) AS size,
+FROM duckdb_tables() tables
+JOIN duckdb_columns() columns USING (database_name, schema_name, table_name)
+WHERE NOT tables.temporary
+GROUP BY name
+ORDER BY size DESC
+"""
+    )
+
+
+def database_memory(con):
+    return con.sql(
+        """
+SELECT
+    ROUND(SUM(memory_usage_bytes) / (1024 * 1024), 3) AS memory,
+    ROUND(SUM(temporary_storage_bytes) / (1024 * 1024), 3) AS spilled,
+    CURRENT_SETTING('memory_limit') AS memory_limit,
+    CURRENT_SETTING('threads') AS threads,
+    CURRENT_SETTING('temp_directory') AS temp_directory,
+FROM duckdb_memory()
+"""
+    )
+
+
+DEBUG = [
+    table_max_count,
+    bronze_ingest_chrono,
+    process_without_open_file,
+    foreign_ip_packet_without_process,
+    gold_fact_network_ip_count,
+    gold_fact_process_network_count,
+    table_memory,
+    database_memory,
+]
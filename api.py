@@ -0,0 +1,165 @@
+import argparse
+import inspect
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import duckdb
+
+from report import GROUPS
+from schema import TABLES
+
+API_HOST = "127.0.0.1"
+API_PORT = 8765
+RESULT_CACHE_SIZE = 256  # Results kept for the distinct analyses, windows and filters requested
+FILTERS = {"hide_pid": int, "hide_user": str, "hide_command": str}
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+
+LOGGER = logging.getLogger(__name__)
+
+_results: OrderedDict = OrderedDict()
+_results_lock = threading.Lock()
+_server = None
+_server_lock = threading.Lock()
+
+
+def analyses():
+    """Return the analyses served, by page, with the filters they accept."""
+    return {
+        group: {
+            function.__name__: [name for name in inspect.signature(function).parameters if name in FILTERS]
+            for function in functions
+        }
+        for group, (functions, _) in GROUPS.items()
+    }
+
+
+def run(group, name, query):
+    """Run the analysis `name` of the page `group` with the window, filters and hosts of the `query` parameters.
+
+    The window defaults to the time extent of the page. Results are shared by the clients requesting the same
+    analysis, and computed again once the source files are rewritten.
+    """
+    import pages
+
+    functions, range_table = GROUPS[group]
+    function = next(function for function in functions if function.__name__ == name)
+    params: list = []
+    window = None
+    if range_table is not None:
+        start, end = [datetime.fromisoformat(query[bound][0]) if bound in query else None for bound in ("start", "end")]
+        if start is None or end is None:
+            extent = pages.time_range(*range_table)
+            start, end = start or extent[0], end or extent[1]
+        window = (start, end)
+        params = list(window)
+        accepted = inspect.signature(function).parameters
+        params += [tuple(map(FILTERS[param], query.get(param, []))) for param in FILTERS if param in accepted]
+        if "approximate" in accepted:
+            params.append(query.get("approximate", ["false"])[0] == "true")
+    hosts = query.get("hosts")
+    key = (group, name, tuple(params), tuple(hosts) if hosts else None)
+    with _results_lock:
+        if key in _results:
+            _results.move_to_end(key)
+        elif len(_results) >= RESULT_CACHE_SIZE:
+            # Least recently requested first.
+            _results.popitem(last=False)
+    # Concurrent clients may compute the same result twice, the last one is kept.
+    return pages.fetch(_results, key, TABLES, window, function, params, hosts=hosts, preview=False)
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Serve `GET /<page>/<analysis>` with the `start`, `end`, `hide_*`, `approximate` and `hosts` query parameters.
+
+    Results are returned as JSON records, or as an Arrow IPC stream with `format=arrow`. `GET /` lists the analyses.
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        path = [part for part in url.path.split("/") if part]
+        served = analyses()
+        if not path:
+            return self._send(200, "application/json", json.dumps(served).encode())
+        if len(path) != 2 or path[0] not in served or path[1] not in served[path[0]]:
+            return self._error(404, f"Unknown analysis {url.path}, see / for the list.")
+        try:
+            result = run(*path, query)
+        except ValueError as error:
+            return self._error(400, str(error))
+        except duckdb.Error as error:
+            LOGGER.exception("Analysis %s failed.", url.path)
+            return self._error(500, str(error))
+        if query.get("format", ["json"])[0] == "arrow":
+            import pyarrow as pa
+
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, result.schema) as writer:
+                writer.write_table(result)
+            return self._send(200, ARROW_TYPE, sink.getvalue().to_pybytes())
+        records = result.to_pandas().to_json(orient="records", date_format="iso")
+        return self._send(200, "application/json", records.encode())
+
+    def _error(self, status, message):
+        self._send(status, "application/json", json.dumps({"error": message}).encode())
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start(host=API_HOST, port=API_PORT):
+    """Serve the analyses from a background thread of the dashboard process, started once per process.
+
+    Requests read the database loaded by the pages, reusing their connection while it covers the requested window.
+    Return the server.
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = _listen(host, port)
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server
+
+
+def serve(host=API_HOST, port=API_PORT):
+    """Serve the analyses of the database set by `RSBD_FORMAT` and `RSBD_PATH`, one thread per request.
+
+    The database is loaded by this process, apart from the one of a running dashboard.
+    """
+    server = _listen(host, port)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def _listen(host, port):
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the dashboard analyses as JSON or Arrow over HTTP.")
+    parser.add_argument("path", help="Export directory, DuckDB file, history store or `host=path;...` sources.")
+    parser.add_argument("--format", default="parquet", help="Export format: parquet, csv, duckdb or history.")
+    parser.add_argument("--host", default=API_HOST, help="Listening address, local only by default.")
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args()
+    os.environ["RSBD_FORMAT"], os.environ["RSBD_PATH"] = args.format, args.path
+    print(f"Serving the analyses of {args.path} on http://{args.host}:{args.port}/")
+    serve(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
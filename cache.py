@@ -0,0 +1,84 @@
+import hashlib
+import os
+import threading
+
+import duckdb
+
+from schema import DERIVED_TABLES, derive, describe, encode, inputs, machine, projection, source
+
+CACHE_DIRECTORY = ".output/cache"
+FINGERPRINT_TABLE = "rsdb_fingerprint"
+SORT_COLUMN = "created_at"
+
+_build_lock = threading.Lock()
+
+
+def fingerprint(file_path):
+    stat = os.stat(file_path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def cache_path(db_path, cache_directory=CACHE_DIRECTORY):
+    name = hashlib.sha1(os.path.abspath(db_path).encode()).hexdigest()[:16]
+    return os.path.join(cache_directory, f"{name}.duckdb")
+
+
+def build(db_path, db_format, tables, cache_directory=CACHE_DIRECTORY, con=None):
+    """Convert an export directory into a DuckDB file, rebuilding only tables whose source file changed.
+
+    Tables only keep their columns declared in the gold schema, their repeated strings are encoded as ENUMs. Fact
+    tables are sorted by `created_at` so zone maps prune the date range predicates of the pages. Only the rebuilt
+    tables are encoded, the ENUM types are kept unless a rebuilt table brings new values. The derived tables are
+    computed again when one of the tables they read was converted, or when their query changed.
+
+    With `con`, a read-write connection to the cache, it is rebuilt in place in one transaction: the queries of its
+    other cursors keep reading the previous tables until they end. Otherwise the process must not hold a connection
+    to the cache, DuckDB refuses to open it again with other settings.
+    """
+    path = cache_path(db_path, cache_directory)
+    os.makedirs(cache_directory, exist_ok=True)
+    with _build_lock:
+        con = duckdb.connect(database=path) if con is None else con.cursor()
+        try:
+            con.execute(
+                f"CREATE TABLE IF NOT EXISTS {FINGERPRINT_TABLE} (name VARCHAR PRIMARY KEY, fingerprint VARCHAR);"
+            )
+            known = dict(con.execute(f"SELECT name, fingerprint FROM {FINGERPRINT_TABLE}").fetchall())
+            con.execute("BEGIN TRANSACTION;")
+            rebuilt = []
+            for table in tables:
+                # A new column in the gold schema also rebuilds its table.
+                select = projection(table, machine=machine(db_path))
+                current = f"{fingerprint(f'{db_path}/{table}.{db_format}')}-{_version(select)}"
+                if known.get(table) == current:
+                    continue
+                relation = source(db_path, table, db_format)
+                columns = describe(con, relation)
+                order = f" ORDER BY {SORT_COLUMN}" if SORT_COLUMN in columns else ""
+                con.execute(
+                    f"CREATE OR REPLACE TABLE {table} AS "
+                    f"SELECT {projection(table, columns, machine(db_path))} FROM {relation}{order};"
+                )
+                con.execute(f"INSERT OR REPLACE INTO {FINGERPRINT_TABLE} VALUES (?, ?);", [table, current])
+                rebuilt.append(table)
+            changed = set(rebuilt) | encode(con, rebuilt)
+            stale = []
+            for table, query in DERIVED_TABLES.items():
+                # Derived tables come after the tables they read.
+                if known.get(table) != _version(query) or changed.intersection(inputs(table)):
+                    stale.append(table)
+                    changed.add(table)
+            derive(con, exclude=[table for table in DERIVED_TABLES if table not in stale])
+            for table in stale:
+                con.execute(
+                    f"INSERT OR REPLACE INTO {FINGERPRINT_TABLE} VALUES (?, ?);",
+                    [table, _version(DERIVED_TABLES[table])],
+                )
+            con.execute("COMMIT;")
+        finally:
+            con.close()
+    return path
+
+
+def _version(query):
+    return hashlib.sha1(query.encode()).hexdigest()
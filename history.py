@@ -0,0 +1,458 @@
+import glob
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+
+import duckdb
+
+from cache import fingerprint
+from schema import DERIVED_TABLES, ROLLUP_COLUMNS, TABLES, derive, describe, inputs, machine, projection
+from schema import source as export_source
+
+HISTORY_DIRECTORY = ".output/history"
+VERSION_FILE = "_version.json"
+PARTITION_COLUMN = "created_at"
+INGEST_FREQUENCY = 5  # Seconds, rstracer exports every `schedule.export` seconds
+COMPACTION_FREQUENCY = 600  # Seconds
+COMPACTION_DELAY = timedelta(minutes=10)  # Late rows of an hour are still exported during the gold retention
+
+# Retention tiers of the largest fact tables as (directory suffix, bucket in seconds, retention). Partitions older than
+# the retention of a tier are rolled up by time bucket into the next tier then dropped, the last tier is only dropped.
+TIERS = [
+    ("", None, timedelta(hours=1)),
+    ("_10s", 10, timedelta(days=1)),
+    ("_1m", 60, timedelta(days=30)),
+]
+# Grouping columns and aggregations of the rolled up tables, giving the same result when rolled up again. IP rows are
+# rolled up with the length and transport of their packet, and packets with the pid of their process, the other
+# columns, like `_id`, are kept empty. IP rows are rolled up first, while their packets are still raw. Network flows
+# keep their packets, bytes and pid.
+ROLLUPS = {
+    "gold_fact_process": (["pid"], {"pcpu": "MAX(pcpu)", "pmem": "MAX(pmem)"}),
+    "gold_fact_network_ip": (
+        ["source_address", "destination_address", "source_port", "destination_port", "transport"],
+        {"length": "SUM(length)::BIGINT", "packets": "SUM(packets)::BIGINT"},
+    ),
+    "gold_fact_network_packet": (
+        ["interface", "network", "transport", "application", "pid"],
+        {"length": "SUM(length)::BIGINT", "packets": "SUM(packets)::BIGINT"},
+    ),
+    "network_flow": (
+        ["machine", "local_address", "local_port", "remote_address", "remote_port", "transport"],
+        {
+            "first_seen": "MIN(first_seen)",
+            "last_seen": "MAX(last_seen)",
+            "sent_packets": "SUM(sent_packets)::BIGINT",
+            "sent_bytes": "SUM(sent_bytes)::BIGINT",
+            "received_packets": "SUM(received_packets)::BIGINT",
+            "received_bytes": "SUM(received_bytes)::BIGINT",
+            "pid": "ANY_VALUE(pid)",
+        },
+    ),
+}
+# Raw rows are linked by their `_id` to the rows of a `(table, key, aggregations)`, resolving their `ROLLUP_COLUMNS`.
+# Links of an untiered table are dropped with their rolled up rows.
+ROLLUP_LINKS = {
+    "gold_fact_network_ip": (
+        "gold_fact_network_packet",
+        "_id",
+        {"length": "ANY_VALUE(length)", "transport": "ANY_VALUE(transport)"},
+    ),
+    "gold_fact_network_packet": ("gold_fact_process_network", "packet_id", {"pid": "ANY_VALUE(pid)"}),
+}
+# Network flows of each second of the new IP rows are appended with them, read with the export tables they are derived
+# from. Rolled up with the packets, they keep the pid of their conversation once the links of the packets are dropped.
+FLOW_TABLE = "network_flow"
+FLOW_FACT = "gold_fact_network_ip"
+FLOW_SOURCES = [
+    "gold_dim_network_foreign_ip",
+    "gold_dim_network_host",
+    "gold_dim_network_interface",
+    "gold_dim_network_open_port",
+    "gold_fact_network_packet",
+    "gold_fact_process_network",
+]
+
+# Technical tables overwritten by each export, also appended with the date of their snapshot to chart their evolution.
+METRIC_TABLES = ["gold_tech_chrono", "gold_tech_table_count"]
+METRIC_SUFFIX = "_history"
+REGRESSION_WINDOW = timedelta(minutes=15)  # Recent ingestion timings, compared with the hour before
+REGRESSION_FACTOR = 1.5  # Ingestion regressed when its recent median is `REGRESSION_FACTOR` times slower
+INGEST_ALERT = 10  # Seconds of bronze to silver ingestion above which the debug page alerts
+
+LOGGER = logging.getLogger(__name__)
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+class HistoryStore:
+    """Append-only store of the rstracer gold tables, fed with successive export snapshots.
+
+    Tables with a `created_at` column are partitioned by hour in `<table>/hour=YYYYMMDDHH/*.parquet`, each snapshot
+    only appending the rows whose `_id` is not stored yet. The other tables are small and merged in
+    `<table>/data.parquet`, keeping the last version of each `_id`. The technical ones are replaced by their last
+    snapshot and appended to `<table>_history` with the date of the snapshot in `created_at`. The network flows of the
+    new IP rows are appended by second to `network_flow`, so they are never computed again from the stored packets.
+    """
+
+    def __init__(self, directory=HISTORY_DIRECTORY):
+        self.directory = directory
+        self._fingerprints = {}
+
+    def ingest(self, export_path, export_format="parquet"):
+        """Store the new rows of an export snapshot. Return the names of the updated tables."""
+        updated = []
+        os.makedirs(self.directory, exist_ok=True)
+        con = duckdb.connect(database=":memory:")
+        try:
+            for table in TABLES:
+                file = f"{export_path}/{table}.{export_format}"
+                if not os.path.exists(file):
+                    continue
+                current = fingerprint(file)
+                if self._fingerprints.get(table) == current:
+                    continue
+                relation = export_source(export_path, table, export_format)
+                try:
+                    con.execute(f"CREATE OR REPLACE TABLE snapshot AS SELECT * FROM {relation};")
+                except duckdb.Error:
+                    # rstracer is rewriting the file, it will be ingested with the next snapshot.
+                    continue
+                columns = [column[0] for column in con.execute("DESCRIBE snapshot").fetchall()]
+                if PARTITION_COLUMN in columns:
+                    self._append(con, table, columns)
+                else:
+                    self._merge(con, table, columns)
+                self._fingerprints[table] = current
+                updated.append(table)
+                if table in METRIC_TABLES:
+                    self._record_metrics(con, table, columns)
+                    updated.append(table + METRIC_SUFFIX)
+            if self._update_flows(con, export_path, export_format):
+                updated.append(FLOW_TABLE)
+        finally:
+            con.close()
+        if updated:
+            stored_versions = versions(self.directory)
+            stored_versions.update({table: time.time_ns() for table in updated})
+            with open(version_file(self.directory) + ".tmp", "w") as file:
+                json.dump(stored_versions, file)
+            os.replace(version_file(self.directory) + ".tmp", version_file(self.directory))
+        return updated
+
+    def _append(self, con, table, columns):
+        hours = con.execute(
+            f"SELECT DISTINCT DATE_TRUNC('hour', {PARTITION_COLUMN}) FROM snapshot WHERE {PARTITION_COLUMN} IS NOT NULL"
+        ).fetchall()
+        for (hour,) in hours:
+            partition = os.path.join(self.directory, table, f"hour={hour:%Y%m%d%H}")
+            os.makedirs(partition, exist_ok=True)
+            rows = f"SELECT * FROM snapshot WHERE DATE_TRUNC('hour', {PARTITION_COLUMN}) = $hour"
+            stored = sorted(glob.glob(os.path.join(partition, "*.parquet")))
+            if stored and "_id" in columns:
+                # Parts are sorted by `created_at`, the statistics skip the ones older than the snapshot.
+                rows += (
+                    f" AND _id NOT IN (SELECT _id FROM read_parquet({stored}, hive_partitioning = false) "
+                    f"WHERE {PARTITION_COLUMN} >= (SELECT MIN({PARTITION_COLUMN}) FROM snapshot))"
+                )
+            elif stored:
+                rows = f"({rows}) EXCEPT SELECT * FROM read_parquet({stored}, hive_partitioning = false)"
+            con.execute(f"CREATE OR REPLACE TABLE new_rows AS {rows} ORDER BY {PARTITION_COLUMN};", {"hour": hour})
+            if con.execute("SELECT COUNT(*) FROM new_rows").fetchone()[0] > 0:
+                _write(con, "new_rows", os.path.join(partition, f"part-{time.time_ns()}.parquet"))
+                if table == FLOW_FACT:
+                    con.execute("CREATE TABLE IF NOT EXISTS new_flow_rows AS FROM new_rows LIMIT 0;")
+                    con.execute("INSERT INTO new_flow_rows BY NAME FROM new_rows;")
+
+    def _record_metrics(self, con, table, columns):
+        recorded_at = datetime.now()
+        partition = os.path.join(self.directory, table + METRIC_SUFFIX, f"hour={recorded_at:%Y%m%d%H}")
+        os.makedirs(partition, exist_ok=True)
+        # Every snapshot reuses the same `_id`, the compaction would only keep one of them.
+        exclude = " EXCLUDE (_id)" if "_id" in columns else ""
+        con.execute(
+            f"CREATE OR REPLACE TABLE metrics AS SELECT *{exclude}, $recorded_at AS {PARTITION_COLUMN} FROM snapshot;",
+            {"recorded_at": recorded_at},
+        )
+        _write(con, "metrics", os.path.join(partition, f"part-{time.time_ns()}.parquet"))
+
+    def _update_flows(self, con, export_path, export_format):
+        new_rows = con.execute("SELECT COUNT(*) FROM duckdb_tables() WHERE table_name = 'new_flow_rows'").fetchone()[0]
+        if not new_rows or not all(os.path.exists(f"{export_path}/{table}.{export_format}") for table in FLOW_SOURCES):
+            return False
+        # Stored flows are labeled with the store, loads label them with the name of their source.
+        name = machine(self.directory)
+        try:
+            for table in FLOW_SOURCES:
+                relation = export_source(export_path, table, export_format)
+                select = projection(table, describe(con, relation), name)
+                con.execute(f"CREATE OR REPLACE TABLE {table} AS SELECT {select} FROM {relation};")
+        except duckdb.Error:
+            LOGGER.warning("Export rewritten while reading it, the flows of the new %s rows are skipped.", FLOW_FACT)
+            return False
+        con.execute(
+            f"CREATE OR REPLACE TABLE {FLOW_FACT} AS "
+            f"SELECT {projection(FLOW_FACT, describe(con, 'new_flow_rows'), name)} FROM new_flow_rows;"
+        )
+        # Only the flows and the tables they read are derived, the others read tables not loaded here.
+        needed = {FLOW_TABLE, *inputs(FLOW_TABLE)}
+        derive(con, temporary=True, exclude=[table for table in DERIVED_TABLES if table not in needed])
+        con.execute(f"CREATE OR REPLACE TABLE new_flows AS SELECT * FROM {FLOW_TABLE};")
+        hours = con.execute(f"SELECT DISTINCT DATE_TRUNC('hour', {PARTITION_COLUMN}) FROM new_flows").fetchall()
+        for (hour,) in hours:
+            # Seconds of a conversation split over several exports are summed by the pages.
+            partition = os.path.join(self.directory, FLOW_TABLE, f"hour={hour:%Y%m%d%H}")
+            os.makedirs(partition, exist_ok=True)
+            con.execute(
+                f"CREATE OR REPLACE TABLE new_rows AS SELECT * FROM new_flows "
+                f"WHERE DATE_TRUNC('hour', {PARTITION_COLUMN}) = $hour ORDER BY {PARTITION_COLUMN};",
+                {"hour": hour},
+            )
+            _write(con, "new_rows", os.path.join(partition, f"part-{time.time_ns()}.parquet"))
+        return bool(hours)
+
+    def _merge(self, con, table, columns):
+        os.makedirs(os.path.join(self.directory, table), exist_ok=True)
+        data = os.path.join(self.directory, table, "data.parquet")
+        if table in METRIC_TABLES:
+            # Overwritten by each export, their previous snapshots are only kept in `<table>_history`.
+            _write(con, "snapshot", data)
+            return
+        rows = "SELECT *, 0 AS _rank FROM snapshot"
+        if os.path.exists(data):
+            rows += f" UNION ALL BY NAME SELECT *, 1 AS _rank FROM read_parquet('{data}')"
+        if "_id" in columns:
+            rows = (
+                f"SELECT * EXCLUDE (_rank) FROM ({rows}) "
+                "QUALIFY ROW_NUMBER() OVER (PARTITION BY _id ORDER BY _rank) = 1"
+            )
+        else:
+            rows = f"SELECT DISTINCT * EXCLUDE (_rank) FROM ({rows})"
+        con.execute(f"CREATE OR REPLACE TABLE merged AS {rows};")
+        _write(con, "merged", data)
+
+    def compact(self, now=None):
+        """Merge the parts of each closed hour partition into a single file deduplicated on `_id`."""
+        limit = (now or datetime.now()) - COMPACTION_DELAY
+        con = duckdb.connect(database=":memory:")
+        try:
+            for partition in glob.glob(os.path.join(self.directory, "*", "hour=*")):
+                hour = datetime.strptime(os.path.basename(partition), "hour=%Y%m%d%H")
+                parts = _parts(partition)
+                if len(parts) < 2 or hour + timedelta(hours=1) > limit:
+                    continue
+                rows = f"SELECT * FROM read_parquet({parts}, union_by_name = true, hive_partitioning = false)"
+                columns = [column[0] for column in con.execute(f"DESCRIBE {rows}").fetchall()]
+                # Rolled up rows have no `_id`, the rows of a tier are all kept.
+                tier = os.path.basename(os.path.dirname(partition)) in _tiers()
+                unique = " QUALIFY ROW_NUMBER() OVER (PARTITION BY _id) = 1" if "_id" in columns and not tier else ""
+                con.execute(f"CREATE OR REPLACE TABLE compacted AS {rows}{unique} ORDER BY {PARTITION_COLUMN};")
+                _write(con, "compacted", os.path.join(partition, f"part-{time.time_ns()}.parquet"))
+                for part in parts:
+                    os.remove(part)
+        finally:
+            con.close()
+
+    def downsample(self, now=None):
+        """Roll up the expired partitions of the tiered tables into their next tier and drop them."""
+        now = now or datetime.now()
+        con = duckdb.connect(database=":memory:")
+        try:
+            for table in ROLLUPS:
+                for (suffix, _, retention), (next_suffix, bucket, _) in zip(TIERS, TIERS[1:]):
+                    for partition, hour in self._expired(table + suffix, now - retention):
+                        target = os.path.join(self.directory, table + next_suffix, f"hour={hour:%Y%m%d%H}")
+                        rows = f"read_parquet({_parts(partition)}, union_by_name = true, hive_partitioning = false)"
+                        if not suffix and table in ROLLUP_LINKS:
+                            rows = self._link(con, table, rows)
+                        self._roll_up(con, table, rows, bucket, target)
+                        if not suffix and table in ROLLUP_LINKS:
+                            self._unlink(con, table, partition)
+                        shutil.rmtree(partition)
+                for partition, _ in self._expired(table + TIERS[-1][0], now - TIERS[-1][2]):
+                    shutil.rmtree(partition)
+        finally:
+            con.close()
+
+    def _link(self, con, table, rows):
+        """Return the raw `rows` of a table with their `ROLLUP_COLUMNS`, resolved from their links."""
+        linked, key, aggregations = ROLLUP_LINKS[table]
+        links = glob.glob(os.path.join(self.directory, linked, "**", "*.parquet"), recursive=True)
+        columns = [
+            f"link.{column}" if links and column in aggregations else f"{default} AS {column}"
+            for column, default in ROLLUP_COLUMNS[table].items()
+        ]
+        if not links:
+            return f"(SELECT *, {', '.join(columns)} FROM {rows})"
+        link = (
+            f"SELECT {key} AS _id, {', '.join(f'{value} AS {column}' for column, value in aggregations.items())} "
+            f"FROM read_parquet({links}, union_by_name = true, hive_partitioning = false) GROUP BY {key}"
+        )
+        return f"(SELECT raw.*, {', '.join(columns)} FROM {rows} raw LEFT JOIN ({link}) link ON raw._id = link._id)"
+
+    def _unlink(self, con, table, partition):
+        linked, key, _ = ROLLUP_LINKS[table]
+        data = os.path.join(self.directory, linked, "data.parquet")
+        if linked in ROLLUPS or not os.path.exists(data):
+            return
+        con.execute(
+            f"CREATE OR REPLACE TABLE unlinked AS SELECT data.* FROM read_parquet('{data}') data "
+            f"ANTI JOIN read_parquet({_parts(partition)}, union_by_name = true, hive_partitioning = false) rolled "
+            f"ON data.{key} = rolled._id;"
+        )
+        _write(con, "unlinked", data)
+
+    def _roll_up(self, con, table, rows, bucket, target):
+        groups, aggregations = ROLLUPS[table]
+        expressions = []
+        for column, column_type, *_ in con.execute(f"DESCRIBE SELECT * FROM {rows}").fetchall():
+            if column == PARTITION_COLUMN:
+                expressions.append(f"TIME_BUCKET(INTERVAL '{bucket} seconds', {column}) AS {column}")
+            elif column in groups:
+                expressions.append(column)
+            elif column in aggregations:
+                expressions.append(f"{aggregations[column]} AS {column}")
+            else:
+                expressions.append(f"NULL::{column_type} AS {column}")
+        con.execute(
+            f"CREATE OR REPLACE TABLE rolled AS SELECT {', '.join(expressions)} "
+            f"FROM {rows} GROUP BY ALL ORDER BY {PARTITION_COLUMN};"
+        )
+        os.makedirs(target, exist_ok=True)
+        _write(con, "rolled", os.path.join(target, f"part-{time.time_ns()}.parquet"))
+
+    def _expired(self, directory, limit):
+        for partition in sorted(glob.glob(os.path.join(self.directory, directory, "hour=*"))):
+            hour = datetime.strptime(os.path.basename(partition), "hour=%Y%m%d%H")
+            if hour + timedelta(hours=1) <= limit:
+                yield partition, hour
+
+
+def source(directory, table):
+    """Return the DuckDB table expression reading a table of the history store, across its retention tiers.
+
+    Tiers never overlap in time, each range is read from the finest tier still holding it.
+    """
+    tiers = TIERS if table in ROLLUPS else TIERS[:1]
+    paths = [os.path.join(directory, table + suffix, "**", "*.parquet") for suffix, _, _ in tiers]
+    paths = [path for path in paths if glob.glob(path, recursive=True)] or paths[:1]
+    return f"read_parquet({paths}, union_by_name = true, hive_partitioning = false)"
+
+
+def _parts(partition):
+    return sorted(glob.glob(os.path.join(partition, "*.parquet")))
+
+
+def _tiers():
+    """Return the directories of the rolled up tiers."""
+    return {table + suffix for table in ROLLUPS for suffix, _, _ in TIERS[1:]}
+
+
+def _write(con, table, path):
+    # Written aside then renamed, readers never see a partial file.
+    con.execute(f"COPY {table} TO '{path}.tmp' (FORMAT PARQUET);")
+    os.replace(f"{path}.tmp", path)
+
+
+def version_file(directory):
+    return os.path.join(directory, VERSION_FILE)
+
+
+def versions(directory):
+    """Return the time of the last update of each stored table."""
+    if not os.path.exists(version_file(directory)):
+        return {}
+    with open(version_file(directory)) as file:
+        return json.load(file)
+
+
+def metrics(table, directory=HISTORY_DIRECTORY):
+    """Return the recorded snapshots of a technical table ordered by their `created_at`, None before the first one."""
+    path = os.path.join(directory, table + METRIC_SUFFIX, "**", "*.parquet")
+    if not glob.glob(path, recursive=True):
+        return None
+    con = duckdb.connect(database=":memory:")
+    try:
+        rows = f"read_parquet('{path}', union_by_name = true, hive_partitioning = false)"
+        return con.sql(f"SELECT * FROM {rows} ORDER BY {PARTITION_COLUMN}").to_arrow_table()
+    finally:
+        con.close()
+
+
+def slow_ingestions(threshold, directory=HISTORY_DIRECTORY):
+    """Return the `(name, max_ingest)` of the objects slower than `threshold` seconds in the last recorded timings."""
+    path = os.path.join(directory, "gold_tech_chrono" + METRIC_SUFFIX, "**", "*.parquet")
+    if not glob.glob(path, recursive=True):
+        return []
+    con = duckdb.connect(database=":memory:")
+    try:
+        return con.execute(
+            f"""
+SELECT name, max_ingest
+FROM read_parquet('{path}', union_by_name = true, hive_partitioning = false)
+QUALIFY {PARTITION_COLUMN} = MAX({PARTITION_COLUMN}) OVER () AND max_ingest > $threshold
+ORDER BY max_ingest DESC
+""",
+            {"threshold": threshold},
+        ).fetchall()
+    finally:
+        con.close()
+
+
+def ingestion_regressions(directory=HISTORY_DIRECTORY, now=None):
+    """Return the objects whose median ingestion time over the last `REGRESSION_WINDOW` regressed from the hour before.
+
+    Each row has the `name` of the object, its `baseline` and `recent` medians of `max_ingest` in seconds.
+    """
+    path = os.path.join(directory, "gold_tech_chrono" + METRIC_SUFFIX, "**", "*.parquet")
+    if not glob.glob(path, recursive=True):
+        return []
+    recent = (now or datetime.now()) - REGRESSION_WINDOW
+    con = duckdb.connect(database=":memory:")
+    try:
+        return con.execute(
+            f"""
+SELECT
+    name,
+    MEDIAN(max_ingest) FILTER ({PARTITION_COLUMN} < $recent) AS baseline,
+    MEDIAN(max_ingest) FILTER ({PARTITION_COLUMN} >= $recent) AS recent,
+FROM read_parquet('{path}', union_by_name = true, hive_partitioning = false)
+WHERE {PARTITION_COLUMN} >= $recent - INTERVAL 1 HOUR
+GROUP BY name
+HAVING recent > $factor * baseline
+ORDER BY recent / baseline DESC
+""",
+            {"recent": recent, "factor": REGRESSION_FACTOR},
+        ).fetchall()
+    finally:
+        con.close()
+
+
+def record(export_path, export_format="parquet", directory=HISTORY_DIRECTORY):
+    """Ingest the export snapshots into the history store from a background thread, started once per process."""
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None or not _recorder.is_alive():
+            _recorder = threading.Thread(
+                target=_record, args=(HistoryStore(directory), export_path, export_format), daemon=True
+            )
+            _recorder.start()
+
+
+def _record(store, export_path, export_format):
+    last_compaction = time.monotonic()
+    while True:
+        try:
+            store.ingest(export_path, export_format)
+            if time.monotonic() - last_compaction > COMPACTION_FREQUENCY:
+                store.compact()
+                store.downsample()
+                last_compaction = time.monotonic()
+        except (duckdb.Error, OSError):
+            LOGGER.exception("History recording failed, retrying with the next snapshot.")
+        time.sleep(INGEST_FREQUENCY)
@@ -0,0 +1,139 @@
+import glob
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+import advisor
+
+LOG_DIRECTORY = ".output/log"
+TAIL_FREQUENCY = 1  # Seconds
+EVENT_HISTORY = 3600  # Seconds of per second counts kept
+LINE_HISTORY = 200  # Last warning and error lines kept
+# Events counted in the rstracer logs, matched on the message, without the module target of the line.
+EVENTS = {
+    "channel_full": re.compile(r"channel.*full|full.*channel", re.IGNORECASE),
+    "batch": re.compile(r"batch", re.IGNORECASE),
+    "export": re.compile(r"export", re.IGNORECASE),
+}
+LINE = re.compile(
+    r"^(?P<time>\d{4}-\d{2}-\d{2}[T ][\d:.]+)(?P<zone>\S*)\s+(?P<level>TRACE|DEBUG|INFO|WARN|ERROR)\b\W*"
+    r"(?:(?P<target>[A-Za-z_]\w*(?:::\w+)*):\s+)?(?P<message>.*)"
+)
+ANSI = re.compile(r"\x1b\[[0-9;]*m")
+
+LOGGER = logging.getLogger(__name__)
+
+_tailer = None
+_tailer_lock = threading.Lock()
+
+
+class LogTailer:
+    """Follower of the rotating log files of rstracer, counting their events per second.
+
+    Each poll reads the bytes appended since the previous one, a new file created by the rotation is read from its
+    start and a file replaced under the same name is read again.
+    """
+
+    def __init__(self, directory=LOG_DIRECTORY):
+        self.directory = directory
+        self._offsets = {}
+        self._partial = {}
+        self._counts = {}
+        self._lines = deque(maxlen=LINE_HISTORY)
+        self._lock = threading.Lock()
+
+    def poll(self):
+        for path in sorted(glob.glob(os.path.join(self.directory, "*")), key=os.path.getmtime):
+            if not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            inode, offset = self._offsets.get(path, (stat.st_ino, 0))
+            if inode != stat.st_ino or stat.st_size < offset:
+                offset = 0
+                self._partial.pop(path, None)
+            if stat.st_size == offset:
+                continue
+            with open(path, "rb") as file:
+                file.seek(offset)
+                data = self._partial.pop(path, b"") + file.read()
+                self._offsets[path] = (stat.st_ino, file.tell())
+            *lines, partial = data.split(b"\n")
+            if partial:
+                # Line still being written, completed by the next poll.
+                self._partial[path] = partial
+            self._parse([line.decode(errors="replace") for line in lines])
+        for path in set(self._offsets) - set(glob.glob(os.path.join(self.directory, "*"))):
+            del self._offsets[path]
+
+    def _parse(self, lines):
+        with self._lock:
+            for line in lines:
+                match = LINE.match(ANSI.sub("", line))
+                if match is None:
+                    continue
+                try:
+                    # Nanoseconds are truncated, a `Z` suffix means UTC and times without offset are local.
+                    zone = "+00:00" if match["zone"] == "Z" else match["zone"]
+                    second = int(datetime.fromisoformat(match["time"][:26] + zone).timestamp())
+                except ValueError:
+                    second = int(time.time())
+                counts = self._counts.setdefault(second, Counter())
+                counts[match["level"]] += 1
+                counts.update(event for event, pattern in EVENTS.items() if pattern.search(match["message"]))
+                if match["level"] in ("WARN", "ERROR"):
+                    self._lines.append(
+                        {
+                            "time": datetime.fromtimestamp(second),
+                            "level": match["level"],
+                            "target": match["target"],
+                            "message": match["message"],
+                        }
+                    )
+            if self._counts:
+                oldest = max(self._counts) - EVENT_HISTORY
+                for second in [second for second in self._counts if second < oldest]:
+                    del self._counts[second]
+
+    def series(self):
+        """Return the counts of the events and levels of each second with at least one log line, oldest first."""
+        with self._lock:
+            return [
+                {"time": datetime.fromtimestamp(second), **{name: counts[name] for name in [*EVENTS, "WARN", "ERROR"]}}
+                for second, counts in sorted(self._counts.items())
+            ]
+
+    def lines(self):
+        """Return the last warning and error lines, oldest first."""
+        with self._lock:
+            return list(self._lines)
+
+
+def log_directory(config_path=advisor.CONFIG_FILE):
+    """Return the log directory of rstracer set in its configuration file."""
+    try:
+        return advisor.setting(advisor.read_config(config_path), "logger.directory") or LOG_DIRECTORY
+    except (OSError, KeyError):
+        return LOG_DIRECTORY
+
+
+def follow(directory=None):
+    """Return the tailer of the rstracer logs, polled from a background thread started once per process."""
+    global _tailer
+    with _tailer_lock:
+        if _tailer is None:
+            _tailer = LogTailer(directory or log_directory())
+            threading.Thread(target=_follow, args=(_tailer,), daemon=True).start()
+        return _tailer
+
+
+def _follow(tailer):
+    while True:
+        try:
+            tailer.poll()
+        except OSError:
+            LOGGER.exception("Log tailing failed, retrying with the next poll.")
+        time.sleep(TAIL_FREQUENCY)
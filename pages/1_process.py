@@ -3,10 +3,28 @@ from timeit import default_timer as timer
 
 import streamlit as st
 
-from pages import add_command_red_list, add_pid_red_list, add_user_red_list, connection
+import analysis
+from pages import (
+    APPROXIMATE_CAPTION,
+    LIVE_EDGE,
+    add_approximate_mode,
+    add_auto_refresh,
+    add_command_red_list,
+    add_host_selector,
+    add_pid_red_list,
+    add_preview_label,
+    add_preview_status,
+    add_user_red_list,
+    approximate_value,
+    connection,
+    fetch,
+    refresh_every,
+    time_range,
+)
+
+PROCESS_TABLES = ["gold_fact_process", "gold_dim_process", "gold_file_user"]
 
 start_timer = timer()
-con = connection()
 
 st.set_page_config(
     page_title="Process",
@@ -19,14 +37,7 @@ st.header("Process", divider=True)
 
 # Time selection
 
-(min_date, max_date) = con.execute(
-    """
-    SELECT
-        MIN(created_at) AS min_date_process,
-        MAX(created_at) AS max_date_process
-    FROM gold_fact_process
-"""
-).fetchone()
+(min_date, max_date) = time_range("gold_fact_process")
 
 st.sidebar.header("Parameters", divider=True)
 (slider_date_min, slider_date_max) = st.sidebar.slider(
@@ -38,289 +49,223 @@ st.sidebar.header("Parameters", divider=True)
     step=timedelta(seconds=1),
 )
 
+hosts = add_host_selector(st.sidebar)
+refresh = add_auto_refresh(st.sidebar)
+approximate = add_approximate_mode(st.sidebar)
+window = (slider_date_min, LIVE_EDGE if refresh and slider_date_max == max_date else slider_date_max)
+con = connection(window=window, hosts=hosts)
+
 # Red list
 
 hide_user = add_user_red_list(con, st.sidebar)
 hide_pid = add_pid_red_list(con, st.sidebar)
 hide_command = add_command_red_list(con, st.sidebar)
 
+params = [window[0], window[1], hide_pid, hide_user, hide_command]
+# Distinct counts are estimated with HyperLogLog in approximate mode, the process totals merge the sketch of each
+# minute unless pids are hidden.
+sketch_params = [*params, approximate]
+
 # Mem & Cpu Analysis
 
-resource_per_command = con.execute(
-    """
-SELECT
-    MAX(fact.pcpu) AS pcpu,
-    MAX(fact.pmem) AS pmem,
-    COALESCE(pro.command, pro.full_command) AS command,
-    TO_TIMESTAMP(FLOOR(EXTRACT('epoch' FROM fact.created_at))) AT TIME ZONE 'UTC' AS time,
-FROM
-    gold_fact_process fact
-LEFT JOIN
-    gold_dim_process pro ON fact.pid = pro.pid
-LEFT JOIN
-    gold_file_user usr ON pro.uid = usr.uid
-WHERE
-    fact.created_at >= ? AND fact.created_at <= ?
-AND pro.pid NOT IN ?
-AND  usr.name NOT IN ?
-AND pro.command NOT IN ?
-GROUP BY time, COALESCE(pro.command, pro.full_command)
-ORDER BY time
-""",
-    [slider_date_min, slider_date_max, hide_pid, hide_user, hide_command],
-).df()
-
-st.subheader("CPU Usage by Command", divider=True)
-st.area_chart(
-    resource_per_command, x="time", y="pcpu", color="command", stack="center", x_label="date", y_label="CPU usage"
-)
-st.subheader("Memory Usage by Command", divider=True)
-st.area_chart(
-    resource_per_command,
-    x="time",
-    y="pmem",
-    color="command",
-    stack="center",
-    x_label="date",
-    y_label="Memory usage (%)",
-)
+
+@st.fragment(run_every=refresh_every(refresh))
+def resource_usage():
+    resource_per_command = fetch(
+        st.session_state,
+        "process.resource_per_command",
+        PROCESS_TABLES,
+        window,
+        analysis.resource_per_command,
+        params,
+        hosts=hosts,
+    )
+
+    st.subheader("CPU Usage by Command", divider=True)
+    st.area_chart(
+        resource_per_command, x="time", y="pcpu", color="command", stack="center", x_label="date", y_label="CPU usage"
+    )
+    add_preview_label(st.session_state, "process.resource_per_command")
+    st.subheader("Memory Usage by Command", divider=True)
+    st.area_chart(
+        resource_per_command,
+        x="time",
+        y="pmem",
+        color="command",
+        stack="center",
+        x_label="date",
+        y_label="Memory usage (%)",
+    )
+    add_preview_label(st.session_state, "process.resource_per_command")
+
+
+resource_usage()
 
 # Process count
 
-st.subheader("Process Repartition", divider=True)
-
-# Process by Commands
-
-process_by_command_count = con.execute(
-    """
-WITH process AS
-(
-    SELECT DISTINCT
-        fact.pid,
-        COALESCE(command, full_command) AS command
-    FROM
-        gold_fact_process fact
-    LEFT JOIN
-        gold_dim_process pro ON fact.pid = pro.pid
-    LEFT JOIN
-        gold_file_user usr ON pro.uid = usr.uid
-    WHERE
-        fact.created_at >= ? AND fact.created_at <= ?
-    AND pro.pid NOT IN ?
-    AND usr.name NOT IN ?
-    AND pro.command NOT IN ?
-)
-SELECT
-    command,
-    COUNT(*) AS count
-FROM process
-GROUP BY command
-ORDER BY count DESC
-""",
-    [slider_date_min, slider_date_max, hide_pid, hide_user, hide_command],
-).df()
-
-st.text("Process total launched by command")
-st.bar_chart(
-    process_by_command_count,
-    x="command",
-    y="count",
-    x_label="command",
-    y_label="count",
-    color="command",
-)
 
-# Process by User
-
-process_by_user_count = con.execute(
-    """
-WITH process AS
-(
-    SELECT DISTINCT
-        fact.pid,
-        usr.name AS user
-    FROM
-        gold_fact_process fact
-    LEFT JOIN
-        gold_dim_process pro ON fact.pid = pro.pid
-    LEFT JOIN
-        gold_file_user usr ON pro.uid = usr.uid
-    WHERE
-        fact.created_at >= ? AND fact.created_at <= ?
-    AND pro.pid NOT IN ?
-    AND usr.name NOT IN ?
-    AND pro.command NOT IN ?
-)
-SELECT
-    COALESCE(user, 'Unknwon') AS user,
-    COUNT(*) AS count
-FROM process
-GROUP BY user
-ORDER BY count DESC
-""",
-    [slider_date_min, slider_date_max, hide_pid, hide_user, hide_command],
-).df()
-
-st.text("Process total launched by user")
-st.bar_chart(
-    process_by_user_count,
-    x="user",
-    y="count",
-    x_label="user",
-    y_label="count",
-    color="user",
-)
+@st.fragment(run_every=refresh_every(refresh))
+def process_repartition():
+    st.subheader("Process Repartition", divider=True)
+
+    # Process by Commands
+
+    process_by_command_count = fetch(
+        st.session_state,
+        "process.process_by_command_count",
+        PROCESS_TABLES,
+        window,
+        analysis.process_by_command_count,
+        params,
+        hosts=hosts,
+    )
+
+    st.text("Process total launched by command")
+    st.bar_chart(
+        process_by_command_count,
+        x="command",
+        y="count",
+        x_label="command",
+        y_label="count",
+        color="command",
+    )
+    add_preview_label(st.session_state, "process.process_by_command_count")
+
+    # Process by User
+
+    process_by_user_count = fetch(
+        st.session_state,
+        "process.process_by_user_count",
+        PROCESS_TABLES,
+        window,
+        analysis.process_by_user_count,
+        params,
+        hosts=hosts,
+    )
+
+    st.text("Process total launched by user")
+    st.bar_chart(
+        process_by_user_count,
+        x="user",
+        y="count",
+        x_label="user",
+        y_label="count",
+        color="user",
+    )
+    add_preview_label(st.session_state, "process.process_by_user_count")
+
+
+process_repartition()
 
 # Metadata
 
-st.subheader("Process Actions", divider=True)
-metadata_columns = st.columns(3)
-
-# Process per children count
-
-pids_per_process = con.execute(
-    """
-WITH ppid_count AS
-(
-    SELECT
-        COUNT(DISTINCT fact.pid) AS count,
-        dim.ppid AS pid,
-    FROM
-        gold_fact_process fact
-    LEFT JOIN
-        gold_dim_process dim ON fact.pid = dim.pid
-    LEFT JOIN
-        gold_file_user usr ON dim.uid = usr.uid
-    WHERE
-        fact.created_at >= ? AND fact.created_at <= ?
-    AND fact.pid NOT IN ?
-    AND usr.name NOT IN ?
-    AND dim.command NOT IN ?
-    GROUP BY dim.ppid
-)
-SELECT
-    ppid_count.pid,
-    ppid_count.count AS children,
-    pro.command,
-FROM ppid_count LEFT JOIN gold_dim_process pro ON ppid_count.pid = pro.pid
-ORDER BY ppid_count.count DESC
-LIMIT 20
-""",
-    [slider_date_min, slider_date_max, hide_pid, hide_user, hide_command],
-).df()
-
-with metadata_columns[0]:
-    st.text("Process with most children (Top 20)")
-    st.dataframe(pids_per_process, hide_index=True)
-
-
-# Oldest process
-
-pids_per_age = con.execute(
-    """
-SELECT DISTINCT
-    fact.pid,
-    dim.command,
-    AGE(dim.inserted_at, dim.started_at) AS age,
-FROM
-    gold_fact_process fact
-LEFT JOIN
-    gold_dim_process dim ON fact.pid = dim.pid
-LEFT JOIN
-    gold_file_user usr ON dim.uid = usr.uid
-WHERE
-    fact.created_at >= ? AND fact.created_at <= ?
-AND fact.pid NOT IN ?
-AND usr.name NOT IN ?
-AND dim.command NOT IN ?
-ORDER BY age DESC
-LIMIT 20
-""",
-    [slider_date_min, slider_date_max, hide_pid, hide_user, hide_command],
-).df()
-
-with metadata_columns[1]:
-    st.text("Oldest processes (Top 20)")
-    st.dataframe(pids_per_age, hide_index=True)
-
-# Most used commands
-
-full_commands_count = con.execute(
-    """
-SELECT DISTINCT
-    COUNT(DISTINCT fact.pid) AS count,
-    dim.full_command
-FROM
-    gold_fact_process fact
-LEFT JOIN
-    gold_dim_process dim ON fact.pid = dim.pid
-LEFT JOIN
-    gold_file_user usr ON dim.uid = usr.uid
-WHERE
-    fact.created_at >= ? AND fact.created_at <= ?
-AND fact.pid NOT IN ?
-AND usr.name NOT IN ?
-AND dim.command NOT IN ?
-GROUP BY dim.full_command
-ORDER BY count DESC
-LIMIT 20
-""",
-    [slider_date_min, slider_date_max, hide_pid, hide_user, hide_command],
-).df()
-
-with metadata_columns[2]:
-    st.text("Most used commands (Top 20)")
-    st.dataframe(full_commands_count.rename(columns={"full_command": "command"}), hide_index=True)
+
+@st.fragment(run_every=refresh_every(refresh, 6))
+def process_actions():
+    st.subheader("Process Actions", divider=True)
+    metadata_columns = st.columns(3)
+
+    # Process per children count
+
+    pids_per_process = fetch(
+        st.session_state,
+        "process.pids_per_process",
+        PROCESS_TABLES,
+        window,
+        analysis.pids_per_process,
+        sketch_params,
+        hosts=hosts,
+    )
+
+    with metadata_columns[0]:
+        st.text("Process with most children (Top 20)")
+        st.dataframe(pids_per_process, hide_index=True)
+        add_preview_label(st.session_state, "process.pids_per_process")
+        if approximate:
+            st.caption(APPROXIMATE_CAPTION)
+
+    # Oldest process
+
+    pids_per_age = fetch(
+        st.session_state,
+        "process.pids_per_age",
+        PROCESS_TABLES,
+        window,
+        analysis.pids_per_age,
+        params,
+        hosts=hosts,
+    )
+
+    with metadata_columns[1]:
+        st.text("Oldest processes (Top 20)")
+        st.dataframe(pids_per_age, hide_index=True)
+        add_preview_label(st.session_state, "process.pids_per_age")
+
+    # Most used commands
+
+    full_commands_count = fetch(
+        st.session_state,
+        "process.full_commands_count",
+        PROCESS_TABLES,
+        window,
+        analysis.full_commands_count,
+        sketch_params,
+        hosts=hosts,
+        columns={"count": "count", "full_command": "command"},
+    )
+
+    with metadata_columns[2]:
+        st.text("Most used commands (Top 20)")
+        st.dataframe(full_commands_count, hide_index=True)
+        add_preview_label(st.session_state, "process.full_commands_count")
+        if approximate:
+            st.caption(APPROXIMATE_CAPTION)
+
+
+process_actions()
 
 # Statistics
 
 st.sidebar.header("Statistics", divider=True)
 
-# Process count
 
-process_total = con.execute(
-    """
-SELECT
-    COUNT(DISTINCT ROW(fact.pid, dim.started_at)) AS count,
-FROM
-    gold_fact_process fact
-LEFT JOIN
-    gold_dim_process dim ON fact.pid = dim.pid
-LEFT JOIN
-    gold_file_user usr ON dim.uid = usr.uid
-WHERE
-    fact.created_at >= ? AND fact.created_at <= ?
-AND fact.pid NOT IN ?
-AND usr.name NOT IN ?
-AND dim.command NOT IN ?
-""",
-    [slider_date_min, slider_date_max, hide_pid, hide_user, hide_command],
-).fetchone()[0]
-
-st.sidebar.write("Process total: ", process_total)
-
-# Sudo process count
-
-process_root = con.execute(
-    """
-SELECT
-    COUNT(DISTINCT ROW(fact.pid, dim.started_at)) AS count,
-FROM
-    gold_fact_process fact
-LEFT JOIN
-    gold_dim_process dim ON fact.pid = dim.pid
-LEFT JOIN
-    gold_file_user usr ON dim.uid = usr.uid
-WHERE
-    fact.created_at >= ? AND fact.created_at <= ?
-AND fact.pid NOT IN ?
-AND usr.name = 'root'
-AND dim.command NOT IN ?
-""",
-    [slider_date_min, slider_date_max, hide_pid, hide_command],
-).fetchone()[0]
-
-st.sidebar.write("Root Process: ", process_root)
+@st.fragment(run_every=refresh_every(refresh))
+def statistics():
+    # Process count
+
+    process_total = fetch(
+        st.session_state,
+        "process.process_total",
+        PROCESS_TABLES,
+        window,
+        analysis.process_total,
+        sketch_params,
+        scalar=True,
+        hosts=hosts,
+    )
+
+    st.write("Process total: ", approximate_value(process_total, approximate))
+
+    # Sudo process count
+
+    process_root = fetch(
+        st.session_state,
+        "process.process_root",
+        PROCESS_TABLES,
+        window,
+        analysis.process_root,
+        sketch_params,
+        scalar=True,
+        hosts=hosts,
+    )
+
+    st.write("Root Process: ", approximate_value(process_root, approximate))
+
+
+with st.sidebar:
+    statistics()
+
+add_preview_status(st.session_state, "process.")
 
 # Running time
 end_timer = timer()
@@ -3,10 +3,30 @@ from timeit import default_timer as timer
 
 import streamlit as st
 
-from pages import add_command_red_list, add_pid_red_list, add_user_red_list, connection
+import analysis
+from pages import (
+    APPROXIMATE_CAPTION,
+    LIVE_EDGE,
+    add_approximate_mode,
+    add_auto_refresh,
+    add_command_red_list,
+    add_host_selector,
+    add_paginated_table,
+    add_pid_red_list,
+    add_preview_label,
+    add_preview_status,
+    add_user_red_list,
+    approximate_value,
+    connection,
+    fetch,
+    refresh_every,
+    time_range,
+)
+
+FACT_TABLES = ["gold_fact_file_reg", "gold_dim_process", "gold_file_user", "gold_dim_file_reg"]
+DIM_TABLES = ["gold_dim_file_reg", "gold_dim_process", "gold_file_user"]
 
 start_timer = timer()
-con = connection()
 
 st.set_page_config(
     page_title="Files",
@@ -19,15 +39,7 @@ st.header("Regular Files", divider=True)
 
 # Time selection
 
-(min_date, max_date) = con.execute(
-    """
-SELECT
-  MIN(started_at) AS min_date_file,
-  MAX(inserted_at) AS max_date_file
-FROM
-  gold_dim_file_reg
-"""
-).fetchone()
+(min_date, max_date) = time_range("gold_dim_file_reg", "started_at", "inserted_at")
 
 st.sidebar.header("Parameters", divider=True)
 (slider_date_min, slider_date_max) = st.sidebar.slider(
@@ -39,529 +51,278 @@ st.sidebar.header("Parameters", divider=True)
     step=timedelta(seconds=1),
 )
 
+hosts = add_host_selector(st.sidebar)
+refresh = add_auto_refresh(st.sidebar)
+approximate = add_approximate_mode(st.sidebar)
+window = (slider_date_min, LIVE_EDGE if refresh and slider_date_max == max_date else slider_date_max)
+con = connection(window=window, hosts=hosts)
+
 # Red list
 
 hide_user = add_user_red_list(con, st.sidebar)
 hide_pid = add_pid_red_list(con, st.sidebar)
 hide_command = add_command_red_list(con, st.sidebar)
 
+params = [window[0], window[1], hide_pid, hide_user, hide_command]
+# Analyses with distinct counts, answered from sketches in approximate mode.
+sketch_params = [*params, approximate]
+
 # Open files Count
 
-st.subheader("File Activity", divider=True)
-open_files_chart_row = st.columns(2)
-
-files_count = con.execute(
-    """
-SELECT
-  COUNT(DISTINCT dim.name) AS count,
-  TO_TIMESTAMP(FLOOR(EXTRACT('epoch' FROM created_at))) AT TIME ZONE 'UTC' AS time,
-FROM
-  gold_fact_file_reg fact
-  LEFT JOIN gold_dim_process pro ON fact.pid = pro.pid
-  LEFT JOIN gold_file_user usr ON pro.uid = usr.uid
-  LEFT JOIN gold_dim_file_reg dim ON fact.pid = dim.pid AND fact.fd = dim.fd AND fact.node = dim.node
-WHERE
-  fact.created_at >= ?
-  AND fact.created_at <= ?
-  AND pro.pid NOT IN ?
-  AND usr.name NOT IN ?
-  AND pro.command NOT IN ?
-GROUP BY
-  time
-ORDER BY
-  time
-""",
-    [slider_date_min, slider_date_max, hide_pid, hide_user, hide_command],
-).df()
-
-st.text("Open files total")
-st.line_chart(data=files_count, x="time", y="count", x_label="date", y_label="count")
+
+@st.fragment(run_every=refresh_every(refresh))
+def file_activity():
+    st.subheader("File Activity", divider=True)
+
+    files_count = fetch(
+        st.session_state,
+        "files.files_count",
+        FACT_TABLES,
+        window,
+        analysis.files_count,
+        sketch_params,
+        hosts=hosts,
+    )
+
+    st.text("Open files total")
+    st.line_chart(data=files_count, x="time", y="count", x_label="date", y_label="count")
+    add_preview_label(st.session_state, "files.files_count")
+    if approximate:
+        st.caption(APPROXIMATE_CAPTION)
 
 
+file_activity()
+
 # File by command
 
-st.subheader("By Command Analysis", divider=True)
-
-
-file_by_command_count = con.execute(
-    """
-SELECT
-  command,
-  COUNT(DISTINCT file_name) AS count
-FROM
-(
-    SELECT
-      fact.pid,
-      fact.fd,
-      fact.node,
-      pro.command,
-      usr.name AS user_name,
-      dim.name AS file_name,
-      MIN(size) AS min_size,
-      MAX(size) AS max_size
-   FROM
-      gold_fact_file_reg fact
-      LEFT JOIN gold_dim_process pro ON fact.pid = pro.pid
-      LEFT JOIN gold_file_user usr ON pro.uid = usr.uid
-      LEFT JOIN gold_dim_file_reg dim ON fact.pid = dim.pid AND fact.fd = dim.fd AND fact.node = dim.node
-   WHERE
-      fact.created_at >= ?
-      AND fact.created_at <= ?
-      AND pro.pid NOT IN ?
-      AND usr.name NOT IN ?
-      AND pro.command NOT IN ?
-   GROUP BY
-      fact.pid,
-      fact.fd,
-      fact.node,
-      pro.command,
-      user_name,
-      file_name
-  )
-GROUP BY
- command
-ORDER BY
- count DESC
-""",
-    [slider_date_min, slider_date_max, hide_pid, hide_user, hide_command],
-).df()
-
-st.text("Command with most open files")
-st.bar_chart(
-    file_by_command_count,
-    x="command",
-    y="count",
-    x_label="command",
-    y_label="count",
-    color="command",
-)
 
-modification_by_commands = con.execute(
-    """
-SELECT
-  TO_TIMESTAMP(FLOOR(EXTRACT('epoch' FROM created_at))) AT TIME ZONE 'UTC' AS time,
-  command,
-  SUM(
-    (size::BIGINT - previous_size::BIGINT)
-  ) / (1024 * 1024) AS write_mo,
-FROM
-(
-    SELECT
-      pro.command,
-      fact.created_at,
-      size,
-      LAG(size, 1, 0) OVER (
-        PARTITION BY fact.pid,
-            fact.fd,
-            fact.node
-        ORDER BY
-            fact.created_at
-       ) AS previous_size,
-    ROW_NUMBER() OVER (
-        PARTITION BY fact.pid,
-           fact.fd,
-           fact.node
-       ORDER BY
-            fact.created_at
-      ) AS row_num
-   FROM
-      gold_fact_file_reg fact
-      LEFT JOIN gold_dim_process pro ON fact.pid = pro.pid
-      LEFT JOIN gold_file_user usr ON pro.uid = usr.uid
-   WHERE
-      fact.created_at >= ?
-      AND fact.created_at <= ?
-      AND pro.pid NOT IN ?
-      AND usr.name NOT IN ?
-      AND pro.command NOT IN ?
-  )
-WHERE
-  SIZE <> previous_size
-  AND row_num > 1
-GROUP BY
- time,
- command
-ORDER BY
- time
-  """,
-    [slider_date_min, slider_date_max, hide_pid, hide_user, hide_command],
-).df()
-
-
-st.text("Modification Size (Mo) by command")
-st.area_chart(
-    modification_by_commands,
-    x="time",
-    y="write_mo",
-    color="command",
-    stack="center",
-    x_label="date",
-    y_label="size",
-)
+@st.fragment(run_every=refresh_every(refresh))
+def by_command():
+    st.subheader("By Command Analysis", divider=True)
+
+    file_by_command_count = fetch(
+        st.session_state,
+        "files.file_by_command_count",
+        FACT_TABLES,
+        window,
+        analysis.file_by_command_count,
+        sketch_params,
+        hosts=hosts,
+    )
+
+    st.text("Command with most open files")
+    st.bar_chart(
+        file_by_command_count,
+        x="command",
+        y="count",
+        x_label="command",
+        y_label="count",
+        color="command",
+    )
+    add_preview_label(st.session_state, "files.file_by_command_count")
+    if approximate:
+        st.caption(APPROXIMATE_CAPTION)
+
+    modification_by_commands = fetch(
+        st.session_state,
+        "files.modification_by_commands",
+        FACT_TABLES,
+        window,
+        analysis.modification_by_commands,
+        params,
+        hosts=hosts,
+    )
+
+    st.text("Modification Size (Mo) by command")
+    st.area_chart(
+        modification_by_commands,
+        x="time",
+        y="write_mo",
+        color="command",
+        stack="center",
+        x_label="date",
+        y_label="size",
+    )
+    add_preview_label(st.session_state, "files.modification_by_commands")
+
+
+by_command()
 
 # File by user
 
-st.subheader("By User Analysis", divider=True)
-
-file_by_user_count = con.execute(
-    """
-SELECT
-  user_name,
-  COUNT(DISTINCT file_name) AS count
-FROM
-(
-    SELECT
-      fact.pid,
-      fact.fd,
-      fact.node,
-      pro.command,
-      dim.name AS file_name,
-      usr.name AS user_name,
-      MIN(size) AS min_size,
-      MAX(size) AS max_size
-   FROM
-      gold_fact_file_reg fact
-      LEFT JOIN gold_dim_process pro ON fact.pid = pro.pid
-      LEFT JOIN gold_file_user usr ON pro.uid = usr.uid
-      LEFT JOIN gold_dim_file_reg dim ON fact.pid = dim.pid
-      AND fact.fd = dim.fd
-      AND fact.node = dim.node
-   WHERE
-      fact.created_at >= ?
-      AND fact.created_at <= ?
-      AND pro.pid NOT IN ?
-      AND usr.name NOT IN ?
-      AND pro.command NOT IN ?
-   GROUP BY
-      fact.pid,
-      fact.fd,
-      fact.node,
-      pro.command,
-      user_name,
-      file_name
-  )
-GROUP BY
- user_name
-ORDER BY
- count DESC
-""",
-    [slider_date_min, slider_date_max, hide_pid, hide_user, hide_command],
-).df()
-
-st.text("User with most open files")
-st.bar_chart(
-    file_by_user_count,
-    x="user_name",
-    y="count",
-    x_label="user",
-    y_label="count",
-    color="user_name",
-)
 
-modification_by_users = con.execute(
-    """
-SELECT
-  TO_TIMESTAMP(FLOOR(EXTRACT('epoch' FROM created_at))) AT TIME ZONE 'UTC' AS time,
-  user,
-  SUM(
-    SIZE::BIGINT - previous_size::BIGINT
-  ) / (1024 * 1024) AS write_mo,
-FROM
-(
-    SELECT
-        usr.name AS user,
-        fact.created_at,
-        size,
-        LAG(size, 1, 0) OVER (
-        PARTITION BY fact.pid,
-            fact.fd,
-            fact.node
-            ORDER BY
-             fact.created_at
-        ) AS previous_size,
-        ROW_NUMBER() OVER (
-        PARTITION BY fact.pid,
-            fact.fd,
-            fact.node
-            ORDER BY
-             fact.created_at
-        ) AS row_num
-   FROM
-        gold_fact_file_reg fact
-        LEFT JOIN gold_dim_process pro ON fact.pid = pro.pid
-        LEFT JOIN gold_file_user usr ON pro.uid = usr.uid
-   WHERE
-      fact.created_at >= ?
-      AND fact.created_at <= ?
-      AND pro.pid NOT IN ?
-      AND usr.name NOT IN ?
-      AND pro.command NOT IN ?
-  )
-WHERE
-  SIZE <> previous_size
-  AND row_num > 1
-GROUP BY
- time,
- user
-ORDER BY
- time
-  """,
-    [slider_date_min, slider_date_max, hide_pid, hide_user, hide_command],
-).df()
-
-
-st.text("Modification Size (Mo) by user")
-st.area_chart(
-    modification_by_users,
-    x="time",
-    y="write_mo",
-    color="user",
-    stack="center",
-    x_label="date",
-    y_label="size",
-)
+@st.fragment(run_every=refresh_every(refresh))
+def by_user():
+    st.subheader("By User Analysis", divider=True)
 
+    file_by_user_count = fetch(
+        st.session_state,
+        "files.file_by_user_count",
+        FACT_TABLES,
+        window,
+        analysis.file_by_user_count,
+        sketch_params,
+        hosts=hosts,
+    )
 
-# Analysis by file name
+    st.text("User with most open files")
+    st.bar_chart(
+        file_by_user_count,
+        x="user_name",
+        y="count",
+        x_label="user",
+        y_label="count",
+        color="user_name",
+    )
+    add_preview_label(st.session_state, "files.file_by_user_count")
+    if approximate:
+        st.caption(APPROXIMATE_CAPTION)
+
+    modification_by_users = fetch(
+        st.session_state,
+        "files.modification_by_users",
+        FACT_TABLES,
+        window,
+        analysis.modification_by_users,
+        params,
+        hosts=hosts,
+    )
 
-st.subheader("By File Analysis", divider=True)
-by_file_row = st.columns(3)
-
-most_open_files = con.execute(
-    """
-SELECT
-  name,
-  COUNT(*) AS count
-FROM
-(
-    SELECT
-      *
-   FROM
-      gold_dim_file_reg file
-      LEFT JOIN gold_dim_process pro ON file.pid = pro.pid
-      LEFT JOIN gold_file_user usr ON pro.uid = usr.uid
-   WHERE
-      file.started_at >= ?
-      AND file.inserted_at <= ?
-      AND pro.pid NOT IN ?
-      AND usr.name NOT IN ?
-      AND pro.command NOT IN ?
-  )
-GROUP BY
- name
-ORDER BY
- count DESC
-    """,
-    [slider_date_min, slider_date_max, hide_pid, hide_user, hide_command],
-).df()
-
-with by_file_row[0]:
-    st.text("Most opened files")
-    st.dataframe(most_open_files, hide_index=True, column_order=["count", "name"])
-
-
-most_open_files_by_cmd = con.execute(
-    """
-SELECT
-  name,
-  COUNT(DISTINCT command) AS count
-FROM
-(
-   SELECT
-      *
-   FROM
-      gold_dim_file_reg file
-      LEFT JOIN gold_dim_process pro ON file.pid = pro.pid
-      LEFT JOIN gold_file_user usr ON pro.uid = usr.uid
-   WHERE
-      file.started_at >= ?
-      AND file.inserted_at <= ?
-      AND pro.pid NOT IN ?
-      AND usr.name NOT IN ?
-      AND pro.command NOT IN ?
-  )
-GROUP BY
- name
-ORDER BY
- count DESC
-    """,
-    [slider_date_min, slider_date_max, hide_pid, hide_user, hide_command],
-).df()
-
-with by_file_row[1]:
-    st.text("Most opened files by different command")
-    st.dataframe(most_open_files_by_cmd, hide_index=True, column_order=["count", "name"])
-
-most_modified_files = con.execute(
-    """
-SELECT
-  name,
-  ROUND(
-    SUM(max_size - min_size) / (1024 * 1024),
-    2
-  ) AS write_mo
-FROM
-(
-    SELECT
-      fact.pid,
-     fact.fd,
-     fact.node,
-     file.name,
-     MIN(size) AS min_size,
-     MAX(size) AS max_size
-   FROM
-      gold_fact_file_reg fact
-     LEFT JOIN gold_dim_process pro ON fact.pid = pro.pid
-     LEFT JOIN gold_file_user usr ON pro.uid = usr.uid
-     LEFT JOIN gold_dim_file_reg file ON fact.pid = file.pid
-     AND fact.fd = file.fd
-     AND fact.node = file.node
-   WHERE
-      fact.created_at >= ?
-     AND fact.created_at <= ?
-     AND pro.pid NOT IN ?
-     AND usr.name NOT IN ?
-     AND pro.command NOT IN ?
-   GROUP BY
-      fact.pid,
-     fact.fd,
-     fact.node,
-     file.name,
-     )
-WHERE
-  max_size <> min_size
-GROUP BY
- name
-ORDER BY
- write_mo DESC
-    """,
-    [slider_date_min, slider_date_max, hide_pid, hide_user, hide_command],
-).df()
-
-with by_file_row[2]:
-    st.text("Most modified files")
-    st.dataframe(
-        most_modified_files.rename(columns={"write_mo": "Size (Mo)"}),
-        hide_index=True,
-        column_order=["Size (Mo)", "name"],
+    st.text("Modification Size (Mo) by user")
+    st.area_chart(
+        modification_by_users,
+        x="time",
+        y="write_mo",
+        color="user",
+        stack="center",
+        x_label="date",
+        y_label="size",
     )
+    add_preview_label(st.session_state, "files.modification_by_users")
+
+
+by_user()
+
+# Analysis by file name
 
 
+@st.fragment(run_every=refresh_every(refresh, 6))
+def by_file():
+    st.subheader("By File Analysis", divider=True)
+    by_file_row = st.columns(3)
+
+    with by_file_row[0]:
+        st.text("Most opened files")
+        add_paginated_table(
+            st.session_state,
+            "files.most_open_files",
+            DIM_TABLES,
+            window,
+            analysis.most_open_files,
+            params,
+            hosts=hosts,
+            column_order=["count", "name"],
+        )
+
+    with by_file_row[1]:
+        st.text("Most opened files by different command")
+        add_paginated_table(
+            st.session_state,
+            "files.most_open_files_by_cmd",
+            DIM_TABLES,
+            window,
+            analysis.most_open_files_by_cmd,
+            sketch_params,
+            hosts=hosts,
+            column_order=["count", "name"],
+        )
+        if approximate:
+            st.caption(APPROXIMATE_CAPTION)
+
+    with by_file_row[2]:
+        st.text("Most modified files")
+        add_paginated_table(
+            st.session_state,
+            "files.most_modified_files",
+            FACT_TABLES,
+            window,
+            analysis.most_modified_files,
+            params,
+            hosts=hosts,
+            columns={"write_mo": "Size (Mo)", "name": "name"},
+        )
+
+
+by_file()
+
 # Statistics
 
 st.sidebar.header("Statistics", divider=True)
 
-# Open nodes
-
-open_nodes = con.execute(
-    """
-SELECT
-  COUNT(*) AS count
-FROM
- gold_dim_file_reg file
- LEFT JOIN gold_dim_process pro ON file.pid = pro.pid
- LEFT JOIN gold_file_user usr ON pro.uid = usr.uid
-WHERE
-  file.started_at >= ?
- AND file.inserted_at <= ?
- AND pro.pid NOT IN ?
- AND usr.name NOT IN ?
- AND pro.command NOT IN ?
-""",
-    [slider_date_min, slider_date_max, hide_pid, hide_user, hide_command],
-).fetchone()[0]
-st.sidebar.write("Opened nodes: ", open_nodes)
-
-# Open files
-
-open_files = con.execute(
-    """
-SELECT
-  COUNT(DISTINCT file.name) AS count
-FROM
- gold_dim_file_reg file
- LEFT JOIN gold_dim_process pro ON file.pid = pro.pid
- LEFT JOIN gold_file_user usr ON pro.uid = usr.uid
-WHERE
-  file.started_at >= ?
- AND file.inserted_at <= ?
- AND pro.pid NOT IN ?
- AND usr.name NOT IN ?
- AND pro.command NOT IN ?
-""",
-    [slider_date_min, slider_date_max, hide_pid, hide_user, hide_command],
-).fetchone()[0]
-st.sidebar.write("Opened files: ", open_files)
-
-# Modified files
-
-modified_files = con.execute(
-    """
-SELECT
-  COUNT(*) AS count
-FROM
-(
-    SELECT
-      MIN(size) AS min_size,
-     MAX(size) AS max_size
-   FROM
-      gold_fact_file_reg fact
-     LEFT JOIN gold_dim_process pro ON fact.pid = pro.pid
-     LEFT JOIN gold_file_user usr ON pro.uid = usr.uid
-     LEFT JOIN gold_dim_file_reg file ON fact.pid = file.pid
-     AND fact.fd = file.fd
-     AND fact.node = file.node
-   WHERE
-      fact.created_at >= ?
-     AND fact.created_at <= ?
-     AND pro.pid NOT IN ?
-     AND usr.name NOT IN ?
-     AND pro.command NOT IN ?
-   GROUP BY file.name
-     )
-WHERE
-  max_size <> min_size
-""",
-    [slider_date_min, slider_date_max, hide_pid, hide_user, hide_command],
-).fetchone()[0]
-st.sidebar.write("Modified files: ", modified_files)
-
-# Modification size
-
-modification_size = con.execute(
-    """
-SELECT
-  ROUND(SUM(max_size - min_size) / (1024 * 1024), 3) AS write_mo
-FROM
-(
-   SELECT
-      MIN(size) AS min_size,
-      MAX(size) AS max_size
-   FROM
-      gold_fact_file_reg fact
-     LEFT JOIN gold_dim_process pro ON fact.pid = pro.pid
-     LEFT JOIN gold_file_user usr ON pro.uid = usr.uid
-     LEFT JOIN gold_dim_file_reg file ON fact.pid = file.pid
-     AND fact.fd = file.fd
-     AND fact.node = file.node
-   WHERE
-      fact.created_at >= ?
-     AND fact.created_at <= ?
-     AND pro.pid NOT IN ?
-     AND usr.name NOT IN ?
-     AND pro.command NOT IN ?
-   GROUP BY
-      fact.pid,
-     fact.fd,
-     fact.node,
-     file.name,
-     )
-WHERE
-  max_size <> min_size
-""",
-    [slider_date_min, slider_date_max, hide_pid, hide_user, hide_command],
-).fetchone()[0]
-st.sidebar.write("Modification size: ", modification_size, " Mo")
+
+@st.fragment(run_every=refresh_every(refresh))
+def statistics():
+    # Open nodes
+
+    open_nodes = fetch(
+        st.session_state,
+        "files.open_nodes",
+        DIM_TABLES,
+        window,
+        analysis.open_nodes,
+        params,
+        scalar=True,
+        hosts=hosts,
+    )
+    st.write("Opened nodes: ", open_nodes)
+
+    # Open files
+
+    open_files = fetch(
+        st.session_state,
+        "files.open_files",
+        DIM_TABLES,
+        window,
+        analysis.open_files,
+        sketch_params,
+        scalar=True,
+        hosts=hosts,
+    )
+    st.write("Opened files: ", approximate_value(open_files, approximate))
+
+    # Modified files
+
+    modified_files = fetch(
+        st.session_state,
+        "files.modified_files",
+        FACT_TABLES,
+        window,
+        analysis.modified_files,
+        params,
+        scalar=True,
+        hosts=hosts,
+    )
+    st.write("Modified files: ", modified_files)
+
+    # Modification size
+
+    modification_size = fetch(
+        st.session_state,
+        "files.modification_size",
+        FACT_TABLES,
+        window,
+        analysis.modification_size,
+        params,
+        scalar=True,
+        hosts=hosts,
+    )
+    st.write("Modification size: ", modification_size, " Mo")
+
+
+with st.sidebar:
+    statistics()
+
+add_preview_status(st.session_state, "files.")
 
 # Running time
 
@@ -3,9 +3,8 @@ from timeit import default_timer as timer
 
 import graphviz
 import streamlit as st
-from PIL import Image
 
-from pages import connection
+from pages import add_host_selector, connection
 
 BACKGROUND_COLOR = "#282A36"
 PROCESS_COLOR = "#50FA7B"
@@ -17,7 +16,6 @@ FOREIGN_HOST_COLOR = "#FFFF85"
 MAX_DISTINCT_COMMAND_BY_CHILD = 5
 
 start_timer = timer()
-con = connection()
 
 st.set_page_config(
     page_title="Zoom",
@@ -29,6 +27,7 @@ st.header("Dive in your command history", divider=True)
 # Process selection
 
 st.sidebar.header("Parameters", divider=True)
+con = connection(hosts=add_host_selector(st.sidebar))
 
 commands = con.execute(
     """
@@ -38,20 +37,26 @@ commands = con.execute(
     WHERE command IS NOT NULL
     ORDER BY command
 """
-).df()
-command: str = st.sidebar.selectbox("Choose the command", commands)
+).fetchall()
+command: str = st.sidebar.selectbox("Choose the command", [name for name, in commands])
 
 pids = con.execute(
     """
     SELECT
-        DISTINCT pid
+        DISTINCT pid, machine
     FROM gold_dim_process
     WHERE command = ?
-    ORDER BY pid
+    ORDER BY pid, machine
 """,
     [command],
-).df()
-pid: str = st.sidebar.selectbox("Choose the pid", pids)
+).fetchall()
+# Pids are only unique on their machine, the machine is shown when several of them are loaded.
+machines = {machine for _, machine in pids}
+pid, machine = st.sidebar.selectbox(
+    "Choose the pid",
+    pids,
+    format_func=lambda process: str(process[0]) if len(machines) < 2 else f"{process[0]} ({process[1]})",
+)
 
 show_only_modified_files = st.sidebar.checkbox("Show only modified files", value=True)
 
@@ -153,9 +158,9 @@ def get_process_by_pid(pid):
         pro.started_at,
         pro.inserted_at,
     FROM gold_dim_process pro
-    LEFT JOIN gold_file_user usr ON usr.uid = pro.uid
-    WHERE pro.pid = ?""",
-        [str(pid)],
+    LEFT JOIN gold_file_user usr ON usr.machine = pro.machine AND usr.uid = pro.uid
+    WHERE pro.machine = ? AND pro.pid = ?""",
+        [machine, str(pid)],
     ).fetchone()
     return Process(process) if process is not None else None
 
@@ -173,12 +178,12 @@ def get_processes_by_ppid(ppid):
         pro.started_at,
         pro.inserted_at,
     FROM gold_dim_process pro
-    LEFT JOIN gold_file_user usr ON usr.uid = pro.uid
-    WHERE pro.ppid = ?
+    LEFT JOIN gold_file_user usr ON usr.machine = pro.machine AND usr.uid = pro.uid
+    WHERE pro.machine = ? AND pro.ppid = ?
     ORDER BY pro.started_at ASC""",
-        [str(ppid)],
-    ).df()
-    for row in processes.itertuples(index=False, name=None):
+        [machine, str(ppid)],
+    ).fetchall()
+    for row in processes:
         process_buffer.append(Process(row))
     return process_buffer
 
@@ -200,14 +205,15 @@ def get_open_files_by_process(pid):
                 MIN(fact.size) AS min_size,
                 MAX(fact.size) AS max_size,
             FROM gold_fact_file_reg fact
-            LEFT JOIN gold_dim_file_reg dim ON fact.pid = dim.pid AND fact.fd = dim.fd AND fact.node = dim.node
-            WHERE fact.pid = ?
+            LEFT JOIN gold_dim_file_reg dim
+            ON fact.machine = dim.machine AND fact.pid = dim.pid AND fact.fd = dim.fd AND fact.node = dim.node
+            WHERE fact.machine = ? AND fact.pid = ?
             GROUP BY dim.name
         )
     """,
-        [str(pid)],
-    ).df()
-    for row in files.itertuples(index=False, name=None):
+        [machine, str(pid)],
+    ).fetchall()
+    for row in files:
         files_buffer.append(File(row))
     return files_buffer
 
@@ -225,72 +231,64 @@ def get_open_sockets_by_process(pid):
                 COALESCE(soc.source_port::TEXT, '*') AS port,
                 host.host AS address
             FROM gold_dim_network_socket soc
-            INNER JOIN gold_dim_network_host host ON soc.source_address = host.address
-            WHERE soc.pid = ?
+            INNER JOIN gold_dim_network_host host
+            ON soc.machine = host.machine AND soc.source_address = host.address
+            WHERE soc.machine = ? AND soc.pid = ?
         )
         GROUP BY port
     """,
-        [str(pid)],
-    ).df()
-    for row in socket.itertuples(index=False, name=None):
+        [machine, str(pid)],
+    ).fetchall()
+    for row in socket:
         socket_buffer.append(Socket(row))
     return socket_buffer
 
 
 def get_foreign_host_by_port(port, pid):
+    # Each packet is matched to the socket of the process started last before it, an ASOF join sorting both sides
+    # once instead of a range join on the whole socket history.
     foreign_host_buffer = []
     foreign_host = con.execute(
         """
-WITH fact_ip_host AS
-(
-    SELECT
-     fact.*,
-     host1.host AS source_host,
-     host2.host AS destination_host
-    FROM gold_fact_network_ip fact
-    LEFT JOIN gold_dim_network_host host1 ON fact.source_address = host1.address
-    LEFT JOIN gold_dim_network_host host2 ON fact.destination_address = host2.address
-),
-ip_traffic AS
+WITH ip_traffic AS
 (
-       SELECT _id,
-              source_host AS address,
-              source_port    AS port,
+       SELECT source_port    AS port,
               destination_host AS foreign_address,
-              created_at,
-              inserted_at
-       FROM   fact_ip_host
+              created_at
+       FROM   network_traffic
+       WHERE  source_local
+       AND    machine = $machine
        UNION ALL
-       SELECT _id,
-              destination_host AS address,
-              destination_port    AS port,
+       SELECT destination_port    AS port,
               source_host AS foreign_address,
-              created_at,
-              inserted_at
-       FROM   fact_ip_host
+              created_at
+       FROM   network_traffic
+       WHERE  destination_local
+       AND    machine = $machine
 ),
-interface_host AS
+process_socket AS
 (
-    SELECT host.host
-    FROM gold_dim_network_interface int
-    LEFT JOIN gold_dim_network_host host ON host.address = int.address
+       SELECT source_port,
+              started_at,
+              inserted_at
+       FROM   gold_dim_network_socket
+       WHERE  machine = $machine
+       AND    pid = $pid
 )
 SELECT
     ip_traffic.foreign_address AS foreign_address,
 FROM
     ip_traffic
-INNER JOIN gold_dim_network_socket soc
+ASOF INNER JOIN process_socket soc
 ON         soc.source_port = ip_traffic.port
 AND        ip_traffic.created_at >= soc.started_at
-AND        ip_traffic.created_at <= soc.inserted_at
-WHERE      ip_traffic.address IN (SELECT host FROM interface_host)
-AND        ip_traffic.port = ?
-AND        soc.pid = ?
+WHERE      ip_traffic.created_at <= soc.inserted_at
+AND        ip_traffic.port = $port
 GROUP BY   ip_traffic.foreign_address
     """,
-        [str(port), str(pid)],
-    ).df()
-    for row in foreign_host.itertuples(index=False, name=None):
+        {"machine": machine, "pid": str(pid), "port": str(port)},
+    ).fetchall()
+    for row in foreign_host:
         foreign_host_buffer.append(ForeignHost(row))
     return foreign_host_buffer
 
@@ -374,6 +372,8 @@ add_descendant(process.id, process.pid, graph, process_node_buffer)
 st.graphviz_chart(graph)
 save_and_open = st.button("Open in explorer 🔎")
 if save_and_open:
+    from PIL import Image
+
     with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
         graph.render(tmp_file.name, format="png", cleanup=True)
         img = Image.open(tmp_file.name + ".png")
@@ -1,12 +1,35 @@
 from timeit import default_timer as timer
 
+import pandas as pd
 import streamlit as st
 
-from pages import connection
+import analysis
+import history
+import logs
+from pages import (
+    RESOURCE_SETTINGS,
+    add_auto_refresh,
+    add_host_selector,
+    add_paginated_table,
+    add_preview_status,
+    fetch,
+    loaded_connection,
+    refresh_every,
+    settings,
+)
+from rstracer import Rstracer
 
-start_timer = timer()
-con = connection()
+TECH_TABLES = ["gold_tech_table_count", "gold_tech_chrono"]
+PROCESS_TABLES = ["gold_dim_process"]
+NETWORK_TABLES = [
+    "gold_fact_network_ip",
+    "gold_fact_network_packet",
+    "gold_fact_process_network",
+    "gold_dim_network_host",
+    "gold_dim_network_interface",
+]
 
+start_timer = timer()
 
 st.set_page_config(
     page_title="Debug",
@@ -16,179 +39,290 @@ st.set_page_config(
 
 st.header("Control database consistency", divider=True)
 
-st.subheader("Technical Statistics", divider=True)
-
-table_max_count = con.execute(
-    """
-SELECT
-  name,
-  max_count,
-  SPLIT(name, '_')[1] AS color,
-FROM
-  gold_tech_table_count
-ORDER BY
-  _id
-"""
-).df()
-
-st.text("Highest row count for each table")
-st.bar_chart(table_max_count, x="name", y="max_count", x_label="table name", y_label="highest count", color="color")
-
-chrono_row = st.columns(3)
-
-bronze_ingest_chrono = con.execute(
-    """
-SELECT
-    CASE
-        WHEN name = 'process_list' THEN 'process'
-        WHEN name = 'open_files' THEN 'files'
-        WHEN name = 'network_packet' THEN 'network'
-    END AS object,
-    brz_min_ingest,
-    brz_max_ingest,
-    svr_min_ingest,
-    svr_max_ingest,
-    min_ingest,
-    max_ingest,
-FROM
-  gold_tech_chrono
-"""
-).df()
-
-with chrono_row[0]:
-    st.text("Bronze ingestion in seconds")
-    st.dataframe(
-        bronze_ingest_chrono[["object", "brz_min_ingest", "brz_max_ingest"]].rename(
-            columns={"brz_min_ingest": "fastest", "brz_max_ingest": "slowest"}
-        ),
-        hide_index=True,
+st.sidebar.header("Parameters", divider=True)
+hosts = add_host_selector(st.sidebar)
+refresh = add_auto_refresh(st.sidebar)
+ingest_alert = st.sidebar.number_input(
+    "Ingestion alert (seconds)",
+    min_value=0.0,
+    value=float(history.INGEST_ALERT),
+    help="Alerts when the last recorded ingestion of an object is slower than this threshold.",
+)
+
+
+@st.fragment(run_every=refresh_every(refresh))
+def technical_statistics():
+    st.subheader("Technical Statistics", divider=True)
+
+    table_max_count = fetch(
+        st.session_state,
+        "debug.table_max_count",
+        TECH_TABLES,
+        None,
+        analysis.table_max_count,
+        [],
+        hosts=hosts,
     )
 
-with chrono_row[1]:
-    st.text("Silver ingestion in seconds")
-    st.dataframe(
-        bronze_ingest_chrono[["object", "svr_min_ingest", "svr_max_ingest"]].rename(
-            columns={"svr_min_ingest": "fastest", "svr_max_ingest": "slowest"}
-        ),
-        hide_index=True,
+    st.text("Highest row count for each table")
+    st.bar_chart(table_max_count, x="name", y="max_count", x_label="table name", y_label="highest count", color="color")
+
+    chrono_row = st.columns(3)
+
+    bronze_ingest_chrono = fetch(
+        st.session_state,
+        "debug.bronze_ingest_chrono",
+        TECH_TABLES,
+        None,
+        analysis.bronze_ingest_chrono,
+        [],
+        hosts=hosts,
+    )
+
+    with chrono_row[0]:
+        st.text("Bronze ingestion in seconds")
+        st.dataframe(
+            bronze_ingest_chrono,
+            hide_index=True,
+            column_order=["object", "brz_min_ingest", "brz_max_ingest"],
+            column_config={"brz_min_ingest": "fastest", "brz_max_ingest": "slowest"},
+        )
+
+    with chrono_row[1]:
+        st.text("Silver ingestion in seconds")
+        st.dataframe(
+            bronze_ingest_chrono,
+            hide_index=True,
+            column_order=["object", "svr_min_ingest", "svr_max_ingest"],
+            column_config={"svr_min_ingest": "fastest", "svr_max_ingest": "slowest"},
+        )
+
+    with chrono_row[2]:
+        st.text("Bronze & Silver ingestion in seconds")
+        st.dataframe(
+            bronze_ingest_chrono,
+            hide_index=True,
+            column_order=["object", "min_ingest", "max_ingest"],
+            column_config={"min_ingest": "fastest", "max_ingest": "slowest"},
+        )
+
+
+technical_statistics()
+
+
+@st.fragment(run_every=refresh_every(refresh))
+def ingestion_history():
+    st.subheader("Ingestion History", divider=True)
+
+    db_format, db_path = settings()
+    directory = db_path if db_format.lower() == "history" else history.HISTORY_DIRECTORY
+    chrono = history.metrics("gold_tech_chrono", directory)
+    table_count = history.metrics("gold_tech_table_count", directory)
+    if chrono is None or table_count is None:
+        st.info(f"No ingestion history found in `{directory}`, it is recorded while rstracer runs in Live Mode.")
+        return
+
+    for name, max_ingest in history.slow_ingestions(ingest_alert, directory):
+        st.error(f"Last ingestion of `{name}` took {round(max_ingest, 2)} seconds, above the alert threshold.")
+    for name, baseline, recent in history.ingestion_regressions(directory):
+        st.warning(
+            f"Ingestion of `{name}` regressed from {round(baseline, 2)} to {round(recent, 2)} seconds (median), "
+            f"over the last {int(history.REGRESSION_WINDOW.total_seconds() // 60)} minutes."
+        )
+
+    history_row = st.columns(3)
+    with history_row[0]:
+        st.text("Slowest bronze ingestion in seconds")
+        st.line_chart(chrono, x="created_at", y="brz_max_ingest", color="name", x_label="date", y_label="seconds")
+    with history_row[1]:
+        st.text("Slowest silver ingestion in seconds")
+        st.line_chart(chrono, x="created_at", y="svr_max_ingest", color="name", x_label="date", y_label="seconds")
+    with history_row[2]:
+        st.text("Highest row count for each table")
+        st.line_chart(table_count, x="created_at", y="max_count", color="name", x_label="date", y_label="count")
+
+
+ingestion_history()
+
+
+@st.fragment(run_every=refresh_every(refresh))
+def tracer_overhead():
+    st.subheader("Tracer Overhead", divider=True)
+
+    samples = pd.DataFrame(Rstracer().overhead())
+    if samples.empty:
+        st.info("Resource usage of rstracer is sampled while it runs in Live Mode.")
+        return
+    samples["time"] = pd.to_datetime(samples["time"], unit="s")
+    samples["rss"] = samples["rss"] / (1024 * 1024)
+    elapsed = samples["time"].diff().dt.total_seconds()
+    for column in ["read_bytes", "write_bytes"]:
+        # Counters are cumulative, a process exiting between two samples gives a negative difference.
+        samples[column] = (samples[column].astype(float).diff().clip(lower=0) / elapsed / (1024 * 1024)).round(3)
+
+    overhead_row = st.columns(2)
+    with overhead_row[0]:
+        st.text("CPU usage of the rstracer process tree (%)")
+        st.line_chart(samples, x="time", y="cpu", x_label="date", y_label="CPU usage")
+        st.text("Threads of the rstracer process tree")
+        st.line_chart(samples, x="time", y="threads", x_label="date", y_label="threads")
+    with overhead_row[1]:
+        st.text("Resident memory of the rstracer process tree (Mo)")
+        st.line_chart(samples, x="time", y="rss", x_label="date", y_label="memory (Mo)")
+        st.text("Disk I/O of the rstracer process tree (Mo/s)")
+        if samples["read_bytes"].isna().all():
+            st.caption("I/O counters of rstracer are not readable, run the dashboard as root to see them.")
+        else:
+            st.line_chart(
+                samples.rename(columns={"read_bytes": "read", "write_bytes": "write"}),
+                x="time",
+                y=["read", "write"],
+                x_label="date",
+                y_label="size (Mo/s)",
+            )
+
+
+tracer_overhead()
+
+
+@st.fragment(run_every=refresh_every(refresh))
+def memory_footprint():
+    # psutil is only needed by this panel, like in the supervisor of rstracer.
+    import psutil
+
+    st.subheader("Memory Footprint", divider=True)
+
+    rss = psutil.Process().memory_info().rss / (1024 * 1024)
+    # Memory changes with every load and query, it is read on each run rather than kept by `fetch`. The connection
+    # already loaded by the pages is inspected, a new one would load the whole tables.
+    con = loaded_connection()
+    if con is None:
+        st.metric("Dashboard resident memory (Mo)", round(rss, 3))
+        st.info("No table is loaded in memory yet, open a page to load them.")
+        return
+    memory, spilled, memory_limit, threads, temp_directory = analysis.database_memory(con).fetchone()
+
+    memory_row = st.columns(4)
+    memory_row[0].metric("DuckDB memory (Mo)", memory)
+    memory_row[1].metric("Spilled to disk (Mo)", spilled)
+    memory_row[2].metric("Dashboard resident memory (Mo)", round(rss, 3))
+    memory_row[3].metric("DuckDB memory limit", memory_limit)
+    st.caption(
+        f"{threads} DuckDB threads, spilling to `{temp_directory}`. Set them with the "
+        + ", ".join(f"`{variable}`" for variable in RESOURCE_SETTINGS.values())
+        + " environment variables or on the home page."
     )
 
-with chrono_row[2]:
-    st.text("Bronze & Silver ingestion in seconds")
+    st.text("Estimated in-memory size of the loaded tables (Mo)")
     st.dataframe(
-        bronze_ingest_chrono[["object", "min_ingest", "max_ingest"]].rename(
-            columns={"min_ingest": "fastest", "max_ingest": "slowest"}
-        ),
-        hide_index=True,
+        analysis.table_memory(con).project('name, rows, size AS "size (Mo)"').to_arrow_table(), hide_index=True
     )
 
-st.subheader("Process Data Quality", divider=True)
-
-process_without_open_file = con.execute(
-    """
-SELECT
-    COUNT(*) AS count,
-    full_command,
-FROM gold_dim_process
-WHERE command IS NULL
-GROUP BY full_command
-ORDER BY count DESC
-"""
-).df()
-
-st.text("Process without associated open file")
-st.dataframe(process_without_open_file.rename(columns={"full_command": "full command"}), hide_index=True)
-
-st.subheader("Network Data Quality", divider=True)
-
-network_consistency_column = st.columns(2)
-
-foreign_ip_packet_without_process = con.execute(
-    """
-WITH fact_ip_host AS
-(
-    SELECT
-     fact.*,
-     host1.host AS source_host,
-     host2.host AS destination_host
-    FROM gold_fact_network_ip fact
-    LEFT JOIN gold_dim_network_host host1 ON fact.source_address = host1.address
-    LEFT JOIN gold_dim_network_host host2 ON fact.destination_address = host2.address
-),
-interface_host AS
-(
-    SELECT host.host
-    FROM gold_dim_network_interface int
-    LEFT JOIN gold_dim_network_host host ON host.address = int.address
-),
-foreign_ip_without_process AS
-(
-    SELECT ip.*
-    FROM fact_ip_host ip
-    LEFT JOIN gold_fact_process_network pro_net ON ip._id = pro_net.packet_id
-    WHERE pro_net.send IS NULL
-    AND NOT ip.source_host IN (SELECT host FROM interface_host)
-    AND ip.destination_host IN (SELECT host FROM interface_host)
-)
-SELECT
-    foreign_packet.address,
-    foreign_packet.port AS port,
-    COUNT(*) AS count,
-    ROUND(SUM(fact_packet.length) / (1024 * 1024), 3) AS size,
-FROM
-(
-    SELECT
-        _id,
-        destination_host AS address,
-        source_port AS port,
-    FROM foreign_ip_without_process
-    WHERE source_host IN (SELECT host FROM interface_host)
-    UNION ALL
-    SELECT
-        _id,
-        source_host AS address,
-        destination_port AS port,
-    FROM foreign_ip_without_process
-    WHERE destination_host IN (SELECT host FROM interface_host)
-) foreign_packet
-LEFT JOIN gold_fact_network_packet fact_packet ON fact_packet._id = foreign_packet._id
-GROUP BY
-    foreign_packet.address,
-    foreign_packet.port
-ORDER BY
-    address,
-    port
-"""
-).df()
-
-st.text("IP packet sent to/received from foreign IP without associated process")
-st.dataframe(foreign_ip_packet_without_process.rename(columns={"size": "size (Mo)"}), hide_index=True)
-
-gold_fact_network_ip_count = con.execute(
-    """
-SELECT
-    COUNT(DISTINCT _id) AS count
-FROM gold_fact_network_ip
-"""
-).fetchone()[0]
-
-gold_fact_process_network_count = con.execute(
-    """
-SELECT
-    COUNT(DISTINCT packet_id) AS count
-FROM gold_fact_process_network
-"""
-).fetchone()[0]
-
-
-st.write(
-    gold_fact_network_ip_count,
-    " ip packet, ",
-    gold_fact_process_network_count,
-    "ip packet with associated process, ",
-    round((1 - (gold_fact_process_network_count / gold_fact_network_ip_count)) * 100, 2),
-    "% of packet with unknown process.",
-)
+
+memory_footprint()
+
+
+@st.fragment(run_every=refresh_every(refresh))
+def pipeline_logs():
+    st.subheader("Pipeline Logs", divider=True)
+
+    tailer = logs.follow()
+    events = pd.DataFrame(tailer.series())
+    if events.empty:
+        st.info(f"No rstracer log found in `{tailer.directory}`, check the `[logger]` section of rstracer.toml.")
+        return
+    # Seconds without any log line have no event.
+    events = events.set_index("time").asfreq("1s", fill_value=0).reset_index()
+
+    logs_row = st.columns(2)
+    with logs_row[0]:
+        st.text("Channel full, batch and export events per second")
+        st.line_chart(
+            events, x="time", y=["channel_full", "batch", "export"], x_label="date", y_label="events per second"
+        )
+    with logs_row[1]:
+        st.text("Warnings and errors per second")
+        st.bar_chart(events, x="time", y=["WARN", "ERROR"], x_label="date", y_label="lines per second")
+    st.text("Last warnings and errors")
+    st.dataframe(pd.DataFrame(tailer.lines()).iloc[::-1], hide_index=True)
+
+
+pipeline_logs()
+
+
+@st.fragment(run_every=refresh_every(refresh))
+def process_quality():
+    st.subheader("Process Data Quality", divider=True)
+
+    st.text("Process without associated open file")
+    add_paginated_table(
+        st.session_state,
+        "debug.process_without_open_file",
+        PROCESS_TABLES,
+        None,
+        analysis.process_without_open_file,
+        [],
+        hosts=hosts,
+        columns={"count": "count", "full_command": "full command"},
+    )
+
+
+process_quality()
+
+
+@st.fragment(run_every=refresh_every(refresh))
+def network_quality():
+    st.subheader("Network Data Quality", divider=True)
+
+    st.text("IP packet sent to/received from foreign IP without associated process")
+    add_paginated_table(
+        st.session_state,
+        "debug.foreign_ip_packet_without_process",
+        NETWORK_TABLES,
+        None,
+        analysis.foreign_ip_packet_without_process,
+        [],
+        hosts=hosts,
+        columns={"address": "address", "port": "port", "count": "count", "size": "size (Mo)"},
+    )
+
+    gold_fact_network_ip_count = fetch(
+        st.session_state,
+        "debug.gold_fact_network_ip_count",
+        NETWORK_TABLES,
+        None,
+        analysis.gold_fact_network_ip_count,
+        [],
+        scalar=True,
+        hosts=hosts,
+    )
+
+    gold_fact_process_network_count = fetch(
+        st.session_state,
+        "debug.gold_fact_process_network_count",
+        NETWORK_TABLES,
+        None,
+        analysis.gold_fact_process_network_count,
+        [],
+        scalar=True,
+        hosts=hosts,
+    )
+
+    # The raw packets of a history store may all be rolled up, they are not linked to processes anymore.
+    if gold_fact_network_ip_count:
+        st.write(
+            gold_fact_network_ip_count,
+            " ip packet, ",
+            gold_fact_process_network_count,
+            "ip packet with associated process, ",
+            round((1 - (gold_fact_process_network_count / gold_fact_network_ip_count)) * 100, 2),
+            "% of packet with unknown process.",
+        )
+
+
+network_quality()
+
+add_preview_status(st.session_state, "debug.")
 
 # Running time
 
@@ -0,0 +1,57 @@
+from timeit import default_timer as timer
+
+import streamlit as st
+
+import advisor
+from pages import add_host_selector, connection
+from rstracer import Rstracer
+
+start_timer = timer()
+
+st.set_page_config(
+    page_title="Advisor",
+    page_icon="🧭",
+    layout="wide",
+)
+
+st.header("rstracer Configuration Advisor", divider=True)
+
+st.sidebar.header("Parameters", divider=True)
+con = connection(hosts=add_host_selector(st.sidebar))
+config_path = st.sidebar.text_input("Configuration file", value=advisor.CONFIG_FILE)
+cpu_budget = st.sidebar.number_input(
+    "Tracer CPU budget (%)",
+    min_value=1,
+    value=advisor.CPU_BUDGET,
+    help="Above this budget, captures are advised to run less often, trading fidelity for overhead.",
+)
+
+config = advisor.read_config(config_path)
+recommendations = advisor.recommend(con, config, Rstracer().overhead(), cpu_budget)
+
+st.text(
+    """Recommendations are based on the ingestion timings, the highest row counts of the tables and, in Live Mode, the
+CPU usage of rstracer. Ingestion lag means the channel is full, it is solved before the overhead."""
+)
+
+if not recommendations:
+    st.success("The current configuration keeps up with the captured activity, nothing to change.")
+else:
+    st.dataframe(
+        [
+            {**recommendation, "current": str(recommendation["current"]), "proposed": str(recommendation["proposed"])}
+            for recommendation in recommendations
+        ],
+        hide_index=True,
+        column_order=["setting", "current", "proposed", "reason"],
+    )
+
+if st.button("Write candidate configuration", disabled=not recommendations):
+    candidate = advisor.write_candidate(recommendations, source=config_path)
+    st.success(f"Candidate written in `{candidate}`, check `Use advisor configuration` on the home page to launch it.")
+
+# Running time
+
+st.sidebar.header("Statistics", divider=True)
+end_timer = timer()
+st.sidebar.write("Running time: ", round(end_timer - start_timer, 4), " seconds")
@@ -1,53 +1,542 @@
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
 import duckdb
 
-TABLES = [
-    "gold_dim_file_reg",
-    "gold_dim_network_foreign_ip",
-    "gold_dim_network_interface",
-    "gold_dim_network_open_port",
-    "gold_dim_network_socket",
-    "gold_dim_network_host",
-    "gold_dim_process",
-    "gold_fact_file_reg",
-    "gold_fact_network_ip",
-    "gold_fact_network_packet",
-    "gold_fact_process",
-    "gold_fact_process_network",
-    "gold_file_host",
-    "gold_file_service",
-    "gold_file_user",
-    "gold_tech_chrono",
-    "gold_tech_table_count",
-]
-
-
-def connection():
+import cache
+import history
+from schema import DERIVED_TABLES, HEAVY_HITTERS, TABLES, derive, describe, encode, inputs, machine, projection
+from schema import source as export_source
+
+# Predicates restricting the rows loaded for an analysis window, `$start` and `$end` being the window bounds.
+# Dimensions keep the rows alive during the window, and flows their seconds or rolled up buckets overlapping it.
+# Process network links are inserted after their packet, up to `LINK_DELAY` later, `$link_end` being the window end
+# shifted by this delay.
+LINK_DELAY = timedelta(minutes=1)
+WINDOW_FILTERS = {
+    "gold_dim_file_reg": "started_at <= $end AND inserted_at >= $start",
+    "gold_fact_file_reg": "created_at >= $start AND created_at <= $end",
+    "gold_fact_network_ip": "created_at >= $start AND created_at <= $end",
+    "gold_fact_network_packet": "created_at >= $start AND created_at <= $end",
+    "gold_fact_process": "created_at >= $start AND created_at <= $end",
+    "gold_fact_process_network": "inserted_at >= $start AND inserted_at <= $link_end",
+    history.FLOW_TABLE: "last_seen >= $start AND created_at <= $end",
+}
+
+# Several sources are federated with `RSBD_PATH` listing `host=path` entries separated by `;`, `.duckdb` files or
+# directories of the `RSBD_FORMAT` format. The rows of each source are labeled with its host in the machine column.
+SOURCE_SEPARATOR = ";"
+HOST_LABEL = re.compile(r"^([\w.-]+)=(.+)$")
+
+# Relative standard error of the distinct counts of approximate mode, 1.04 / sqrt(m) for the m = 64 registers of the
+# DuckDB HyperLogLog.
+DISTINCT_ERROR = 0.13
+APPROXIMATE_CAPTION = f"Approximate: distinct counts within ±{DISTINCT_ERROR:.0%} (one standard error)."
+HEAVY_HITTERS_CAPTION = (
+    f"Approximate: only the {HEAVY_HITTERS} foreign hosts exchanging the most bytes of each minute are kept, a host may "
+    "miss up to `error` Mo of the minutes it was left out of."
+)
+
+# Loaded tables above `PREVIEW_ROWS` rows are first analyzed on a row sample of about this size, the exact results
+# are computed in the background. Sampled tables are the ones driving the joins, their dimensions are kept whole.
+PREVIEW_ROWS = 200_000
+PREVIEW_TABLES = ["gold_fact_process", "gold_fact_file_reg", "gold_fact_network_packet", "network_traffic"]
+PREVIEW_POLL = 1  # Seconds between two checks of the exact results
+PREVIEWS = "previews"  # Session state key of the previewed analyses
+
+PAGE_ROWS = 100  # Rows of a paginated table sent to the browser at a time
+# Rows of a page and the row count of the whole result in one run of the analysis: the rows are numbered in the order
+# of the result, and its last row, whose number is the row count, is always returned.
+PAGE_QUERY = """
+WITH numbered AS MATERIALIZED (SELECT *, ROW_NUMBER() OVER () AS {row} FROM result)
+SELECT *
+FROM numbered
+WHERE ({row} > {offset} AND {row} <= {offset} + {limit}) OR {row} = (SELECT MAX({row}) FROM numbered)
+ORDER BY {row}
+"""
+ROW_COLUMN = "rsdb_row"
+
+# DuckDB settings of the dashboard connections, read from these environment variables. Unset ones keep the DuckDB
+# defaults: every core and 80 % of the RAM. Above `memory_limit`, loads and queries spill to `temp_directory`.
+RESOURCE_SETTINGS = {
+    "threads": "RSBD_THREADS",
+    "memory_limit": "RSBD_MEMORY_LIMIT",
+    "temp_directory": "RSBD_TEMP_DIRECTORY",
+}
+
+REFRESH_INTERVAL = 5  # Seconds, rstracer exports every `schedule.export` seconds
+LIVE_EDGE = datetime.max  # Window end following the new rows in auto refresh mode
+
+_loaded: dict = {}
+_loaded_lock = threading.Lock()
+_caches: dict = {}  # Read-write connection of each cache file, rebuilt in place while it is read
+_extents: dict = {}
+_exact = ThreadPoolExecutor(max_workers=2)
+
+
+def settings():
     try:
-        db_format = os.environ["RSBD_FORMAT"]
-        db_path = os.environ["RSBD_PATH"]
+        return os.environ["RSBD_FORMAT"], os.environ["RSBD_PATH"]
     except KeyError:
         raise ValueError("Empty path. Go to home page for connection settings.")
+
+
+def resources():
+    """Return the DuckDB settings of `RESOURCE_SETTINGS` set in the environment."""
+    return {setting: os.environ[variable] for setting, variable in RESOURCE_SETTINGS.items() if os.getenv(variable)}
+
+
+def _connect(database=":memory:", read_only=False):
+    try:
+        return duckdb.connect(database=database, read_only=read_only, config=resources())
+    except duckdb.InvalidInputException as error:
+        raise ValueError(f"Invalid DuckDB resource settings, check them on the home page: {error}")
+
+
+def connection(window=None, hosts=None):
+    """Connect to the configured database.
+
+    Parquet and csv exports, or the history store, are loaded in memory, restricted to the `(start, end)` window
+    when given. A load is reused while it covers the requested window and the source files and resource settings
+    are unchanged. With `RSBD_CACHE`, exports are read from their DuckDB cache instead, checked once per change of
+    their files. Federated sources are always loaded in memory, restricted to the selected `hosts` when given.
+    """
+    db_format, db_path = settings()
+    if federated(db_path):
+        selected = [
+            source for source in enumerate(sources(db_format, db_path)) if hosts is None or source[1][0] in hosts
+        ]
+        version = [snapshot_version(source_format, path) for _, (_, source_format, path) in selected]
+        version.append(resources())
+        return _reuse(tuple(selected), version, window, lambda: _load_federation(selected, window))
     if db_format.lower() == "duckdb":
-        con = duckdb.connect(database=db_path, read_only=True)
-    else:
-        con = duckdb.connect(database=":memory:")
+        con = _connect(db_path, read_only=True)
+        # The database of rstracer is read-only, the machine and rollup columns and the derived tables are only views
+        # of this connection.
+        database = con.execute("SELECT CURRENT_DATABASE()").fetchone()[0]
         for table in TABLES:
-            con.execute(f"CREATE TABLE {table} AS SELECT * FROM '{db_path}/{table}.{db_format}';")
+            relation = f"{database}.main.{table}"
+            select = projection(table, describe(con, relation), machine(db_path))
+            con.execute(f"CREATE TEMP VIEW {table} AS SELECT {select} FROM {relation};")
+        derive(con, temporary=True)
+        return con
+    version = [*snapshot_version(db_format, db_path), resources()]
+    if _cached(db_format):
+        # The cache holds the whole tables, the analyses restrict them to the window with zone maps.
+        return _reuse((db_format, db_path), version, None, lambda: _cache(db_path, db_format))
+    return _reuse((db_format, db_path), version, window, lambda: _load(db_path, db_format, window))
+
+
+def _reuse(key, version, window, load):
+    """Return a cursor of the connection loaded for `key`, loaded again when its version changed or out of `window`.
+
+    The replaced connection is only dropped, it is closed once the cursors of the pages, the exact results computed
+    in the background and the API requests still using it are done.
+    """
+    with _loaded_lock:
+        loaded = _loaded.get(key)
+        if loaded is None or loaded[1] != version or not _covers(loaded[0], window):
+            _loaded.clear()
+            loaded = (window, version, load())
+            _loaded[key] = loaded
+    return loaded[2].cursor()
+
+
+def _cache(db_path, db_format):
+    """Return the connection of the DuckDB cache of an export, built on its first use and then rebuilt in place.
+
+    The cache is opened once per process: DuckDB can't open a file again while a cursor still reads it. Changed
+    resource settings are applied to it instead.
+    """
+    path = cache.cache_path(db_path, os.environ["RSBD_CACHE"])
+    if path not in _caches:
+        _caches[path] = _connect(cache.build(db_path, db_format, TABLES, os.environ["RSBD_CACHE"]))
+        return _caches[path]
+    con = _caches[path]
+    try:
+        for setting, variable in RESOURCE_SETTINGS.items():
+            con.execute(f"SET {setting} = '{os.environ[variable]}';" if os.getenv(variable) else f"RESET {setting};")
+    except duckdb.Error as error:
+        raise ValueError(f"Invalid DuckDB resource settings, check them on the home page: {error}")
+    cache.build(db_path, db_format, TABLES, os.environ["RSBD_CACHE"], con)
+    return con
+
+
+def loaded_connection():
+    """Return a cursor of the connection currently loaded by the dashboard, None when nothing is loaded."""
+    with _loaded_lock:
+        loaded = next(iter(_loaded.values()), None)
+        return None if loaded is None else loaded[2].cursor()
+
+
+def federated(db_path):
+    return SOURCE_SEPARATOR in db_path or HOST_LABEL.match(db_path) is not None
+
+
+def sources(db_format, db_path):
+    """Return the `(host, format, path)` of each source of `RSBD_PATH`, unlabeled paths are named after their file."""
+    result = []
+    for entry in [entry.strip() for entry in db_path.split(SOURCE_SEPARATOR) if entry.strip()]:
+        match = HOST_LABEL.match(entry)
+        host, path = match.groups() if match else (machine(entry), entry)
+        result.append((host, "duckdb" if path.endswith(".duckdb") else db_format, path))
+    return result
+
+
+def _cached(db_format):
+    return bool(os.getenv("RSBD_CACHE")) and db_format.lower() in ("parquet", "csv")
+
+
+def snapshot_version(db_format, db_path, tables=TABLES):
+    """Return a value changing each time the source files of one of the tables are rewritten."""
+    if federated(db_path):
+        return [snapshot_version(source_format, path, tables) for _, source_format, path in sources(db_format, db_path)]
+    if db_format.lower() == "duckdb":
+        return [cache.fingerprint(db_path)]
+    if db_format.lower() == "history":
+        stored_versions = history.versions(db_path)
+        return [stored_versions.get(table) for table in tables]
+    return [cache.fingerprint(f"{db_path}/{table}.{db_format}") for table in tables]
+
+
+def fetch(
+    state, key, tables, window, analysis, params, scalar=False, hosts=None, preview=True, columns=None, page=None
+):
+    """Run an analysis on the connection of `window` and keep its Arrow result in the session `state` under `key`.
+
+    `columns` maps the result columns to keep to their displayed name, they are selected and renamed in SQL. With a
+    `(limit, offset)` `page`, only these rows are returned, with the row count of the whole result.
+
+    The analysis only runs again when its parameters or hosts change or when the source files of `tables` are
+    rewritten, so the result is shared by the reruns of a page. With `preview`, large tables are first analyzed on a
+    sample while the exact result is computed in the background, `add_preview_status` reruns the page once it is done.
+    Single values are always exact, on a sample their counts and sums would only cover a fraction of the rows.
+    """
+    request = (snapshot_version(*settings(), tables), params, hosts)
+    if key in state and state[key][:3] == request:
+        return state[key][3]
+    preview = preview and not scalar
+    previews = state.setdefault(PREVIEWS, {}) if preview else {}
+    if key in previews and previews[key][0] == request:
+        _, exact, sample, _ = previews[key]
+        if not exact.done():
+            return sample
+        del previews[key]
+        state[key] = (*request, exact.result())
+        return state[key][3]
+    # The preview of the previous request is superseded, its exact result would never be shown.
+    superseded = previews.pop(key, None)
+    if superseded is not None:
+        superseded[1].cancel()
+    con = connection(window, hosts)
+    sampled = _sampled(con, tables) if preview else None
+    if sampled is None:
+        state[key] = (*request, _result(analysis(con, *params), scalar, columns, page))
+        return state[key][3]
+    sample, fraction = sampled
+    exact = _exact.submit(lambda: _result(analysis(con, *params), scalar, columns, page))
+    previews[key] = (request, exact, _result(analysis(sample, *params), scalar, columns, page), fraction)
+    return previews[key][2]
+
+
+def _result(relation, scalar, columns=None, page=None):
+    if scalar:
+        return relation.fetchone()[0]
+    if columns is not None:
+        relation = relation.project(", ".join(f'"{column}" AS "{name}"' for column, name in columns.items()))
+    if page is not None:
+        limit, offset = page
+        rows = relation.query("result", PAGE_QUERY.format(row=ROW_COLUMN, limit=limit, offset=offset)).to_arrow_table()
+        numbers = rows.column(ROW_COLUMN).to_pylist()
+        selected = len([number for number in numbers if offset < number <= offset + limit])
+        return rows.slice(0, selected).drop_columns([ROW_COLUMN]), numbers[-1] if numbers else 0
+    # Streamlit reads Arrow tables as they are, a pandas DataFrame would copy every column and box the strings.
+    return relation.to_arrow_table()
+
+
+def add_paginated_table(state, key, tables, window, analysis, params, hosts=None, columns=None, **options):
+    """Show the result of an analysis `PAGE_ROWS` rows at a time with its total row count.
+
+    Only the rows of the selected page are returned by the analysis and sent to the browser. Each page is kept in the
+    session `state` like the `fetch` results. `options` are passed to `st.dataframe`.
+    """
+
+    def rows(page):
+        # The previews of the other pages are no longer shown, their exact results are not waited for.
+        previews = state.get(PREVIEWS, {})
+        for other in [other for other in previews if other.startswith(f"{key}.") and other != f"{key}.{page}"]:
+            previews.pop(other)[1].cancel()
+        result = fetch(
+            state, f"{key}.{page}", tables, window, analysis, params, hosts=hosts, columns=columns, page=_page(page)
+        )
+        return (*result, f"{key}.{page}" in previews)
+
+    _add_pages(state, key, rows, options)
+
+
+def add_table_pages(state, key, result, **options):
+    """Show an Arrow `result` already fetched in full under `key`, for a chart, `PAGE_ROWS` rows at a time.
+
+    The pages are sliced from the result, the analysis is not run again. `options` are passed to `st.dataframe`.
+    """
+
+    def rows(page):
+        limit, offset = _page(page)
+        return result.slice(offset, limit), result.num_rows, key in state.get(PREVIEWS, {})
+
+    _add_pages(state, key, rows, options)
+
+
+def _add_pages(state, key, rows, options):
+    import streamlit as st
+
+    page_key = f"{key}.page"
+    page = state.get(page_key, 1)
+    table, total, preview = rows(page)
+    pages = max(1, -(-total // PAGE_ROWS))
+    if page > pages:
+        # The result shrank since the page was selected, its last page is shown instead.
+        page = state[page_key] = pages
+        table, total, preview = rows(page)
+    st.dataframe(table, hide_index=True, **options)
+    if pages > 1:
+        st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, key=page_key)
+    first = (page - 1) * PAGE_ROWS
+    # A preview only pages through the rows of its sample.
+    sample = " in the preview sample" if preview else ""
+    st.caption(f"Rows {first + 1 if total else 0} to {first + table.num_rows} of {total}{sample}.")
+
+
+def _page(page):
+    return PAGE_ROWS, (page - 1) * PAGE_ROWS
+
+
+def _sampled(con, tables):
+    """Return a cursor where the large tables read from `tables` are replaced by a row sample, None if all are small.
+
+    The cursor is returned with the sampled fraction of the rows, the smallest one of the sampled tables.
+    """
+    if con.execute("SELECT COUNT(*) FROM duckdb_views() WHERE temporary AND NOT internal").fetchone()[0]:
+        # The views of a read-only database only exist on its connection, the cursors don't see them.
+        return None
+    # Derived tables are sampled for the analyses of the tables they are computed from.
+    read = set(tables) | {table for table in DERIVED_TABLES if set(inputs(table)) & set(tables)}
+    sizes = con.execute(
+        "SELECT table_name, estimated_size FROM duckdb_tables() WHERE NOT temporary AND table_name IN ?",
+        [[table for table in PREVIEW_TABLES if table in read]],
+    ).fetchall()
+    large = [(table, rows) for table, rows in sizes if rows > PREVIEW_ROWS]
+    if not large:
+        return None
+    sampled = con.cursor()
+    database = sampled.execute("SELECT CURRENT_DATABASE()").fetchone()[0]
+    for table, rows in large:
+        # Rows rather than blocks are sampled, so the time series keep no gap.
+        sampled.execute(
+            f"CREATE TEMP VIEW {table} AS SELECT * FROM {database}.main.{table} "
+            f"USING SAMPLE {100 * PREVIEW_ROWS / rows:.6f}% (bernoulli);"
+        )
+    return sampled, min(PREVIEW_ROWS / rows for _, rows in large)
+
+
+def add_preview_status(state, prefix):
+    """Tell the charts are previews while their exact results are computed, then rerun the page to show them.
+
+    Only the analyses whose key starts with the `prefix` of the page are followed.
+    """
+    import streamlit as st
+
+    @st.fragment(run_every=PREVIEW_POLL)
+    def preview_status():
+        if _finish_previews(state, prefix):
+            st.rerun()
+        previews = [key for key in state.get(PREVIEWS, {}) if key.startswith(prefix)]
+        if previews:
+            st.info(f"{len(previews)} results are previews computed on a sample, exact results are on their way.")
+
+    preview_status()
+
+
+def _finish_previews(state, prefix):
+    """Move the exact results of the finished previews of `prefix` to the session `state`, return True if any.
+
+    Cancelled and failed ones are dropped, their analysis runs again the next time its page fetches it.
+    """
+    previews = state.get(PREVIEWS, {})
+    finished = False
+    for key, (request, exact, _, _) in list(previews.items()):
+        if not key.startswith(prefix) or not exact.done():
+            continue
+        del previews[key]
+        if not exact.cancelled() and exact.exception() is None:
+            state[key] = (*request, exact.result())
+            finished = True
+    return finished
+
+
+def add_preview_label(state, key):
+    """Tell under a chart drawn from a preview which fraction of the rows its counts and sizes cover."""
+    import streamlit as st
+
+    preview = state.get(PREVIEWS, {}).get(key)
+    if preview is not None:
+        st.caption(f"Preview on a {preview[3]:.1%} row sample: counts and sizes only cover these rows.")
+
+
+def _covers(loaded_window, window):
+    if loaded_window is None:
+        return True
+    return window is not None and loaded_window[0] <= window[0] and window[1] <= loaded_window[1]
+
+
+def _load(db_path, db_format, window):
+    con = _connect()
+    for table in TABLES:
+        where, bounds = _window_filter(table, window)
+        relation = _source(db_path, table, db_format)
+        select = projection(table, describe(con, relation), machine(db_path))
+        con.execute(f"CREATE TABLE {table} AS SELECT {select} FROM {relation}{where};", bounds)
+    stored = []
+    if db_format.lower() == "history" and os.path.exists(os.path.join(db_path, history.FLOW_TABLE)):
+        # Flows are merged by the store as the packets arrive, they also count the packets already rolled up.
+        where, bounds = _window_filter(history.FLOW_TABLE, window)
+        relation = history.source(db_path, history.FLOW_TABLE)
+        select = projection(history.FLOW_TABLE, describe(con, relation), machine(db_path))
+        con.execute(f"CREATE TABLE {history.FLOW_TABLE} AS SELECT {select} FROM {relation}{where};", bounds)
+        stored.append(history.FLOW_TABLE)
+    encode(con)
+    derive(con, exclude=stored)
+    return con
+
+
+def _window_filter(table, window):
+    if window is None or table not in WINDOW_FILTERS:
+        return "", {}
+    bounds = {"start": window[0], "end": window[1], "link_end": min(window[1], LIVE_EDGE - LINK_DELAY) + LINK_DELAY}
+    return (
+        f" WHERE {WINDOW_FILTERS[table]}",
+        {name: value for name, value in bounds.items() if f"${name}" in WINDOW_FILTERS[table]},
+    )
+
+
+def _load_federation(selected, window):
+    """Load the sources in parallel, each in its own tables labeled with its host, and union them in views."""
+    con = _connect()
+    with ThreadPoolExecutor() as executor:
+        list(executor.map(lambda source: _load_host(con.cursor(), *source, window), selected))
+    for table in TABLES:
+        con.execute(
+            f"CREATE VIEW {table} AS "
+            + " UNION ALL BY NAME ".join(f"SELECT * FROM {table}_{index}" for index, _ in selected)
+            + ";"
+        )
+    derive(con)
     return con
 
 
+def _load_host(con, index, source, window):
+    host, db_format, db_path = source
+    if db_format == "duckdb":
+        con.execute(f"ATTACH '{db_path}' AS host_{index} (READ_ONLY);")
+    for table in TABLES:
+        relation = f"host_{index}.{table}" if db_format == "duckdb" else _source(db_path, table, db_format)
+        select = projection(table, describe(con, relation), host)
+        where, bounds = _window_filter(table, window)
+        con.execute(f"CREATE TABLE {table}_{index} AS SELECT {select} FROM {relation}{where};", bounds)
+    if db_format == "duckdb":
+        con.execute(f"DETACH host_{index};")
+
+
+def _source(db_path, table, db_format):
+    if db_format.lower() == "history":
+        return history.source(db_path, table)
+    return export_source(db_path, table, db_format)
+
+
+def time_range(table, min_column="created_at", max_column="created_at"):
+    """Return the time extent of a table in the whole database, before any window restriction."""
+    db_format, db_path = settings()
+    if federated(db_path):
+        extents = [
+            _extent(source_format, path, table, min_column, max_column)
+            for _, source_format, path in sources(db_format, db_path)
+        ]
+        return (
+            min([extent[0] for extent in extents if extent[0] is not None], default=None),
+            max([extent[1] for extent in extents if extent[1] is not None], default=None),
+        )
+    return _extent(db_format, db_path, table, min_column, max_column, _cached(db_format))
+
+
+def _extent(db_format, db_path, table, min_column, max_column, cached=False):
+    # Kept until the source files of the table are rewritten, a csv is parsed whole to compute it.
+    key = (db_format, db_path, table, min_column, max_column)
+    version = snapshot_version(db_format, db_path, [table])
+    if key in _extents and _extents[key][0] == version:
+        return _extents[key][1]
+    if db_format.lower() == "duckdb" or cached:
+        con = connection() if cached else _connect(db_path, read_only=True)
+        relation = table
+    else:
+        con = _connect()
+        relation = _source(db_path, table, db_format)
+    extent = con.execute(f"SELECT MIN({min_column}), MAX({max_column}) FROM {relation}").fetchone()
+    _extents[key] = (version, extent)
+    return extent
+
+
+def add_host_selector(sidebar):
+    """Add the host selection of federated sources to the sidebar, return the selected hosts or None for all."""
+    db_format, db_path = settings()
+    if not federated(db_path):
+        return None
+    hosts = [host for host, _, _ in sources(db_format, db_path)]
+    selected = sidebar.multiselect("Hosts", hosts, default=hosts, help="Only the selected hosts are loaded.")
+    return selected if selected and len(selected) < len(hosts) else None
+
+
+def add_auto_refresh(sidebar):
+    """Add the auto refresh settings to the sidebar, return the refresh interval in seconds or None if disabled."""
+    enabled = sidebar.toggle("Auto-refresh", help="Refresh the charts as soon as their tables are updated.")
+    if not enabled:
+        return None
+    return sidebar.number_input("Refresh interval (seconds)", min_value=1, value=REFRESH_INTERVAL)
+
+
+def refresh_every(refresh, factor=1):
+    """Return the interval of a fragment refreshed `factor` times slower than the page, None if disabled."""
+    return None if refresh is None else refresh * factor
+
+
+def add_approximate_mode(sidebar):
+    """Add the approximate mode toggle to the sidebar, return True when sketches answer the distinct counts."""
+    return sidebar.toggle(
+        "Approximate mode",
+        help="Faster on long intervals: distinct counts are estimated with HyperLogLog, with a "
+        f"±{DISTINCT_ERROR:.0%} standard error, and rankings keep the heaviest hosts of each minute.",
+    )
+
+
+def approximate_value(value, approximate):
+    """Format a distinct count with its error bound in approximate mode."""
+    if not approximate or value is None:
+        return value
+    return f"≈ {value} ± {round(value * DISTINCT_ERROR)}"
+
+
 def add_user_red_list(con, sidebar):
     user = con.execute(
         """
         SELECT DISTINCT usr.name
         FROM gold_dim_process pro
-        LEFT JOIN gold_file_user usr ON pro.uid = usr.uid
+        LEFT JOIN gold_file_user usr ON pro.machine = usr.machine AND pro.uid = usr.uid
         ORDER BY name
     """
-    ).df()
-    hide_user = sidebar.multiselect("Hide user", user)
+    ).fetchall()
+    hide_user = sidebar.multiselect("Hide user", [name for name, in user])
     return hide_user
 
 
@@ -59,8 +548,8 @@ def add_pid_red_list(con, sidebar):
         FROM gold_dim_process
         ORDER BY pid
     """
-    ).df()
-    hide_pid = sidebar.multiselect("Hide PID", pid)
+    ).fetchall()
+    hide_pid = sidebar.multiselect("Hide PID", [value for value, in pid])
     return hide_pid
 
 
@@ -76,6 +565,6 @@ def add_command_red_list(con, sidebar):
         WHERE command IS NOT NULL
         ORDER BY command
     """
-    ).df()
-    hide_command = sidebar.multiselect("Hide command", command)
+    ).fetchall()
+    hide_command = sidebar.multiselect("Hide command", [name for name, in command])
     return hide_command
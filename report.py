@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import analysis
+
+# Analyses of each page, with the table and columns giving their default window. Debug analyses have no window.
+GROUPS = {
+    "process": (analysis.PROCESS, ("gold_fact_process", "created_at", "created_at")),
+    "network": (analysis.NETWORK, ("gold_fact_network_packet", "created_at", "created_at")),
+    "files": (analysis.FILES, ("gold_dim_file_reg", "started_at", "inserted_at")),
+    "debug": (analysis.DEBUG, None),
+}
+REPORT_DIRECTORY = ".output/report"
+REPORT_FORMATS = ["parquet", "json"]
+SUMMARY_FILE = "summary.json"
+
+
+def run(export_path, export_format, output, start=None, end=None, report_format="parquet", threads=None):
+    """Run every page analysis on an export and write their results in `<output>/<export name>/<page>/`.
+
+    The window of each page defaults to the time extent of its main table. Return the summary of the report, also
+    written in `summary.json`, with the row count of each result and the value of the single value ones.
+    """
+    # The pages read their source from the environment, set by the home page in the dashboard.
+    os.environ["RSBD_FORMAT"], os.environ["RSBD_PATH"] = export_format, export_path
+    import pages
+
+    directory = os.path.join(output, os.path.basename(os.path.normpath(export_path)))
+    summary = {"export": export_path, "format": export_format, "pages": {}}
+    for group, (analyses, range_table) in GROUPS.items():
+        window = None
+        params: list = []
+        if range_table is not None:
+            extent = pages.time_range(*range_table)
+            window = (start or extent[0], end or extent[1])
+            if None in window:
+                # Empty table, the page shows nothing either.
+                continue
+            params = list(window)
+        con = pages.connection(window)
+        if threads:
+            con.execute(f"SET threads = {threads};")
+        os.makedirs(os.path.join(directory, group), exist_ok=True)
+        summary["pages"][group] = {"window": [str(bound) for bound in window] if window else None, "results": {}}
+        for function in analyses:
+            # Materialized once, the relation would run the analysis again for each write and read.
+            table = function(con, *params).to_arrow_table()
+            path = os.path.join(directory, group, f"{function.__name__}.{report_format}")
+            if report_format == "json":
+                con.from_arrow(table).df().to_json(path, orient="records", date_format="iso")
+            else:
+                con.from_arrow(table).write_parquet(path)
+            result = {"rows": table.num_rows}
+            if table.shape == (1, 1):
+                result["value"] = table.column(0)[0].as_py()
+            summary["pages"][group]["results"][function.__name__] = result
+    with open(os.path.join(directory, SUMMARY_FILE), "w") as file:
+        json.dump(summary, file, indent=2, default=str)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the dashboard analyses on rstracer exports without Streamlit.")
+    parser.add_argument("exports", nargs="+", help="Export directories or DuckDB files, one report each.")
+    parser.add_argument("--format", default="parquet", help="Export format: parquet, csv, duckdb or history.")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="Window start, the oldest row by default.")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="Window end, the newest row by default.")
+    parser.add_argument("--output", default=REPORT_DIRECTORY, help="Directory of the reports.")
+    parser.add_argument("--report-format", default="parquet", choices=REPORT_FORMATS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Exports processed in parallel.")
+    args = parser.parse_args()
+
+    workers = max(1, min(args.workers, len(args.exports)))
+    # Each worker gets its share of the cores, DuckDB would otherwise use all of them in every process.
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(run, path, args.format, args.output, args.start, args.end, args.report_format, threads)
+            for path in args.exports
+        ]
+        for path, future in zip(args.exports, futures):
+            summary = future.result()
+            results = sum(len(page["results"]) for page in summary["pages"].values())
+            print(f"{path}: {results} results written in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ from time import sleep
 import streamlit as st
 from streamlit.logger import get_logger
 
+from advisor import ADVISOR_DIRECTORY, CONFIG_FILE
 from rstracer import Rstracer
 
 LOGGER = get_logger(__name__)
@@ -20,17 +21,60 @@ def run():
 
     db_format = st.selectbox(
         "What's the format of your rstracer database ?",
-        ["duckdb", "parquet", "csv"],
+        ["duckdb", "parquet", "csv", "history"],
     )
 
-    db_path = st.text_input("Database path", value=os.getenv("RSBD_PATH"))
+    db_path = st.text_input(
+        "Database path",
+        value=os.getenv("RSBD_PATH"),
+        help="Federate several hosts with `host=path` entries separated by `;`, `.duckdb` files or export directories.",
+    )
+
+    use_cache = st.checkbox(
+        "Cache converted database",
+        value=bool(os.getenv("RSBD_CACHE")),
+        disabled=db_format not in ("parquet", "csv"),
+        help="Convert the export once into a DuckDB file, next loads only rebuild the changed tables.",
+    )
+
+    with st.expander("DuckDB resources"):
+        resource_column = st.columns(3)
+        resources = {
+            "RSBD_THREADS": resource_column[0].text_input(
+                "Threads", value=os.getenv("RSBD_THREADS", ""), placeholder="all cores"
+            ),
+            "RSBD_MEMORY_LIMIT": resource_column[1].text_input(
+                "Memory limit", value=os.getenv("RSBD_MEMORY_LIMIT", ""), placeholder="80% of RAM", help="e.g. 4GB"
+            ),
+            "RSBD_TEMP_DIRECTORY": resource_column[2].text_input(
+                "Spill directory",
+                value=os.getenv("RSBD_TEMP_DIRECTORY", ""),
+                placeholder="next to the database",
+                help="Loads and queries above the memory limit spill their data here.",
+            ),
+        }
+
+    serve_api = st.checkbox(
+        "Serve the analyses API",
+        help="Serve the page analyses as JSON or Arrow on a local port, from the database loaded by the dashboard.",
+    )
 
     load_column = st.columns(2)
     with load_column[0]:
         if st.button("Load 🚀"):
+            # Loaded on the paths using them, the home page only needs streamlit to show up.
+            from cache import CACHE_DIRECTORY
+
             os.environ["RSBD_FORMAT"] = db_format
             os.environ["RSBD_PATH"] = db_path
-            Rstracer().stop()
+            set_resources(resources)
+            if use_cache and db_format in ("parquet", "csv"):
+                os.environ["RSBD_CACHE"] = CACHE_DIRECTORY
+            else:
+                os.environ.pop("RSBD_CACHE", None)
+            Rstracer().request_stop()
+            if serve_api:
+                start_api()
             with load_column[1]:
                 progress_bar = st.progress(0, text="Loading...")
                 for percent_complete in range(100):
@@ -39,15 +83,29 @@ def run():
                 progress_bar.progress(100, text="Ready !")
 
     st.divider()
+    candidate = os.path.join(ADVISOR_DIRECTORY, CONFIG_FILE)
+    use_candidate = st.checkbox(
+        "Use advisor configuration",
+        disabled=not os.path.exists(candidate),
+        help=f"Launch rstracer with the candidate configuration written by the Advisor page in `{candidate}`.",
+    )
     live_column = st.columns(2)
     with live_column[0]:
         if st.button("Live Mode 🚀"):
+            import history
+            import logs
+
             st.sidebar.warning(
                 "Warning: This program requires sudo permissions. Please check your console to enter your password."
             )
-            Rstracer().launch()
-            os.environ["RSBD_FORMAT"] = "parquet"
-            os.environ["RSBD_PATH"] = ".output/rstracer"
+            Rstracer().launch(cwd=ADVISOR_DIRECTORY if use_candidate else None)
+            history.record(".output/rstracer")
+            logs.follow()
+            os.environ["RSBD_FORMAT"] = "history"
+            os.environ["RSBD_PATH"] = history.HISTORY_DIRECTORY
+            set_resources(resources)
+            if serve_api:
+                start_api()
             with live_column[1]:
                 progress_bar = st.progress(0, text="Initializing...")
                 for percent_complete in range(100):
@@ -55,6 +113,36 @@ def run():
                     progress_bar.progress(percent_complete, text="Initializing...")
             progress_bar.progress(100, text="Ready !")
 
+    state = Rstracer().state()
+    status_column = st.columns(2)
+    with status_column[0]:
+        st.caption(f"rstracer: {state}")
+    with status_column[1]:
+        if st.button("Stop 🛑", disabled=state != "Running"):
+            Rstracer().request_stop()
+            st.rerun()
+
+
+def start_api():
+    """Serve the analyses from the dashboard process, sharing its loaded database, once per process."""
+    import api
+
+    try:
+        host, port = api.start().server_address[:2]
+    except OSError as error:
+        st.error(f"The analyses API could not start: {error}")
+        return
+    st.caption(f"Analyses served on http://{host}:{port}/")
+
+
+def set_resources(resources):
+    """Set the DuckDB resource variables of the pages connections, the empty ones keep the DuckDB defaults."""
+    for variable, value in resources.items():
+        if value.strip():
+            os.environ[variable] = value.strip()
+        else:
+            os.environ.pop(variable, None)
+
 
 if __name__ == "__main__":
     run()
@@ -1,26 +1,45 @@
 import subprocess
-from time import sleep
+import threading
+import time
+from collections import deque
 from typing import Dict, Type
 
-import psutil
+# Signals sent to the rstracer process tree until it exits, with the seconds waited after each one.
+# SIGINT lets rstracer flush its last export, the next ones are only sent if it hangs.
+STOP_SIGNALS = [("SIGINT", 10), ("SIGTERM", 5), ("SIGKILL", 5)]
+# Resource usage of the rstracer process tree is sampled every `SAMPLE_FREQUENCY` seconds, the last hour is kept.
+SAMPLE_FREQUENCY = 2
+SAMPLE_HISTORY = 1800
 
 
 class SingletonMeta(type):
 
     _instances: Dict[Type, object] = {}
+    _lock = threading.Lock()
 
     def __call__(cls, *args, **kwargs):
-        if cls not in cls._instances:
-            instance = super().__call__(*args, **kwargs)
-            cls._instances[cls] = instance
+        # Streamlit runs each session in its own thread, the first call must create the only instance.
+        with cls._lock:
+            if cls not in cls._instances:
+                instance = super().__call__(*args, **kwargs)
+                cls._instances[cls] = instance
         return cls._instances[cls]
 
 
 class Rstracer(metaclass=SingletonMeta):
+    """Supervisor of the rstracer process, shared by the sessions of the dashboard.
+
+    `launch` and `request_stop` return immediately, a watcher thread waits for the process so its exit is notified
+    without polling. While it runs, a sampler thread records the overhead of the tracer in `samples`.
+    """
 
     def __init__(self, path="rstracer"):
         self.path = path
         self.process = None
+        self._exited = threading.Event()
+        self._stopper = None
+        self._lock = threading.RLock()
+        self.samples = deque(maxlen=SAMPLE_HISTORY)
 
     def __del__(self):
         try:
@@ -29,23 +48,106 @@ class Rstracer(metaclass=SingletonMeta):
         except ImportError:
             pass
 
-    def launch(self):
-        if not self.state() == "Running":
-            self.process = subprocess.Popen(["sudo", self.path])
-            return self.process.pid
+    def launch(self, cwd=None):
+        """Start rstracer if it is not running, from `cwd` to use the `rstracer.toml` of this directory."""
+        while True:
+            with self._lock:
+                stopper = self._stopper
+                if stopper is None:
+                    if self.state() == "Running":
+                        return None
+                    self.process = subprocess.Popen(["sudo", self.path], cwd=cwd)
+                    self._exited.clear()
+                    threading.Thread(target=self._watch, args=(self.process,), daemon=True).start()
+                    self.samples = deque(maxlen=SAMPLE_HISTORY)
+                    threading.Thread(target=self._sample, args=(self.process,), daemon=True).start()
+                    return self.process.pid
+            # A new capture must not start before the previous one released its output files. The stopper takes the
+            # lock when it finishes, it is joined without holding it.
+            stopper.join()
+
+    def _watch(self, process):
+        process.wait()
+        if process is self.process:
+            self._exited.set()
 
     def state(self):
         if self.process is None:
             return "Not running"
-        return "Running" if self.process.poll() is None else "Exited"
+        if self._exited.is_set():
+            return "Exited"
+        return "Stopping" if self._stopper is not None else "Running"
 
     def stop(self):
-        if self.process is not None:
-            child_processes = [
-                proc for proc in psutil.process_iter(attrs=["pid", "ppid"]) if proc.info["ppid"] == self.process.pid
-            ]
-            for child in child_processes:
-                subprocess.run(["sudo", "kill", "-SIGINT", str(child.info["pid"])])
-            subprocess.run(["sudo", "kill", "-SIGINT", str(self.process.pid)])
-            while self.state() != "Exited":
-                sleep(1)
\ No newline at end of file
+        """Signal the rstracer process tree and wait for its exit, escalating while some processes are still running."""
+        import psutil
+
+        if self.process is None:
+            return
+        # The tree is listed once, workers must still be signaled when the root exits first.
+        processes = self._processes()
+        for signal, timeout in STOP_SIGNALS:
+            if not processes:
+                break
+            # Processes run as root, one `kill` call signals the whole tree.
+            subprocess.run(["sudo", "kill", f"-{signal}", *[str(process.pid) for process in processes]], check=False)
+            _, processes = psutil.wait_procs(processes, timeout=timeout)
+        self._exited.wait(STOP_SIGNALS[-1][1])
+
+    def request_stop(self):
+        """Stop rstracer from a background thread, return without waiting for its exit."""
+        with self._lock:
+            if self.state() != "Running":
+                return
+            self._stopper = threading.Thread(target=self._stop, daemon=True)
+            self._stopper.start()
+
+    def _stop(self):
+        try:
+            self.stop()
+        finally:
+            with self._lock:
+                self._stopper = None
+
+    def _processes(self):
+        # psutil is only needed once rstracer runs, the home page reads the state without loading it.
+        import psutil
+
+        # sudo is the direct child, rstracer and its workers are its descendants.
+        try:
+            root = psutil.Process(self.process.pid)
+            return [root] + root.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return []
+
+    def _sample(self, process):
+        import psutil
+
+        sampled = {}
+        while process is self.process and not self._exited.wait(SAMPLE_FREQUENCY):
+            sample = {"time": time.time(), "cpu": 0.0, "rss": 0, "read_bytes": 0, "write_bytes": 0, "threads": 0}
+            processes = {}
+            for child in self._processes():
+                # The same `Process` must be kept between samples, `cpu_percent` measures the time since its last call.
+                child = sampled.get(child.pid, child)
+                try:
+                    with child.oneshot():
+                        sample["cpu"] += child.cpu_percent()
+                        sample["rss"] += child.memory_info().rss
+                        sample["threads"] += child.num_threads()
+                        processes[child.pid] = child
+                        if sample["read_bytes"] is not None:
+                            io = child.io_counters()
+                            sample["read_bytes"] += io.read_bytes
+                            sample["write_bytes"] += io.write_bytes
+                except (psutil.AccessDenied, AttributeError):
+                    # I/O counters of root processes are only readable as root, and missing on macOS.
+                    sample["read_bytes"] = sample["write_bytes"] = None
+                except psutil.NoSuchProcess:
+                    continue
+            sampled = processes
+            self.samples.append(sample)
+
+    def overhead(self):
+        """Return the resource usage samples of the rstracer process tree, oldest first."""
+        return list(self.samples)
@@ -0,0 +1,428 @@
+import os
+import re
+
+TABLES = [
+    "gold_dim_file_reg",
+    "gold_dim_network_foreign_ip",
+    "gold_dim_network_interface",
+    "gold_dim_network_open_port",
+    "gold_dim_network_socket",
+    "gold_dim_network_host",
+    "gold_dim_process",
+    "gold_fact_file_reg",
+    "gold_fact_network_ip",
+    "gold_fact_network_packet",
+    "gold_fact_process",
+    "gold_fact_process_network",
+    "gold_file_host",
+    "gold_file_service",
+    "gold_file_user",
+    "gold_tech_chrono",
+    "gold_tech_table_count",
+]
+
+# Columns of the gold tables queried by the pages, the derived tables and the advisor, with their types. Loads in
+# memory only read these columns, so a query on a new column must declare it here. Csv exports are read with these
+# types instead of DuckDB type detection, the other columns are still detected. Tables declaring no column are read
+# whole.
+
+GOLD_SCHEMA = {
+    "gold_dim_file_reg": {
+        "pid": "INTEGER",
+        "fd": "VARCHAR",
+        "node": "VARCHAR",
+        "name": "VARCHAR",
+        "started_at": "TIMESTAMP",
+        "inserted_at": "TIMESTAMP",
+    },
+    "gold_dim_network_foreign_ip": {"address": "VARCHAR"},
+    "gold_dim_network_interface": {"address": "VARCHAR"},
+    "gold_dim_network_open_port": {
+        "port": "INTEGER",
+        "command": "VARCHAR",
+        "started_at": "TIMESTAMP",
+        "inserted_at": "TIMESTAMP",
+    },
+    "gold_dim_network_socket": {
+        "pid": "INTEGER",
+        "source_address": "VARCHAR",
+        "source_port": "INTEGER",
+        "started_at": "TIMESTAMP",
+        "inserted_at": "TIMESTAMP",
+    },
+    "gold_dim_network_host": {"address": "VARCHAR", "host": "VARCHAR"},
+    "gold_dim_process": {
+        "pid": "INTEGER",
+        "ppid": "INTEGER",
+        "uid": "BIGINT",
+        "command": "VARCHAR",
+        "full_command": "VARCHAR",
+        "started_at": "TIMESTAMP",
+        "inserted_at": "TIMESTAMP",
+    },
+    "gold_fact_file_reg": {
+        "pid": "INTEGER",
+        "fd": "VARCHAR",
+        "node": "VARCHAR",
+        "size": "BIGINT",
+        "created_at": "TIMESTAMP",
+    },
+    "gold_fact_network_ip": {
+        "_id": "UBIGINT",
+        "source_address": "VARCHAR",
+        "destination_address": "VARCHAR",
+        "source_port": "INTEGER",
+        "destination_port": "INTEGER",
+        "created_at": "TIMESTAMP",
+        "inserted_at": "TIMESTAMP",
+    },
+    "gold_fact_network_packet": {
+        "_id": "UBIGINT",
+        "interface": "VARCHAR",
+        "length": "BIGINT",
+        "network": "VARCHAR",
+        "transport": "VARCHAR",
+        "application": "VARCHAR",
+        "created_at": "TIMESTAMP",
+    },
+    "gold_fact_process": {"pid": "INTEGER", "pcpu": "DOUBLE", "pmem": "DOUBLE", "created_at": "TIMESTAMP"},
+    "gold_fact_process_network": {"packet_id": "UBIGINT", "pid": "INTEGER", "send": "BOOLEAN"},
+    "gold_file_host": {},
+    "gold_file_service": {},
+    "gold_file_user": {"uid": "BIGINT", "name": "VARCHAR"},
+    "gold_tech_chrono": {
+        "name": "VARCHAR",
+        "brz_min_ingest": "DOUBLE",
+        "brz_max_ingest": "DOUBLE",
+        "svr_min_ingest": "DOUBLE",
+        "svr_max_ingest": "DOUBLE",
+        "min_ingest": "DOUBLE",
+        "max_ingest": "DOUBLE",
+    },
+    "gold_tech_table_count": {"_id": "UBIGINT", "name": "VARCHAR", "max_count": "BIGINT"},
+}
+
+
+# Columns of the rows rolled up by the history store, with their value for a raw row: `packets` counts the raw rows of
+# a rolled up row, the other ones are resolved from the rows linked to the raw rows. Loads add them to every source,
+# so the pages read raw and rolled up rows alike and count the packets with `SUM(packets)`.
+ROLLUP_COLUMNS = {
+    "gold_fact_network_ip": {"packets": "1::BIGINT", "length": "NULL::BIGINT", "transport": "NULL::VARCHAR"},
+    "gold_fact_network_packet": {"packets": "1::BIGINT", "pid": "NULL::INTEGER"},
+}
+
+
+# Column labeling the rows of each traced machine, with the host of a federated source or the name of a single source.
+# Process, user, file and packet ids are only unique on their machine, so rows are only joined with the rows of the
+# same machine.
+MACHINE_COLUMN = "machine"
+
+
+def projection(table, columns=(), machine=None):
+    """Return the select list of the columns of `table` declared in `GOLD_SCHEMA`, `*` when there is none.
+
+    The `ROLLUP_COLUMNS` of the table are added, with their raw row value where they are empty or missing from the
+    `columns` of the source. With a `machine`, its name is added in the `MACHINE_COLUMN`.
+    """
+    select = list(GOLD_SCHEMA.get(table, {})) or [f"* EXCLUDE ({MACHINE_COLUMN})" if MACHINE_COLUMN in columns else "*"]
+    for column, default in ROLLUP_COLUMNS.get(table, {}).items():
+        select.append(f"COALESCE({column}, {default}) AS {column}" if column in columns else f"{default} AS {column}")
+    if machine is not None:
+        select.append("'{}' AS {}".format(machine.replace("'", "''"), MACHINE_COLUMN))
+    return ", ".join(select)
+
+
+def machine(db_path):
+    """Return the machine name of the rows of a single source, the name of its file or directory."""
+    return os.path.basename(os.path.normpath(db_path))
+
+
+def describe(con, relation):
+    """Return the column names of a DuckDB table expression."""
+    return [column[0] for column in con.execute(f"DESCRIBE SELECT * FROM {relation}").fetchall()]
+
+
+def source(db_path, table, db_format):
+    """Return the DuckDB table expression reading an exported gold table."""
+    file = f"{db_path}/{table}.{db_format}"
+    if db_format.lower() != "csv":
+        return f"'{file}'"
+    # Timestamps are parsed as ISO 8601: DuckDB exports omit the fraction of seconds when it is zero,
+    # which a strict `timestampformat` would reject.
+    options = "header = true, parallel = true"
+    if GOLD_SCHEMA.get(table):
+        types = ", ".join(f"'{column}': '{column_type}'" for column, column_type in GOLD_SCHEMA[table].items())
+        options += f", types = {{{types}}}"
+    return f"read_csv('{file}', {options})"
+
+
+# Tables derived from the gold tables once per load, so the pages read them instead of repeating their joins.
+# `network_traffic` is `gold_fact_network_ip` with the host of each address, whether it is local, an interface of the
+# traced machine, or foreign, the direction of the packet seen from the machine and its length, summed over the
+# `packets` of the rows rolled up by the history store. Packets crossing the
+# machine boundary get the `local_port` of the machine side and the `command` listening on it when they were sent,
+# the open port started last before the packet, found by an ASOF join instead of a range join on the port history.
+# Only the packets whose last started port was already closed are range joined, to an earlier port still open.
+# `network_flow` groups these packets by conversation and second, in `created_at`, with the packets and bytes of each
+# direction and the owning pid, so the conversations of a window sum its seconds.
+# The sketches of approximate mode are kept by minute, in `created_at`, so the minutes of a window are merged instead of
+# scanning its rows. `process_sketch` holds the HyperLogLog state of the processes of each user and command, and
+# `foreign_ip_sketch` the `HEAVY_HITTERS` foreign hosts exchanging the most bytes, with a row without address holding
+# the bytes of the largest host left out, the most a merged host can miss from this minute.
+# Every join is restricted to the rows of the same `machine`.
+HEAVY_HITTERS = 50
+DERIVED_TABLES = {
+    "network_traffic": """
+WITH interface_host AS
+(
+    SELECT DISTINCT int.machine, host.host
+    FROM gold_dim_network_interface int
+    INNER JOIN gold_dim_network_host host ON host.machine = int.machine AND host.address = int.address
+),
+foreign_ip AS
+(
+    SELECT DISTINCT machine, address
+    FROM gold_dim_network_foreign_ip
+),
+traffic AS
+(
+    SELECT
+        ip.* EXCLUDE (length, transport),
+        host1.host AS source_host,
+        host2.host AS destination_host,
+        local1.host IS NOT NULL AS source_local,
+        local2.host IS NOT NULL AS destination_local,
+        foreign1.address IS NOT NULL AS source_foreign,
+        foreign2.address IS NOT NULL AS destination_foreign,
+        COALESCE(pack.length, ip.length) AS length,
+        COALESCE(pack.transport, ip.transport) AS transport,
+    FROM gold_fact_network_ip ip
+    LEFT JOIN gold_dim_network_host host1 ON ip.machine = host1.machine AND ip.source_address = host1.address
+    LEFT JOIN gold_dim_network_host host2 ON ip.machine = host2.machine AND ip.destination_address = host2.address
+    LEFT JOIN interface_host local1 ON ip.machine = local1.machine AND host1.host = local1.host
+    LEFT JOIN interface_host local2 ON ip.machine = local2.machine AND host2.host = local2.host
+    LEFT JOIN foreign_ip foreign1 ON ip.machine = foreign1.machine AND ip.source_address = foreign1.address
+    LEFT JOIN foreign_ip foreign2 ON ip.machine = foreign2.machine AND ip.destination_address = foreign2.address
+    LEFT JOIN gold_fact_network_packet pack ON ip.machine = pack.machine AND ip._id = pack._id
+),
+classified AS
+(
+    SELECT
+        *,
+        CASE
+            WHEN source_local AND NOT destination_local THEN 'outgoing'
+            WHEN destination_local AND NOT source_local THEN 'incoming'
+        END AS direction,
+        CASE
+            WHEN source_local AND NOT destination_local THEN source_port
+            WHEN destination_local AND NOT source_local THEN destination_port
+        END AS local_port,
+    FROM traffic
+),
+last_port AS
+(
+    SELECT
+        classified.*,
+        port.command AS last_command,
+        classified.created_at <= port.inserted_at AS last_open,
+    FROM classified
+    ASOF LEFT JOIN gold_dim_network_open_port port
+    ON classified.machine = port.machine
+    AND classified.local_port = port.port
+    AND classified.created_at >= port.started_at
+),
+closed_port AS
+(
+    SELECT *, ROW_NUMBER() OVER () AS packet
+    FROM last_port
+    WHERE NOT last_open
+)
+SELECT * EXCLUDE (last_command, last_open), CASE WHEN last_open THEN last_command END AS command,
+FROM last_port
+WHERE last_open IS NOT FALSE
+UNION ALL BY NAME
+SELECT closed_port.* EXCLUDE (last_command, last_open, packet), port.command,
+FROM closed_port
+LEFT JOIN gold_dim_network_open_port port
+ON closed_port.machine = port.machine
+AND closed_port.local_port = port.port
+AND closed_port.created_at BETWEEN port.started_at AND port.inserted_at
+QUALIFY ROW_NUMBER() OVER (PARTITION BY closed_port.packet ORDER BY port.started_at DESC) = 1
+ORDER BY created_at
+""",
+    "network_flow": """
+WITH packet_flow AS
+(
+    SELECT
+        traffic.machine,
+        CASE WHEN direction = 'outgoing' THEN source_address ELSE destination_address END AS local_address,
+        local_port,
+        CASE WHEN direction = 'outgoing' THEN destination_address ELSE source_address END AS remote_address,
+        CASE WHEN direction = 'outgoing' THEN destination_port ELSE source_port END AS remote_port,
+        transport,
+        DATE_TRUNC('second', created_at) AS created_at,
+        created_at AS first_seen,
+        created_at AS last_seen,
+        CASE WHEN direction = 'outgoing' THEN packets ELSE 0 END AS sent_packets,
+        CASE WHEN direction = 'outgoing' THEN COALESCE(length, 0) ELSE 0 END AS sent_bytes,
+        CASE WHEN direction = 'incoming' THEN packets ELSE 0 END AS received_packets,
+        CASE WHEN direction = 'incoming' THEN COALESCE(length, 0) ELSE 0 END AS received_bytes,
+        pro_net.pid,
+    FROM network_traffic traffic
+    LEFT JOIN
+    (
+        SELECT machine, packet_id, ANY_VALUE(pid) AS pid
+        FROM gold_fact_process_network
+        GROUP BY machine, packet_id
+    ) pro_net
+    ON traffic.machine = pro_net.machine AND traffic._id = pro_net.packet_id
+    WHERE direction IS NOT NULL
+)
+SELECT
+    machine,
+    local_address,
+    local_port,
+    remote_address,
+    remote_port,
+    transport,
+    created_at,
+    MIN(first_seen) AS first_seen,
+    MAX(last_seen) AS last_seen,
+    SUM(sent_packets)::BIGINT AS sent_packets,
+    SUM(sent_bytes)::BIGINT AS sent_bytes,
+    SUM(received_packets)::BIGINT AS received_packets,
+    SUM(received_bytes)::BIGINT AS received_bytes,
+    ANY_VALUE(pid) AS pid,
+FROM packet_flow
+GROUP BY machine, local_address, local_port, remote_address, remote_port, transport, created_at
+""",
+    "process_sketch": """
+SELECT
+    DATE_TRUNC('minute', fact.created_at) AS created_at,
+    usr.name AS user_name,
+    dim.command,
+    APPROX_COUNT_DISTINCT(ROW(fact.machine, fact.pid, dim.started_at)) EXPORT_STATE AS processes,
+FROM gold_fact_process fact
+LEFT JOIN gold_dim_process dim ON fact.machine = dim.machine AND fact.pid = dim.pid
+LEFT JOIN gold_file_user usr ON dim.machine = usr.machine AND dim.uid = usr.uid
+GROUP BY DATE_TRUNC('minute', fact.created_at), usr.name, dim.command
+""",
+    "foreign_ip_sketch": f"""
+WITH foreign_ip AS
+(
+    SELECT
+        DATE_TRUNC('minute', created_at) AS created_at,
+        CASE WHEN source_foreign THEN source_host ELSE destination_host END AS address,
+        SUM(packets)::BIGINT AS packets,
+        SUM(length)::BIGINT AS length,
+        SUM(destination_foreign::INTEGER * packets)::BIGINT AS sent_packets,
+        SUM(EPOCH(created_at) * packets) AS epoch,
+        ROW_NUMBER() OVER (PARTITION BY DATE_TRUNC('minute', created_at) ORDER BY SUM(length) DESC, address) AS rank
+    FROM network_traffic
+    WHERE source_foreign <> destination_foreign
+    GROUP BY DATE_TRUNC('minute', created_at), address
+)
+SELECT created_at, address, packets, length, sent_packets, epoch
+FROM foreign_ip
+WHERE rank <= {HEAVY_HITTERS}
+UNION ALL
+SELECT created_at, NULL, NULL, MAX(length), NULL, NULL
+FROM foreign_ip
+WHERE rank > {HEAVY_HITTERS}
+GROUP BY created_at
+""",
+}
+
+
+# String columns repeated over many rows, loaded as ENUMs so joins, group-bys and distinct counts compare integer codes
+# and each distinct string is stored once. Columns of the same domain share their ENUM type and are joined without
+# decoding. Values are sorted, so the ENUM order is the string order.
+DICTIONARY_COLUMNS = {
+    "command": [("gold_dim_process", "command"), ("gold_dim_network_open_port", "command")],
+    "full_command": [("gold_dim_process", "full_command")],
+    "file_name": [("gold_dim_file_reg", "name")],
+    "fd": [("gold_dim_file_reg", "fd"), ("gold_fact_file_reg", "fd")],
+    "address": [
+        ("gold_fact_network_ip", "source_address"),
+        ("gold_fact_network_ip", "destination_address"),
+        ("gold_dim_network_host", "address"),
+        ("gold_dim_network_foreign_ip", "address"),
+        ("gold_dim_network_interface", "address"),
+        ("gold_dim_network_socket", "source_address"),
+        ("network_flow", "local_address"),
+        ("network_flow", "remote_address"),
+    ],
+    "host": [("gold_dim_network_host", "host")],
+    "interface": [("gold_fact_network_packet", "interface")],
+    "network": [("gold_fact_network_packet", "network")],
+    "transport": [
+        ("gold_fact_network_packet", "transport"),
+        ("gold_fact_network_ip", "transport"),
+        ("network_flow", "transport"),
+    ],
+    "application": [("gold_fact_network_packet", "application")],
+    "machine": [(table, MACHINE_COLUMN) for table in TABLES] + [("network_flow", MACHINE_COLUMN)],
+}
+
+
+def encode(con, tables=None):
+    """Convert the `DICTIONARY_COLUMNS` of the tables of `con` into the ENUM of their domain, named `<domain>_enum`.
+
+    Tables derived afterwards inherit the ENUM columns, strings are only decoded in the results. With `tables`, only
+    the columns of these tables are converted, into the ENUM of their domain unchanged while it holds their values. A
+    domain gaining values gets its ENUM built again, its columns of the other tables are decoded and encoded again.
+    Return the tables whose columns were converted.
+    """
+    types = {
+        (table, column): data_type
+        for table, column, data_type in con.execute(
+            "SELECT table_name, column_name, data_type FROM duckdb_columns() WHERE NOT internal"
+        ).fetchall()
+    }
+    enums = {
+        name for name, in con.execute("SELECT type_name FROM duckdb_types() WHERE logical_type = 'ENUM'").fetchall()
+    }
+    converted = set()
+    for domain, columns in DICTIONARY_COLUMNS.items():
+        strings = [
+            column for column in columns if types.get(column) == "VARCHAR" and (tables is None or column[0] in tables)
+        ]
+        if not strings:
+            continue
+        values = " UNION ".join(f"SELECT {column} FROM {table}" for table, column in strings)
+        new_values = (
+            f"{domain}_enum" not in enums
+            or con.execute(
+                f"SELECT COUNT(*) FROM ({values}) domain(value) "
+                f"WHERE value IS NOT NULL AND value NOT IN (SELECT UNNEST(ENUM_RANGE(NULL::{domain}_enum)));"
+            ).fetchone()[0]
+        )
+        if new_values:
+            encoded = [column for column in columns if types.get(column, "").startswith("ENUM(")]
+            for table, column in encoded:
+                con.execute(f"ALTER TABLE {table} ALTER {column} TYPE VARCHAR;")
+            strings += encoded
+            values = " UNION ".join(f"SELECT {column} FROM {table}" for table, column in strings)
+            con.execute(f"DROP TYPE IF EXISTS {domain}_enum;")
+            con.execute(
+                f"CREATE TYPE {domain}_enum AS ENUM "
+                f"(SELECT value FROM ({values}) domain(value) WHERE value IS NOT NULL ORDER BY value);"
+            )
+        for table, column in strings:
+            con.execute(f"ALTER TABLE {table} ALTER {column} TYPE {domain}_enum;")
+        converted.update(table for table, _ in strings)
+    return converted
+
+
+def derive(con, temporary=False, exclude=()):
+    """Create the derived tables from the gold tables of `con`, as views when the database is read-only."""
+    for table, query in DERIVED_TABLES.items():
+        if table in exclude:
+            continue
+        kind = "TEMP VIEW" if temporary else "TABLE"
+        con.execute(f"CREATE OR REPLACE {kind} {table} AS {query};")
+
+
+def inputs(table):
+    """Return the gold and derived tables read by the query of a derived table."""
+    return [name for name in [*TABLES, *DERIVED_TABLES] if re.search(rf"\b{name}\b", DERIVED_TABLES[table])]
@@ -0,0 +1,92 @@
+import os
+import sys
+
+import duckdb
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+START = "TIMESTAMP '2024-12-01 10:00:00'"
+
+# A small gold export of one traced machine: a process reading a file and exchanging a packet per second with a
+# foreign host, from the second `{first}` to the second `{rows}` of the trace.
+GOLD_TABLES = {
+    "gold_dim_file_reg": f"""
+        SELECT 10 AS pid, '3r' AS fd, '42' AS node, '/etc/hosts' AS name,
+        {START} AS started_at, {START} + INTERVAL 1 HOUR AS inserted_at""",
+    "gold_dim_network_foreign_ip": "SELECT '93.184.216.34' AS address",
+    "gold_dim_network_interface": "SELECT 'eth0' AS name, '192.168.1.10' AS address",
+    "gold_dim_network_open_port": f"""
+        SELECT 8080 AS port, 'curl' AS command, {START} AS started_at, {START} + INTERVAL 1 HOUR AS inserted_at""",
+    "gold_dim_network_socket": f"""
+        SELECT 10 AS pid, '192.168.1.10' AS source_address, 8080 AS source_port,
+        {START} AS started_at, {START} + INTERVAL 1 HOUR AS inserted_at""",
+    "gold_dim_network_host": """
+        SELECT * FROM (VALUES ('192.168.1.10', 'laptop'), ('93.184.216.34', 'example.com')) host(address, host)""",
+    "gold_dim_process": f"""
+        SELECT 10 AS pid, 1 AS ppid, 0 AS uid, 'curl' AS command, 'curl example.com' AS full_command,
+        {START} AS started_at, {START} + INTERVAL 1 HOUR AS inserted_at""",
+    "gold_fact_file_reg": f"""
+        SELECT 10 AS pid, '3r' AS fd, '42' AS node, 100 AS size, {START} + INTERVAL (i) SECOND AS created_at
+        FROM range({{first}}, {{rows}}) t(i)""",
+    "gold_fact_network_ip": f"""
+        SELECT
+            i::UBIGINT AS _id,
+            CASE WHEN i % 2 = 0 THEN '192.168.1.10' ELSE '93.184.216.34' END AS source_address,
+            CASE WHEN i % 2 = 0 THEN '93.184.216.34' ELSE '192.168.1.10' END AS destination_address,
+            CASE WHEN i % 2 = 0 THEN 8080 ELSE 443 END AS source_port,
+            CASE WHEN i % 2 = 0 THEN 443 ELSE 8080 END AS destination_port,
+            {START} + INTERVAL (i) SECOND AS created_at,
+            {START} + INTERVAL (i + 1) SECOND AS inserted_at
+        FROM range({{first}}, {{rows}}) t(i)""",
+    "gold_fact_network_packet": f"""
+        SELECT i::UBIGINT AS _id, 'eth0' AS interface, 100 AS length, 'ipv4' AS network, 'tcp' AS transport,
+        NULL::VARCHAR AS application, {START} + INTERVAL (i) SECOND AS created_at
+        FROM range({{first}}, {{rows}}) t(i)""",
+    "gold_fact_process": f"""
+        SELECT 10 AS pid, 1.0 AS pcpu, 0.5 AS pmem, {START} + INTERVAL (i) SECOND AS created_at
+        FROM range({{first}}, {{rows}}) t(i)""",
+    "gold_fact_process_network": f"""
+        SELECT i::UBIGINT AS packet_id, 10 AS pid, i % 2 = 0 AS send, {START} + INTERVAL (i + 1) SECOND AS inserted_at
+        FROM range({{first}}, {{rows}}) t(i)""",
+    "gold_file_host": "SELECT '127.0.0.1' AS address, 'localhost' AS name",
+    "gold_file_service": "SELECT 'http' AS name, 80 AS port, 'tcp' AS protocol",
+    "gold_file_user": "SELECT 0 AS uid, 'root' AS name",
+    "gold_tech_chrono": """
+        SELECT 'process_list' AS name, 0.1 AS brz_min_ingest, 0.2 AS brz_max_ingest, 0.1 AS svr_min_ingest,
+        0.2 AS svr_max_ingest, 0.1 AS min_ingest, {rows} / 100 AS max_ingest""",
+    "gold_tech_table_count": """
+        SELECT 1::UBIGINT AS _id, 'gold_fact_process' AS name, {rows} AS max_count""",
+}
+
+
+def write_export(directory, rows=10, db_format="parquet", first=0):
+    """Write the `GOLD_TABLES` export of the seconds `first` to `rows` in `directory`, return its path."""
+    os.makedirs(directory, exist_ok=True)
+    con = duckdb.connect()
+    options = "FORMAT PARQUET" if db_format == "parquet" else "HEADER"
+    for table, query in GOLD_TABLES.items():
+        con.execute(f"COPY ({query.format(rows=rows, first=first)}) TO '{directory}/{table}.{db_format}' ({options});")
+    con.close()
+    return str(directory)
+
+
+@pytest.fixture
+def export(tmp_path):
+    return write_export(tmp_path / "export")
+
+
+@pytest.fixture(autouse=True)
+def environment(monkeypatch):
+    """Start each test without dashboard settings nor loaded connections."""
+    import pages
+
+    for variable in ["RSBD_FORMAT", "RSBD_PATH", "RSBD_CACHE", *pages.RESOURCE_SETTINGS.values()]:
+        monkeypatch.delenv(variable, raising=False)
+    pages._loaded.clear()
+    pages._extents.clear()
+    yield
+    pages._loaded.clear()
+    for con in pages._caches.values():
+        con.close()
+    pages._caches.clear()
@@ -0,0 +1,20 @@
+import duckdb
+import pytest
+
+import advisor
+
+
+@pytest.fixture
+def con():
+    con = duckdb.connect()
+    con.execute(
+        "CREATE TABLE gold_tech_chrono (name VARCHAR, brz_max_ingest DOUBLE, svr_max_ingest DOUBLE, max_ingest DOUBLE);"
+    )
+    con.execute("CREATE TABLE gold_tech_table_count AS SELECT 'gold_fact_process' AS name, 10_000_000 AS max_count;")
+    return con
+
+
+@pytest.mark.parametrize("vacuum, proposed", [(600, 300), (8, 5), (5, None), (0, None)])
+def test_vacuum_shortened_when_enabled(con, vacuum, proposed):
+    recommendations = advisor.recommend(con, {"vacuum": {"gold": vacuum}}, [])
+    assert [recommendation["proposed"] for recommendation in recommendations] == ([proposed] if proposed else [])
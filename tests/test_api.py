@@ -0,0 +1,70 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+import pyarrow as pa
+import pytest
+
+import api
+import pages
+
+WINDOW = "start=2024-12-01T10:00:00&end=2024-12-01T11:00:00"
+
+
+@pytest.fixture
+def server(export, monkeypatch):
+    monkeypatch.setenv("RSBD_FORMAT", "parquet")
+    monkeypatch.setenv("RSBD_PATH", export)
+    api._results.clear()
+    server = api._listen("127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    api._results.clear()
+
+
+def get(url):
+    with urllib.request.urlopen(url) as response:
+        return response.headers["Content-Type"], response.read()
+
+
+def test_analyses_are_served_as_json_and_arrow(server):
+    _, body = get(f"{server}/")
+    assert json.loads(body)["process"]["process_total"] == ["hide_pid", "hide_user", "hide_command"]
+    _, body = get(f"{server}/process/process_total?{WINDOW}")
+    assert json.loads(body) == [{"count": 1}]
+    content_type, body = get(f"{server}/network/packet_count?{WINDOW}&format=arrow")
+    assert content_type == api.ARROW_TYPE
+    assert pa.ipc.open_stream(body).read_all().to_pylist() == [{"count": 10}]
+    _, body = get(f"{server}/process/process_total?{WINDOW}&hide_pid=10")
+    assert json.loads(body) == [{"count": 0}]
+
+
+def test_errors(server):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        get(f"{server}/process/unknown")
+    assert error.value.code == 404
+    with pytest.raises(urllib.error.HTTPError) as error:
+        get(f"{server}/process/process_total?start=yesterday")
+    assert error.value.code == 400
+
+
+def test_requests_reuse_the_connection_loaded_by_the_pages(server):
+    pages.connection((datetime(2024, 12, 1, 9), datetime(2024, 12, 1, 12)))
+    loaded = dict(pages._loaded)
+    get(f"{server}/network/foreign_ip_traffic?{WINDOW}")
+    assert pages._loaded == loaded
+
+
+def test_least_recently_requested_results_are_evicted(export, monkeypatch):
+    monkeypatch.setenv("RSBD_FORMAT", "parquet")
+    monkeypatch.setenv("RSBD_PATH", export)
+    monkeypatch.setattr(api, "RESULT_CACHE_SIZE", 2)
+    monkeypatch.setattr(api, "_results", api.OrderedDict())
+    query = {"start": ["2024-12-01T10:00:00"], "end": ["2024-12-01T11:00:00"]}
+    for name in ["packet_count", "packet_size", "packet_count", "listening_port"]:
+        api.run("network", name, query)
+    assert [key[1] for key in api._results] == ["packet_count", "listening_port"]
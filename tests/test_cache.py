@@ -0,0 +1,101 @@
+import duckdb
+from conftest import write_export
+
+import cache
+import pages
+from schema import TABLES
+
+
+def count(con, table):
+    return con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_build_rebuilds_changed_tables(export, tmp_path):
+    path = cache.build(export, "parquet", TABLES, str(tmp_path / "cache"))
+    con = duckdb.connect(path, read_only=True)
+    fingerprints = dict(con.execute(f"SELECT * FROM {cache.FINGERPRINT_TABLE}").fetchall())
+    assert count(con, "gold_fact_process") == 10
+    assert count(con, "network_traffic") == 10
+    con.close()
+
+    write_export(export, rows=20)
+    cache.build(export, "parquet", TABLES, str(tmp_path / "cache"))
+    con = duckdb.connect(path, read_only=True)
+    assert count(con, "gold_fact_process") == 20
+    assert count(con, "network_traffic") == 20
+    assert dict(con.execute(f"SELECT * FROM {cache.FINGERPRINT_TABLE}").fetchall()) != fingerprints
+    con.close()
+
+
+def test_build_projects_and_encodes(export, tmp_path):
+    con = duckdb.connect(cache.build(export, "parquet", TABLES, str(tmp_path / "cache")), read_only=True)
+    columns = dict(
+        con.execute(
+            "SELECT column_name, data_type FROM duckdb_columns() WHERE table_name = 'gold_dim_process'"
+        ).fetchall()
+    )
+    assert list(columns) == ["pid", "ppid", "uid", "command", "full_command", "started_at", "inserted_at", "machine"]
+    assert columns["command"].startswith("ENUM")
+    assert columns["machine"].startswith("ENUM")
+    con.close()
+
+
+def test_connection_serves_rewritten_cache(export, tmp_path, monkeypatch):
+    monkeypatch.setenv("RSBD_FORMAT", "parquet")
+    monkeypatch.setenv("RSBD_PATH", export)
+    monkeypatch.setenv("RSBD_CACHE", str(tmp_path / "cache"))
+    con = pages.connection()
+    assert count(con, "gold_fact_process") == 10
+
+    # The cache is rebuilt while a cursor of the previous load reads it in a transaction: the cursor keeps its
+    # snapshot, then reads the rebuilt tables.
+    con.execute("BEGIN TRANSACTION;")
+    assert count(con, "gold_fact_process") == 10
+    write_export(export, rows=20)
+    assert count(pages.connection(), "gold_fact_process") == 20
+    assert count(con, "gold_fact_process") == 10
+    con.execute("COMMIT;")
+    assert count(con, "gold_fact_process") == 20
+
+
+def test_connection_builds_cache_once_per_change(export, tmp_path, monkeypatch):
+    builds = []
+    build = cache.build
+    monkeypatch.setattr(cache, "build", lambda *args: builds.append(args) or build(*args))
+    monkeypatch.setenv("RSBD_FORMAT", "parquet")
+    monkeypatch.setenv("RSBD_PATH", export)
+    monkeypatch.setenv("RSBD_CACHE", str(tmp_path / "cache"))
+    for _ in range(3):
+        pages.connection()
+    assert len(builds) == 1
+
+
+def test_build_only_converts_and_derives_what_changed(export, tmp_path):
+    path = cache.build(export, "parquet", TABLES, str(tmp_path / "cache"))
+    con = duckdb.connect(path)
+    # Emptied here, the derived tables are only computed again when the tables they read are rebuilt.
+    con.execute("DELETE FROM network_traffic;")
+    con.close()
+
+    con = duckdb.connect()
+    con.execute(f"COPY (SELECT 1 AS uid, 'daemon' AS name) TO '{export}/gold_file_user.parquet' (FORMAT PARQUET);")
+    con.execute(
+        f"COPY (SELECT * REPLACE ('wget' AS command) FROM '{export}/gold_dim_network_open_port.parquet') "
+        f"TO '{export}/gold_dim_network_open_port.parquet' (FORMAT PARQUET);"
+    )
+    con.close()
+    cache.build(export, "parquet", ["gold_file_user"], str(tmp_path / "cache"))
+    con = duckdb.connect(path, read_only=True)
+    assert con.execute("SELECT name FROM gold_file_user").fetchall() == [("daemon",)]
+    assert count(con, "network_traffic") == 0
+    con.close()
+
+    cache.build(export, "parquet", TABLES, str(tmp_path / "cache"))
+    con = duckdb.connect(path, read_only=True)
+    assert count(con, "network_traffic") == 10
+    # The new command extends the ENUM shared with the processes.
+    assert con.execute("SELECT ENUM_RANGE(NULL::command_enum)").fetchone()[0] == ["curl", "wget"]
+    assert con.execute("SELECT DISTINCT command FROM network_traffic WHERE command IS NOT NULL").fetchall() == [
+        ("wget",)
+    ]
+    con.close()
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+
+import pytest
+from conftest import write_export
+
+import analysis
+import pages
+
+WINDOW = (datetime(2024, 12, 1, 10), datetime(2024, 12, 1, 11))
+
+
+@pytest.fixture
+def federation(tmp_path, monkeypatch):
+    # Two identical machines, their pids and packet ids are the same.
+    write_export(tmp_path / "a", rows=20)
+    write_export(tmp_path / "b", rows=20)
+    monkeypatch.setenv("RSBD_FORMAT", "parquet")
+    monkeypatch.setenv("RSBD_PATH", f"a={tmp_path / 'a'};b={tmp_path / 'b'}")
+
+
+def count(con, relation):
+    return con.execute(f"SELECT machine, COUNT(*) FROM {relation} GROUP BY machine ORDER BY machine").fetchall()
+
+
+def test_derived_tables_join_rows_of_the_same_machine(federation):
+    con = pages.connection()
+    assert count(con, "network_traffic") == [("a", 20), ("b", 20)]
+    # One row per second of the conversation, a packet per second.
+    assert count(con, "network_flow") == [("a", 20), ("b", 20)]
+    assert con.execute("SELECT SUM(sent_packets), SUM(received_packets) FROM network_flow").fetchall() == [(20, 20)]
+
+
+def test_analyses_keep_the_pids_of_each_machine(federation):
+    con = pages.connection()
+    assert con.execute("SELECT DISTINCT pid FROM gold_dim_process").fetchall() == [(10,)]
+    assert analysis.process_total(con, *WINDOW).fetchall() == [(2,)]
+    flows = analysis.network_flows(con, *WINDOW).project("pid, command, sent_packets").fetchall()
+    assert flows == [(10, "curl", 10), (10, "curl", 10)]
+    assert analysis.packet_count(con, WINDOW[0], WINDOW[0] + timedelta(seconds=9)).fetchall() == [(20,)]
+
+
+def test_selected_hosts_are_loaded(federation):
+    assert count(pages.connection(hosts=["b"]), "network_traffic") == [("b", 20)]
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+
+import duckdb
+from conftest import write_export
+
+import analysis
+import history
+import pages
+
+START = datetime(2024, 12, 1, 10)
+
+
+def rows(path, query="SELECT COUNT(*)"):
+    return duckdb.execute(f"{query} FROM read_parquet('{path}', hive_partitioning = false)").fetchall()
+
+
+def test_ingest_replaces_technical_tables(tmp_path):
+    store = history.HistoryStore(str(tmp_path / "history"))
+    for snapshot in range(4):
+        store.ingest(write_export(tmp_path / "export", rows=10 + snapshot))
+    assert rows(tmp_path / "history/gold_tech_chrono/data.parquet") == [(1,)]
+    assert rows(tmp_path / "history/gold_tech_table_count/data.parquet", "SELECT max_count") == [(13,)]
+    assert rows(tmp_path / "history/gold_tech_chrono_history/*/*.parquet") == [(4,)]
+
+
+def test_ingest_appends_new_rows_once(tmp_path):
+    store = history.HistoryStore(str(tmp_path / "history"))
+    store.ingest(write_export(tmp_path / "export", rows=10))
+    store.ingest(write_export(tmp_path / "export", rows=20))
+    assert rows(tmp_path / "history/gold_fact_network_packet/*/*.parquet") == [(20,)]
+
+
+def test_downsample_keeps_packet_counts(tmp_path, monkeypatch):
+    store = history.HistoryStore(str(tmp_path / "history"))
+    store.ingest(write_export(tmp_path / "export", rows=120))
+    store.downsample(now=START + timedelta(hours=2))
+    assert rows(tmp_path / "history/gold_fact_network_packet_10s/*/*.parquet") == [(12,)]
+    assert rows(tmp_path / "history/gold_fact_network_ip_10s/*/*.parquet") == [(24,)]
+    assert rows(tmp_path / "history/gold_fact_process_network/data.parquet") == [(0,)]
+
+    monkeypatch.setenv("RSBD_FORMAT", "history")
+    monkeypatch.setenv("RSBD_PATH", str(tmp_path / "history"))
+    con = pages.connection()
+    window = (START, START + timedelta(hours=1))
+    assert analysis.packet_count(con, *window).fetchall() == [(120,)]
+    assert analysis.packet_process(con, *window).aggregate("command, ROUND(SUM(size), 3)").fetchall() == [
+        ("curl", 0.012)
+    ]
+    traffic = analysis.foreign_ip_traffic(con, *window).project("address, count, size, send").fetchall()
+    assert traffic == [("example.com", 120, 0.011, 0.5)]
+
+
+def test_compact_keeps_rolled_up_rows(tmp_path):
+    store = history.HistoryStore(str(tmp_path / "history"))
+    store.ingest(write_export(tmp_path / "first", rows=60))
+    store.downsample(now=START + timedelta(hours=2))
+    store.ingest(write_export(tmp_path / "second", rows=120, first=60))
+    store.downsample(now=START + timedelta(hours=2))
+    store.compact(now=START + timedelta(hours=2))
+    assert rows(tmp_path / "history/gold_fact_network_packet_10s/*/*.parquet") == [(12,)]
+    assert rows(tmp_path / "history/gold_fact_network_packet_10s/*/*.parquet", "SELECT SUM(packets)") == [(120,)]
+
+
+def flow_packets(window):
+    flows = analysis.network_flows(pages.connection(window), *window)
+    return flows.aggregate("SUM(sent_packets + received_packets)::BIGINT").fetchall()
+
+
+def test_flows_count_the_packets_of_the_window(tmp_path, monkeypatch):
+    store = history.HistoryStore(str(tmp_path / "history"))
+    store.ingest(write_export(tmp_path / "export", rows=10))
+    store.ingest(write_export(tmp_path / "export", rows=20))
+    window = (START, START + timedelta(seconds=5))
+    monkeypatch.setenv("RSBD_FORMAT", "history")
+    monkeypatch.setenv("RSBD_PATH", str(tmp_path / "history"))
+    assert flow_packets(window) == [(6,)]
+    monkeypatch.setenv("RSBD_FORMAT", "parquet")
+    monkeypatch.setenv("RSBD_PATH", str(tmp_path / "export"))
+    assert flow_packets(window) == [(6,)]
+    monkeypatch.setenv("RSBD_CACHE", str(tmp_path / "cache"))
+    assert flow_packets(window) == [(6,)]
+
+    # Rolled up in 10 seconds buckets, the flows still count every packet of the hour.
+    store.downsample(now=START + timedelta(hours=2))
+    monkeypatch.delenv("RSBD_CACHE")
+    monkeypatch.setenv("RSBD_FORMAT", "history")
+    monkeypatch.setenv("RSBD_PATH", str(tmp_path / "history"))
+    assert rows(tmp_path / "history/network_flow_10s/*/*.parquet") == [(2,)]
+    assert flow_packets((START, START + timedelta(hours=1))) == [(20,)]
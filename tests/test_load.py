@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+
+import duckdb
+from conftest import write_export
+
+import pages
+
+START = datetime(2024, 12, 1, 10)
+
+
+def count(con, table):
+    return con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_window_bounds_process_network_links(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSBD_FORMAT", "parquet")
+    monkeypatch.setenv("RSBD_PATH", write_export(tmp_path / "export", rows=120))
+    con = pages.connection(window=(START, START + timedelta(seconds=10)))
+    assert count(con, "gold_fact_network_packet") == 11
+    # Links are inserted one second after their packet, the ones of the next `LINK_DELAY` are kept.
+    assert count(con, "gold_fact_process_network") == 70
+
+
+def test_live_window_loads_every_link(export, monkeypatch):
+    monkeypatch.setenv("RSBD_FORMAT", "parquet")
+    monkeypatch.setenv("RSBD_PATH", export)
+    con = pages.connection(window=(START, pages.LIVE_EDGE))
+    assert count(con, "gold_fact_process_network") == 10
+
+
+def test_page_keeps_the_result_order_with_its_total():
+    con = duckdb.connect()
+    relation = con.sql("SELECT i FROM range(250) t(i) ORDER BY i DESC")
+    rows, total = pages._result(relation, False, page=(100, 100))
+    assert (rows.column("i").to_pylist(), total) == (list(range(149, 49, -1)), 250)
+    rows, total = pages._result(relation, False, page=(100, 300))
+    assert (rows.num_rows, total) == (0, 250)
+    rows, total = pages._result(con.sql("SELECT 1 AS i WHERE false"), False, page=(100, 0))
+    assert (rows.num_rows, total) == (0, 0)
+
+
+def test_time_range_is_read_once_per_snapshot(export, monkeypatch):
+    monkeypatch.setenv("RSBD_FORMAT", "csv")
+    monkeypatch.setenv("RSBD_PATH", write_export(export, db_format="csv"))
+    connections = []
+    connect = pages._connect
+    monkeypatch.setattr(pages, "_connect", lambda *args, **kwargs: connections.append(args) or connect(*args, **kwargs))
+    assert pages.time_range("gold_fact_process") == (START, START + timedelta(seconds=9))
+    assert pages.time_range("gold_fact_process") == (START, START + timedelta(seconds=9))
+    assert len(connections) == 1
+
+    write_export(export, rows=20, db_format="csv")
+    assert pages.time_range("gold_fact_process") == (START, START + timedelta(seconds=19))
+    assert len(connections) == 2
+
+
+def process_count(con, minimum=0):
+    return con.sql(f"SELECT COUNT(*) AS count FROM gold_fact_process WHERE pid >= {minimum}")
+
+
+def table_count(con):
+    return con.sql("SELECT COUNT(*) AS count FROM gold_tech_table_count")
+
+
+def test_preview_gives_way_to_its_exact_result(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSBD_FORMAT", "parquet")
+    monkeypatch.setenv("RSBD_PATH", write_export(tmp_path / "export", rows=1000))
+    monkeypatch.setattr(pages, "PREVIEW_ROWS", 100)
+    state: dict = {}
+    pages.fetch(state, "process.count", ["gold_fact_process"], None, process_count, [])
+    request, exact, _, fraction = state[pages.PREVIEWS]["process.count"]
+    assert fraction == 0.1
+    exact.result()
+    assert pages._finish_previews(state, "process.")
+    assert state[pages.PREVIEWS] == {}
+    assert state["process.count"][:3] == request
+    assert pages.fetch(state, "process.count", ["gold_fact_process"], None, process_count, []).to_pylist() == [
+        {"count": 1000}
+    ]
+    assert not pages._finish_previews(state, "process.")
+
+
+def test_superseded_preview_is_dropped(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSBD_FORMAT", "parquet")
+    monkeypatch.setenv("RSBD_PATH", write_export(tmp_path / "export", rows=1000))
+    monkeypatch.setattr(pages, "PREVIEW_ROWS", 100)
+    state: dict = {}
+    pages.fetch(state, "process.count", ["gold_fact_process"], None, process_count, [0])
+    # The new request is analyzed without preview, the exact result of the previous one must not replace it.
+    monkeypatch.setattr(pages, "PREVIEW_ROWS", 10_000)
+    result = pages.fetch(state, "process.count", ["gold_fact_process"], None, process_count, [11])
+    assert result.to_pylist() == [{"count": 0}]
+    assert state[pages.PREVIEWS] == {}
+    assert not pages._finish_previews(state, "process.")
+    # Tables the analysis doesn't read are not sampled.
+    monkeypatch.setattr(pages, "PREVIEW_ROWS", 100)
+    pages.fetch(state, "debug.count", ["gold_tech_table_count"], None, table_count, [])
+    assert state[pages.PREVIEWS] == {}
+
+
+def test_single_values_are_never_previewed(tmp_path, monkeypatch):
+    monkeypatch.setenv("RSBD_FORMAT", "parquet")
+    monkeypatch.setenv("RSBD_PATH", write_export(tmp_path / "export", rows=1000))
+    monkeypatch.setattr(pages, "PREVIEW_ROWS", 100)
+    state: dict = {}
+    assert pages.fetch(state, "process.total", ["gold_fact_process"], None, process_count, [], scalar=True) == 1000
+    assert pages.PREVIEWS not in state
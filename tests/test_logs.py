@@ -0,0 +1,45 @@
+from datetime import datetime, timezone
+
+import logs
+
+
+def local(*fields):
+    return datetime.fromtimestamp(datetime(*fields, tzinfo=timezone.utc).timestamp())
+
+
+def test_events_are_matched_on_the_message_only(tmp_path):
+    tailer = logs.LogTailer(str(tmp_path))
+    tailer._parse(
+        [
+            "2024-12-01T10:00:00.123456789Z  INFO rstracer::export::parquet: wrote 10 rows",
+            "2024-12-01T10:00:00.5Z DEBUG rstracer::batch: inserted 100 rows",
+            "2024-12-01T10:00:01Z \x1b[33m WARN\x1b[0m rstracer::batch::process: channel is full",
+            "2024-12-01T10:00:02Z ERROR export of gold_fact_process failed",
+        ]
+    )
+    assert [{name: row[name] for name in ["time", *logs.EVENTS]} for row in tailer.series()] == [
+        {"time": local(2024, 12, 1, 10), "channel_full": 0, "batch": 0, "export": 0},
+        {"time": local(2024, 12, 1, 10, 0, 1), "channel_full": 1, "batch": 0, "export": 0},
+        {"time": local(2024, 12, 1, 10, 0, 2), "channel_full": 0, "batch": 0, "export": 1},
+    ]
+    assert [(line["target"], line["message"]) for line in tailer.lines()] == [
+        ("rstracer::batch::process", "channel is full"),
+        (None, "export of gold_fact_process failed"),
+    ]
+
+
+def test_times_keep_their_offset(tmp_path):
+    tailer = logs.LogTailer(str(tmp_path))
+    tailer._parse(
+        [
+            "2024-12-01T12:00:00.123456+02:00 WARN rstracer: first",
+            "2024-12-01T10:00:01Z WARN rstracer: second",
+            "2024-12-01T05:00:02-05:00 WARN rstracer: third",
+        ]
+    )
+    assert [line["time"] for line in tailer.lines()] == [
+        local(2024, 12, 1, 10),
+        local(2024, 12, 1, 10, 0, 1),
+        local(2024, 12, 1, 10, 0, 2),
+    ]
+    assert [line["time"] for line in tailer.series()] == [line["time"] for line in tailer.lines()]
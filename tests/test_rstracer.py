@@ -0,0 +1,57 @@
+import subprocess
+import threading
+import time
+
+import pytest
+
+import rstracer
+
+
+@pytest.fixture
+def tracer(monkeypatch):
+    """A supervisor of a `sleep` standing for rstracer, stopped by a slow `terminate`."""
+    popen = subprocess.Popen
+    monkeypatch.setattr(rstracer.subprocess, "Popen", lambda command, cwd=None: popen(["sleep", "60"]))
+
+    def stop(self):
+        time.sleep(0.5)
+        self.process.terminate()
+        self._exited.wait(5)
+
+    monkeypatch.setattr(rstracer.Rstracer, "stop", stop)
+    rstracer.SingletonMeta._instances.pop(rstracer.Rstracer, None)
+    tracer = rstracer.Rstracer()
+    yield tracer
+    if tracer.process is not None:
+        tracer.process.kill()
+        tracer.process.wait()
+    tracer.process = None
+    rstracer.SingletonMeta._instances.pop(rstracer.Rstracer, None)
+
+
+def test_launch_once(tracer):
+    assert tracer.state() == "Not running"
+    pid = tracer.launch()
+    assert tracer.state() == "Running"
+    assert tracer.launch() is None
+    assert tracer.process.pid == pid
+
+
+def test_request_stop_returns_before_exit(tracer):
+    tracer.launch()
+    tracer.request_stop()
+    assert tracer.state() == "Stopping"
+    tracer._stopper.join(5)
+    assert tracer.state() == "Exited"
+
+
+def test_launch_waits_for_stop(tracer):
+    first = tracer.launch()
+    tracer.request_stop()
+    launched = []
+    launcher = threading.Thread(target=lambda: launched.append(tracer.launch()), daemon=True)
+    launcher.start()
+    launcher.join(5)
+    assert not launcher.is_alive()
+    assert launched[0] not in (None, first)
+    assert tracer.state() == "Running"
@@ -0,0 +1,105 @@
+import inspect
+import os
+from datetime import datetime, timedelta
+
+import duckdb
+import pytest
+from conftest import write_export
+
+import advisor
+import analysis
+import history
+import pages
+from report import GROUPS
+from schema import DERIVED_TABLES, HEAVY_HITTERS
+
+WINDOW = (datetime(2024, 12, 1, 10), datetime(2024, 12, 1, 11))
+CONFIG = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), advisor.CONFIG_FILE)
+
+
+def run_analyses(con):
+    # Loads only keep the projected columns, an analysis reading another one fails to bind.
+    for analyses, range_table in GROUPS.values():
+        params = list(WINDOW) if range_table else []
+        for function in analyses:
+            function(con, *params).to_arrow_table()
+            if "approximate" in inspect.signature(function).parameters:
+                function(con, *params, approximate=True).to_arrow_table()
+    advisor.recommend(con, advisor.read_config(CONFIG), [])
+
+
+@pytest.mark.parametrize("db_format", ["parquet", "csv"])
+def test_projection_covers_the_analyses(tmp_path, monkeypatch, db_format):
+    monkeypatch.setenv("RSBD_FORMAT", db_format)
+    monkeypatch.setenv("RSBD_PATH", write_export(tmp_path / "export", rows=20, db_format=db_format))
+    run_analyses(pages.connection())
+    run_analyses(pages.connection(WINDOW))
+
+
+def test_projection_covers_the_history_tiers(tmp_path, monkeypatch):
+    store = history.HistoryStore(str(tmp_path / "history"))
+    store.ingest(write_export(tmp_path / "first", rows=60))
+    store.downsample(now=WINDOW[0] + timedelta(hours=2))
+    # Rows of the second export stay raw, the pages read them with the rolled up ones.
+    store.ingest(write_export(tmp_path / "second", rows=120, first=60))
+    monkeypatch.setenv("RSBD_FORMAT", "history")
+    monkeypatch.setenv("RSBD_PATH", str(tmp_path / "history"))
+    run_analyses(pages.connection(WINDOW))
+
+
+def test_packets_are_attributed_to_the_port_still_open(tmp_path, monkeypatch):
+    export = write_export(tmp_path / "export")
+    # A second listener started after the first one on the same port is closed after 4 seconds, the first one is
+    # still open for the next packets.
+    duckdb.execute(
+        f"COPY (SELECT * FROM '{export}/gold_dim_network_open_port.parquet' UNION ALL "
+        "SELECT 8080, 'nc', TIMESTAMP '2024-12-01 10:00:02', TIMESTAMP '2024-12-01 10:00:04') "
+        f"TO '{export}/gold_dim_network_open_port.parquet' (FORMAT PARQUET);"
+    )
+    monkeypatch.setenv("RSBD_FORMAT", "parquet")
+    monkeypatch.setenv("RSBD_PATH", export)
+    con = pages.connection()
+    commands = con.execute("SELECT command, COUNT(*) FROM network_traffic GROUP BY command ORDER BY command").fetchall()
+    assert commands == [("curl", 7), ("nc", 3)]
+
+
+def foreign_ips(relation):
+    return relation.project("address, count, size, send").fetchall()
+
+
+@pytest.mark.parametrize("seconds", [(0, 149), (10, 130), (10, 20)])
+def test_sketches_merge_the_minutes_of_the_window(tmp_path, monkeypatch, seconds):
+    monkeypatch.setenv("RSBD_FORMAT", "parquet")
+    monkeypatch.setenv("RSBD_PATH", write_export(tmp_path / "export", rows=150))
+    con = pages.connection()
+    window = [WINDOW[0] + timedelta(seconds=second) for second in seconds]
+    # The process is counted once whether it is read from the sketch of a minute or from the rows at the edges.
+    for function in [analysis.process_total, analysis.process_root]:
+        assert function(con, *window, approximate=True).fetchone() == function(con, *window).fetchone() == (1,)
+    approximate = analysis.foreign_ip_traffic(con, *window, approximate=True)
+    assert foreign_ips(approximate) == foreign_ips(analysis.foreign_ip_traffic(con, *window))
+    assert approximate.project("error").fetchall() == [(0,)]
+
+
+def test_heavy_hitters_bound_the_bytes_left_out():
+    con = duckdb.connect()
+    # The first minute exchanges 1 to `HEAVY_HITTERS` + 1 Mo with as many hosts, the smallest one also exchanges 100 Mo
+    # the next minute.
+    con.execute(
+        f"""
+        CREATE TABLE network_traffic AS
+        SELECT true AS source_foreign, false AS destination_foreign, 'host' || i AS source_host,
+        'laptop' AS destination_host, 1 AS packets, (i + 1) * 1024 * 1024 AS length,
+        TIMESTAMP '2024-12-01 10:00:00' + INTERVAL (i) SECOND AS created_at
+        FROM range({HEAVY_HITTERS} + 1) t(i)
+        UNION ALL
+        SELECT true, false, 'host0', 'laptop', 1, 100 * 1024 * 1024, TIMESTAMP '2024-12-01 10:01:00'
+        """
+    )
+    con.execute(f"CREATE TABLE foreign_ip_sketch AS {DERIVED_TABLES['foreign_ip_sketch']}")
+    traffic = analysis.foreign_ip_traffic(con, *WINDOW, approximate=True)
+    rows = {address: (size, error) for address, size, error in traffic.project("address, size, error").fetchall()}
+    assert len(rows) == HEAVY_HITTERS + 1
+    # host0 missed its 1 Mo of the first minute, the other hosts were kept in every minute they exchanged bytes.
+    assert rows["host0"] == (100, 1)
+    assert rows["host1"] == (2, 0)